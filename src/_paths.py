@@ -1,8 +1,12 @@
 from .decorators import SingletonDecorator
 from .kvstore import KVStore
 from .log import logger
+import os
 import pathlib
 
+# If set (to e.g. 1), `Paths` are read-only. See `PathStore.__init__()`
+READ_ONLY_ENV_VAR = "EASYDATA_PATHS_READONLY"
+
 class PathStore(KVStore):
     """Persistent Key-Value store for project-level paths
 
@@ -18,6 +22,12 @@ class PathStore(KVStore):
     >>> b['data_path']
     PosixPath('/tmpx/project/data')
 
+    Lookups are cheap: the config file is only re-read if it has changed on disk,
+    and resolved paths are remembered until a value changes:
+
+    >>> b['data_path'] is b['data_path']
+    True
+
     The `catalog_path` is set upon instantiation and is read-only:
 
     >>> b['catalog_path']
@@ -52,18 +62,40 @@ class PathStore(KVStore):
     _protected = ['catalog_path']
 
     def __init__(self, *args,
-                 config_section='Paths', config_file=None,
+                 config_section='Paths', config_file=None, read_only=None,
                  **kwargs):
-        """Handle the special case of the config file"""
+        """Handle the special case of the config file
+
+        read_only: Boolean or None
+            If True, the config file is read once, and never re-read or written (e.g. in
+            worker processes). If None, read-only if the environment variable
+            EASYDATA_PATHS_READONLY is set (to anything other than 0/false/no).
+            See `KVStore.__init__()`
+        """
+        if read_only is None:
+            read_only = os.environ.get(READ_ONLY_ENV_VAR, '').lower() not in ('', '0', 'false', 'no')
         if config_file is None:
             self._config_file = "config.ini"
         else:
             self._config_file = pathlib.Path(config_file)
         self._usage_warning = False
+        self._resolved = {}  # option -> resolved (absolute) Path
         super().__init__(*args, config_section=config_section,
-                         config_file=self._config_file, **kwargs)
+                         config_file=self._config_file, read_only=read_only, **kwargs)
         self._usage_warning = True
 
+    def _clear_cache(self):
+        """forget resolved paths along with interpolated values"""
+        super()._clear_cache()
+        self._resolved = {}
+
+    def _invalidate(self, key, section=None):
+        """forget resolved paths along with their interpolated values"""
+        stale = super()._invalidate(key, section=section)
+        for option in stale:
+            self._resolved.pop(option, None)
+        return stale
+
     def _write(self):
         """temporarily hide protected keys when saving"""
         for key in self._protected:
@@ -76,6 +108,8 @@ class PathStore(KVStore):
         """Do not set a key if it is protected"""
         if key in self._protected:
             raise AttributeError(f"{key} is write-protected")
+        if self._read_only:
+            raise AttributeError(f"{key}: {self.__class__.__name__} is read-only")
 
         if self._usage_warning:
             logger.warning(f"'{key}' is a local configuration variable, and for reproducibility reasons, should not set from a notebook or shared code. It is better to edit '{self._config_file}' instead. We have set it, but you have been warned.")
@@ -84,11 +118,23 @@ class PathStore(KVStore):
 
 
     def __getitem__(self, key):
-        """get keys (including protected ones), converting to paths and fully resolving them"""
+        """get keys (including protected ones), converting to paths and fully resolving them
+
+        Absolute paths are memoized (if their interpolated value is cached; see `KVStore._expand()`).
+        Relative ones depend on the current directory, so are resolved every time.
+        """
         if key in self._protected:
             return getattr(self, key)
-        self._read()
-        return pathlib.Path(super().__getitem__(key)).resolve()
+        self._refresh()
+        option = self._config.optionxform(key)
+        path = self._resolved.get(option)
+        if path is None:
+            path = pathlib.Path(super().__getitem__(key))
+            if path.is_absolute() and option in self._expanded:
+                path = self._resolved[option] = path.resolve()
+            else:
+                path = path.resolve()
+        return path
 
     @property
     def catalog_path(self):
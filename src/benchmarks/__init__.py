@@ -0,0 +1,35 @@
+"""Micro-benchmarks
+
+Each module in this package is a standalone benchmark, run via e.g.
+
+    python -m src.benchmarks.catalog_json
+
+Benchmarks have no side effects on import, and write only to temporary directories.
+"""
+import time
+
+__all__ = [
+    'best_of',
+    'timings',
+]
+
+
+def timings(func, repeat=5, setup=None):
+    """Time `repeat` calls to a function, in seconds
+
+    setup: callable or None
+        if given, called (untimed) before every call to `func`
+    """
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def best_of(func, repeat=5, setup=None):
+    """Time a function call, returning the best (minimum) of `repeat` runs, in seconds"""
+    return min(timings(func, repeat=repeat, setup=setup))
@@ -0,0 +1,100 @@
+"""Benchmark the JSON codecs on a synthetic catalog
+
+Writes a synthetic catalog of (by default) 10,000 dataset entries with each available
+JSON codec, checks the files are byte-identical, and times saving and (eagerly) loading it.
+
+    python -m src.benchmarks.catalog_json [--entries N] [--repeat N] [--json]
+"""
+import argparse
+import hashlib
+import json
+import pathlib
+import shutil
+import tempfile
+
+from . import best_of
+from ..data.catalog import Catalog
+from ..utils import jsoncodec, save_json
+
+__all__ = [
+    'synthetic_catalog',
+    'run',
+]
+
+_DESCR = "\n### Content\n\nA synthetic dataset, used for benchmarking.\n\n" + "* Field: a description of the field\n" * 40
+
+
+def synthetic_catalog(n_entries=10000):
+    """A dict of `n_entries` catalog entries, shaped like those in the datasets catalog"""
+    catalog = {}
+    for i in range(n_entries):
+        name = f"dataset_{i:05d}"
+        digest = hashlib.sha1(name.encode('utf-8')).hexdigest()
+        catalog[name] = {
+            'dataset_name': name,
+            'descr': _DESCR,
+            'hashes': {'data': f"sha1:{digest}", 'target': f"sha1:{digest[::-1]}"},
+            'license': "CC BY-NC-SA 4.0",
+            'metadata': {'n_rows': 1000 + i, 'columns': ['points', 'price', 'variety'], 'derived': i % 2 == 0},
+        }
+    return catalog
+
+
+def run(n_entries=10000, repeat=3):
+    """Time saving and loading a synthetic catalog with each available codec
+
+    Returns
+    -------
+    list of dicts with keys: codec, entries, save_s, load_s
+    """
+    catalog = synthetic_catalog(n_entries)
+    results = []
+    tmpdir = pathlib.Path(tempfile.mkdtemp(prefix="catalog_json_"))
+    reference = None
+    try:
+        for codec in jsoncodec.available_json_codecs():
+            jsoncodec.set_json_codec(codec)
+            catalog_dir = tmpdir / codec
+            catalog_dir.mkdir()
+
+            def save():
+                for key, value in catalog.items():
+                    save_json(catalog_dir / f"{key}.json", value)
+
+            def load():
+                Catalog.load(codec, catalog_path=tmpdir, create=False, verify="none", shared=False)
+
+            save_s = best_of(save, repeat)
+            load_s = best_of(load, repeat)
+            blobs = [(catalog_dir / f"{key}.json").read_bytes() for key in catalog]
+            if reference is None:
+                reference = blobs
+            elif blobs != reference:
+                raise AssertionError(f"{codec} output differs from {results[0]['codec']}")
+            results.append({'codec': codec, 'entries': n_entries, 'save_s': save_s, 'load_s': load_s})
+    finally:
+        jsoncodec.set_json_codec()
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--entries', type=int, default=10000, help="number of catalog entries")
+    parser.add_argument('--repeat', type=int, default=3, help="report the best of this many runs")
+    parser.add_argument('--json', action='store_true', help="print results as JSON")
+    args = parser.parse_args(argv)
+
+    results = run(n_entries=args.entries, repeat=args.repeat)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    baseline = {r['codec']: r for r in results}['json']
+    print(f"{'codec':<8} {'save (s)':>10} {'load (s)':>10} {'save x':>8} {'load x':>8}")
+    for r in results:
+        print(f"{r['codec']:<8} {r['save_s']:>10.3f} {r['load_s']:>10.3f} "
+              f"{baseline['save_s'] / r['save_s']:>8.2f} {baseline['load_s'] / r['load_s']:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
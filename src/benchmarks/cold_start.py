@@ -0,0 +1,173 @@
+"""Benchmark the path from process start to a loaded Dataset
+
+Builds a synthetic project (a config file, and catalogs of `--datasets` datasets, each
+generated by its own source transformer) in a temporary directory, and times, separately:
+
+import: `import src`, in a fresh interpreter
+paths: constructing the `Paths` singleton (as `import src` does, but for the synthetic project),
+    and resolving a path
+graph: constructing a `DatasetGraph`
+load_warm: `Dataset.load()` of a dataset that is cached on disk
+load_miss: `Dataset.load()` of a dataset that must be regenerated from the transformer graph
+
+For every stage, both the first (cold) and the best of `--repeat` timings are reported.
+
+    python -m src.benchmarks.cold_start [--datasets N] [--rows N] [--repeat N] [--json]
+
+While benchmarking, `src.paths` is temporarily pointed (read-only) at the synthetic project.
+Its config file is never written. The `Paths` singleton, and the shared catalogs, are left
+as they were found.
+"""
+import argparse
+import json
+import pathlib
+import shutil
+import sys
+import tempfile
+
+from . import timings
+from .catalog_json import synthetic_catalog
+from .import_time import import_times
+from .. import paths, _path_defaults
+from .._paths import Paths, PathStore
+from ..data import Catalog, Dataset, DatasetGraph
+from ..utils import save_json
+
+__all__ = [
+    'STAGES',
+    'synthetic_data',
+    'synthetic_project',
+    'run',
+]
+
+STAGES = ('import', 'paths', 'graph', 'load_warm', 'load_miss')
+
+# Not __name__, which is '__main__' when run via `python -m`
+_MODULE = __spec__.name
+
+
+def synthetic_data(dsdict, *, dataset_name, n_rows=10000, n_columns=8, seed=0):
+    """Transformer: generate a Dataset of uniformly distributed random data
+
+    dsdict: ignored
+    dataset_name: str
+        name of the generated Dataset
+    n_rows, n_columns: int
+        shape of the generated data
+    seed: int
+        random seed. The same seed always generates the same data.
+
+    Returns
+    -------
+    dict: {dataset_name: Dataset}
+    """
+    import numpy as np
+    data = np.random.RandomState(seed).random_sample((n_rows, n_columns))
+    return {dataset_name: Dataset(dataset_name=dataset_name, data=data)}
+
+
+def synthetic_project(project_dir, n_datasets=1000, n_rows=10000):
+    """Write a synthetic project: a paths config file, and dataset and transformer catalogs
+
+    Every dataset has its own source transformer, using `synthetic_data()`. Only the first
+    dataset (the one returned) has valid hashes in the dataset catalog.
+
+    Returns
+    -------
+    (store, dataset_name) where `store` is the PathStore for the project
+    """
+    project_dir = pathlib.Path(project_dir)
+    catalog_dir = project_dir / 'catalog'
+    catalog_dir.mkdir(parents=True, exist_ok=True)
+    store = PathStore(_path_defaults, config_file=catalog_dir / 'config.ini', config_section='Paths')
+
+    datasets = synthetic_catalog(n_datasets)
+    dataset_name = next(iter(datasets))
+    datasets[dataset_name] = synthetic_data({}, dataset_name=dataset_name, n_rows=n_rows)[dataset_name].metadata
+    for subdir in ('datasets', 'transformers'):
+        (catalog_dir / subdir).mkdir(exist_ok=True)
+    for i, name in enumerate(datasets):
+        transformer = {
+            'transformer_module': _MODULE,
+            'transformer_name': 'synthetic_data',
+            'transformer_kwargs': {'dataset_name': name, 'n_rows': n_rows, 'seed': i},
+        }
+        save_json(catalog_dir / 'transformers' / f"_{name}.json",
+                  {'transformations': [transformer], 'output_datasets': [name]})
+        save_json(catalog_dir / 'datasets' / f"{name}.json", datasets[name])
+    return store, dataset_name
+
+
+def run(n_datasets=1000, n_rows=10000, repeat=3):
+    """Time each stage of loading a Dataset in a synthetic project
+
+    Returns
+    -------
+    list of dicts with keys: stage, datasets, rows, first_s, best_s
+    """
+    results = []
+
+    def record(stage, times):
+        results.append({'stage': stage, 'datasets': n_datasets, 'rows': n_rows,
+                        'first_s': times[0], 'best_s': min(times)})
+
+    record('import', [import_times('src')['src'][1] / 1e6 for _ in range(repeat)])
+
+    project_dir = pathlib.Path(tempfile.mkdtemp(prefix="cold_start_"))
+    saved = paths.snapshot()
+    was_read_only = paths._read_only
+    try:
+        store, dataset_name = synthetic_project(project_dir, n_datasets=n_datasets, n_rows=n_rows)
+        catalog_path = store.catalog_path
+        cache_path = store['processed_data_path']
+
+        def construct_paths():
+            Paths.instance = None
+            try:
+                Paths(_path_defaults, config_file=catalog_path / 'config.ini',
+                      config_section='Paths')['processed_data_path']
+            finally:
+                Paths.instance = paths
+
+        record('paths', timings(construct_paths, repeat))
+        paths.restore(store.snapshot())
+        record('graph', timings(lambda: DatasetGraph(catalog_path=catalog_path), repeat))
+
+        def load():
+            ds = Dataset.load(dataset_name, catalog_path=catalog_path, dataset_cache_path=cache_path)
+            if ds is None:
+                raise AssertionError(f"Failed to load {dataset_name}")
+
+        def clear_cache():
+            shutil.rmtree(cache_path, ignore_errors=True)
+
+        load_miss = timings(load, repeat, setup=clear_cache)
+        record('load_warm', timings(load, repeat))
+        record('load_miss', load_miss)
+    finally:
+        paths.restore(saved)
+        paths.set_read_only(was_read_only)
+        Catalog.clear_shared(project_dir)
+        shutil.rmtree(project_dir, ignore_errors=True)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--datasets', type=int, default=1000, help="number of datasets in the catalog")
+    parser.add_argument('--rows', type=int, default=10000, help="number of rows in the loaded dataset")
+    parser.add_argument('--repeat', type=int, default=3, help="report the best of this many runs")
+    parser.add_argument('--json', action='store_true', help="print results as JSON")
+    args = parser.parse_args(argv)
+
+    results = run(n_datasets=args.datasets, n_rows=args.rows, repeat=args.repeat)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'stage':<10} {'first (s)':>10} {'best (s)':>10}")
+    for r in results:
+        print(f"{r['stage']:<10} {r['first_s']:>10.4f} {r['best_s']:>10.4f}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
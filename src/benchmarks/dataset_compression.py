@@ -0,0 +1,113 @@
+"""Benchmark the compression codecs (and levels) available to `Dataset.dump`
+
+Writes a Dataset with each available codec, at a range of levels, and reports the size on
+disk, and the write and read throughput. Throughput is measured in (uncompressed) MB/s, and
+covers serialization and compression only; i.e. not the hashing done by `Dataset.dump()`.
+
+By default, the Dataset is a synthetic one, shaped like wine_reviews_130k (see
+`dataset_formats.synthetic_dataset()`). Use `--dataset` to benchmark one from the catalog.
+
+    python -m src.benchmarks.dataset_compression [--dataset NAME | --rows N] [--format FORMAT]
+                                                 [--repeat N] [--json]
+"""
+import argparse
+import json
+import pathlib
+import shutil
+import tempfile
+
+from . import best_of
+from .dataset_formats import synthetic_dataset
+from ..data import Dataset, available_codecs
+from ..data.storage import DEFAULT_FORMAT, dump_attributes, load_attributes, read_dataset, write_dataset
+
+__all__ = [
+    'LEVELS',
+    'run',
+]
+
+# Levels benchmarked for each codec: fast, default, and (near) maximum compression
+LEVELS = {
+    'zstd': (1, 3, 10, 19),
+    'lz4': (0, 9),
+    'gzip': (1, 6, 9),
+    'bz2': (1, 9),
+    'xz': (0, 6),
+}
+
+
+def run(ds, format=DEFAULT_FORMAT, repeat=3):
+    """Time writing and reading a Dataset with each available codec and level
+
+    Returns
+    -------
+    list of dicts with keys: dataset, format, codec, level, size_bytes, ratio, write_mbps, read_mbps
+    """
+    attributes = {key: value for key, value in ds.items() if key != 'metadata' and value is not None}
+    settings = [None] + [(codec, level) for codec in available_codecs() for level in LEVELS[codec]]
+    results = []
+    tmpdir = pathlib.Path(tempfile.mkdtemp(prefix="dataset_compression_"))
+    try:
+        for compress in settings:
+            dump_path = tmpdir / (f"{compress[0]}-{compress[1]}" if compress else "none")
+            dump_path.mkdir()
+            if format == DEFAULT_FORMAT:
+                def write():
+                    write_dataset(ds, dump_path / f"{ds.name}.dataset", compress=compress)
+
+                def read():
+                    read_dataset(dump_path / f"{ds.name}.dataset", compress=compress)
+            else:
+                storage = {}
+
+                def write():
+                    storage.update(dump_attributes(attributes, ds.name, dump_path, format, compress=compress))
+
+                def read():
+                    load_attributes(storage, dump_path)
+
+            write_s = best_of(write, repeat)
+            read_s = best_of(read, repeat)
+            size = sum(f.stat().st_size for f in dump_path.iterdir())
+            if compress is None:
+                uncompressed = size
+            results.append({
+                'dataset': ds.name,
+                'format': format,
+                'codec': compress[0] if compress else None,
+                'level': compress[1] if compress else None,
+                'size_bytes': size,
+                'ratio': uncompressed / size,
+                'write_mbps': uncompressed / write_s / 1e6,
+                'read_mbps': uncompressed / read_s / 1e6,
+            })
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dataset', help="name of a Dataset in the catalog. Default: a synthetic dataset")
+    parser.add_argument('--rows', type=int, default=130000, help="number of rows in the synthetic dataset")
+    parser.add_argument('--format', default=DEFAULT_FORMAT, help="storage format. See `Dataset.dump()`")
+    parser.add_argument('--repeat', type=int, default=3, help="report the best of this many runs")
+    parser.add_argument('--json', action='store_true', help="print results as JSON")
+    args = parser.parse_args(argv)
+
+    if args.dataset:
+        ds = Dataset.load(args.dataset)
+    else:
+        ds = synthetic_dataset(args.rows)
+    results = run(ds, format=args.format, repeat=args.repeat)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'codec':<6} {'level':>5} {'size (MB)':>10} {'ratio':>6} {'write (MB/s)':>13} {'read (MB/s)':>12}")
+    for r in results:
+        print(f"{r['codec'] or 'none':<6} {'' if r['level'] is None else r['level']:>5} "
+              f"{r['size_bytes'] / 1e6:>10.1f} {r['ratio']:>6.2f} {r['write_mbps']:>13.1f} {r['read_mbps']:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
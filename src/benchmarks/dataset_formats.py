@@ -0,0 +1,106 @@
+"""Benchmark the Dataset storage formats on a synthetic wine-reviews-like Dataset
+
+Dumps a Dataset whose data is a DataFrame of (by default) 130,000 rows, with both
+numeric and string (object dtype) columns, and whose target is a numpy array, using
+each available storage format. Times `Dataset.dump()` and `Dataset.from_disk()` (of the
+whole Dataset, and of just two of its columns), and reports the size on disk. The first
+format ('joblib') is the baseline. Dumping is also timed with the 'stream-sha1' hash type,
+which hashes 'npy' and 'pickle' attributes as they are written (see `src.data.hashing`).
+
+    python -m src.benchmarks.dataset_formats [--rows N] [--repeat N] [--json]
+"""
+import argparse
+import json
+import pathlib
+import shutil
+import tempfile
+
+from . import best_of
+from ..data import Dataset, available_formats
+
+__all__ = [
+    'synthetic_dataset',
+    'run',
+]
+
+_VARIETIES = ["Pinot Noir", "Chardonnay", "Cabernet Sauvignon", "Red Blend", "Riesling", "Syrah"]
+
+
+def synthetic_dataset(n_rows=130000, seed=0):
+    """A Dataset shaped like wine_reviews_130k: a DataFrame of reviews, and a numeric target"""
+    import numpy as np
+    import pandas as pd
+    rng = np.random.RandomState(seed)
+    points = rng.randint(80, 101, size=n_rows)
+    data = pd.DataFrame({
+        'country': rng.choice(["US", "France", "Italy", "Spain", "Portugal"], size=n_rows).astype(object),
+        'description': [f"Review {i}: aromas of fruit and oak, with a {p}-point finish." for i, p in enumerate(points)],
+        'points': points,
+        'price': rng.lognormal(3, 0.7, size=n_rows).round(2),
+        'variety': rng.choice(_VARIETIES, size=n_rows).astype(object),
+    })
+    return Dataset('synthetic_wine_reviews', data=data, target=points)
+
+
+def run(n_rows=130000, repeat=3):
+    """Time dumping and loading a synthetic Dataset with each available storage format
+
+    Returns
+    -------
+    list of dicts with keys: format, rows, dump_s, dump_stream_s, load_s, load_columns_s, size_bytes
+    """
+    ds = synthetic_dataset(n_rows)
+    results = []
+    tmpdir = pathlib.Path(tempfile.mkdtemp(prefix="dataset_formats_"))
+    try:
+        for fmt in available_formats():
+            dump_path = tmpdir / fmt
+
+            def dump():
+                ds.dump(dump_path=dump_path, format=fmt, exists_ok=True, update_catalog=False)
+
+            def dump_stream():
+                ds.dump(dump_path=dump_path, format=fmt, exists_ok=True, update_catalog=False,
+                        hash_type='stream-sha1')
+
+            def load():
+                Dataset.from_disk(ds.name, data_path=dump_path, check_hashes=False)
+
+            def load_columns():
+                Dataset.from_disk(ds.name, data_path=dump_path, check_hashes=False, columns=['variety', 'points'])
+
+            dump_stream_s = best_of(dump_stream, repeat)
+            dump_s = best_of(dump, repeat)
+            load_s = best_of(load, repeat)
+            load_columns_s = best_of(load_columns, repeat)
+            size = sum(f.stat().st_size for f in dump_path.iterdir())
+            results.append({'format': fmt, 'rows': n_rows, 'dump_s': dump_s, 'dump_stream_s': dump_stream_s,
+                            'load_s': load_s,
+                            'load_columns_s': load_columns_s, 'size_bytes': size})
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=130000, help="number of rows in the dataset")
+    parser.add_argument('--repeat', type=int, default=3, help="report the best of this many runs")
+    parser.add_argument('--json', action='store_true', help="print results as JSON")
+    args = parser.parse_args(argv)
+
+    results = run(n_rows=args.rows, repeat=args.repeat)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    baseline = results[0]
+    print(f"{'format':<8} {'dump (s)':>10} {'stream (s)':>10} {'load (s)':>10} {'2 cols (s)':>10} {'size (MB)':>10} "
+          f"{'dump x':>8} {'load x':>8}")
+    for r in results:
+        print(f"{r['format']:<8} {r['dump_s']:>10.3f} {r['dump_stream_s']:>10.3f} {r['load_s']:>10.3f} {r['load_columns_s']:>10.3f} "
+              f"{r['size_bytes'] / 1e6:>10.1f} "
+              f"{baseline['dump_s'] / r['dump_s']:>8.2f} {baseline['load_s'] / r['load_s']:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""Benchmark the hash types available for Dataset attributes
+
+Hashes each attribute of a Dataset with every type of hash in `available_hash_types()`, and
+reports the time taken. 'sha1' (joblib's hash, and the default) is the baseline.
+
+By default, the Dataset is a synthetic one, shaped like wine_reviews_130k (see
+`dataset_formats.synthetic_dataset()`). Use `--dataset` to benchmark one from the catalog.
+
+    python -m src.benchmarks.dataset_hashing [--dataset NAME | --rows N] [--repeat N] [--json]
+"""
+import argparse
+import json
+
+from . import best_of
+from .dataset_formats import synthetic_dataset
+from ..data import Dataset, available_hash_types
+from ..data.hashing import hash_value
+
+__all__ = [
+    'run',
+]
+
+
+def run(ds, repeat=3):
+    """Time hashing each attribute of a Dataset with each available hash type
+
+    Returns
+    -------
+    list of dicts with keys: dataset, attribute, hash_type, hash_s
+    """
+    results = []
+    for key, value in ds.items():
+        if key == 'metadata':
+            continue
+        for hash_type in available_hash_types():
+            hash_s = best_of(lambda: hash_value(value, hash_type), repeat)
+            results.append({'dataset': ds.name, 'attribute': key, 'hash_type': hash_type, 'hash_s': hash_s})
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dataset', help="name of a Dataset in the catalog. Default: a synthetic dataset")
+    parser.add_argument('--rows', type=int, default=130000, help="number of rows in the synthetic dataset")
+    parser.add_argument('--repeat', type=int, default=3, help="report the best of this many runs")
+    parser.add_argument('--json', action='store_true', help="print results as JSON")
+    args = parser.parse_args(argv)
+
+    if args.dataset:
+        ds = Dataset.load(args.dataset)
+    else:
+        ds = synthetic_dataset(args.rows)
+    results = run(ds, repeat=args.repeat)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    baseline = {r['attribute']: r['hash_s'] for r in results if r['hash_type'] == 'sha1'}
+    print(f"{'attribute':<10} {'hash type':<12} {'hash (s)':>10} {'speedup':>8}")
+    for r in results:
+        print(f"{r['attribute']:<10} {r['hash_type']:<12} {r['hash_s']:>10.4f} "
+              f"{baseline[r['attribute']] / r['hash_s']:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
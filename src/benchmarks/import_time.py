@@ -0,0 +1,123 @@
+"""Benchmark (and guard) the import time of the project modules
+
+Each module is imported in a fresh interpreter under `python -X importtime`, and
+its cumulative import time is reported, along with any heavy dependencies
+(e.g. scikit-learn, pandas) that were imported along with it. These should only
+be imported on first use.
+
+    python -m src.benchmarks.import_time [MODULE ...] [--repeat N] [--budget-ms MS] [--json]
+
+Exits with status 1 if any module exceeds the budget, or imports a heavy dependency.
+"""
+import argparse
+import json
+import os
+import pathlib
+import subprocess
+import sys
+
+__all__ = [
+    'HEAVY_MODULES',
+    'import_times',
+    'run',
+]
+
+# Dependencies that are slow to import, and must not be imported by `import src.data`
+HEAVY_MODULES = (
+    'fsspec',
+    'gdown',
+    'ipykernel',
+    'joblib',
+    'nbconvert',
+    'nbformat',
+    'numpy',
+    'pandas',
+    'requests',
+    'scipy',
+    'sklearn',
+    'tqdm',
+)
+
+DEFAULT_MODULES = ('src', 'src.data', 'src.workflow')
+
+_PROJECT_DIR = pathlib.Path(__file__).resolve().parent.parent.parent
+
+
+def import_times(module, python=None):
+    """Import a module in a fresh interpreter, and report what was imported
+
+    Parameters
+    ----------
+    module: str
+        name of the module to import
+    python: path or None
+        Python interpreter to use. Default: the current one
+
+    Returns
+    -------
+    dict mapping the name of every module imported -> (self_us, cumulative_us)
+    """
+    if python is None:
+        python = sys.executable
+    result = subprocess.run([python, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=_PROJECT_DIR, env={**os.environ, 'LOGLEVEL': 'WARNING'},
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+    times = {}
+    for line in result.stderr.decode('utf-8').splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        try:
+            self_us, cumulative_us = int(fields[0]), int(fields[1])
+        except ValueError:  # the header
+            continue
+        times[fields[2].strip()] = (self_us, cumulative_us)
+    return times
+
+
+def run(modules=DEFAULT_MODULES, repeat=3):
+    """Measure the import time of modules
+
+    Returns
+    -------
+    list of dicts with keys: module, import_ms (best of `repeat`), heavy_imports
+    """
+    results = []
+    for module in modules:
+        best = None
+        for _ in range(repeat):
+            times = import_times(module)
+            if best is None or times[module][1] < best[module][1]:
+                best = times
+        heavy = sorted(name for name in best if name in HEAVY_MODULES)
+        results.append({'module': module,
+                        'import_ms': best[module][1] / 1000,
+                        'heavy_imports': heavy})
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('modules', nargs='*', default=DEFAULT_MODULES, help="modules to import")
+    parser.add_argument('--repeat', type=int, default=3, help="report the best of this many runs")
+    parser.add_argument('--budget-ms', type=float, default=1000, help="maximum acceptable import time")
+    parser.add_argument('--json', action='store_true', help="print results as JSON")
+    args = parser.parse_args(argv)
+
+    results = run(args.modules, repeat=args.repeat)
+    failed = False
+    for r in results:
+        r['over_budget'] = r['import_ms'] > args.budget_ms
+        failed = failed or r['over_budget'] or bool(r['heavy_imports'])
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{'module':<16} {'import (ms)':>12}  heavy imports")
+        for r in results:
+            flag = " OVER BUDGET" if r['over_budget'] else ""
+            print(f"{r['module']:<16} {r['import_ms']:>12.1f}  {', '.join(r['heavy_imports']) or '-'}{flag}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,3 +3,5 @@ from .datasets import *
 from .fetch import *
 from .utils import *
 from .extra import *
+from .storage import *
+from .hashing import *
@@ -1,18 +1,168 @@
-import json
+import copy
+import hashlib
+import marshal
 import os
 import pathlib
 import shutil
+import subprocess
+import time
+import uuid
 
+from collections import namedtuple
 from collections.abc import MutableMapping
+from contextlib import contextmanager
 from ..log import logger
-from ..utils import load_json, save_json
+from ..utils import load_json, save_json, json_loads
 from .. import paths
 
 
 __all__ = [
     'Catalog',
+    'CatalogDiff',
 ]
 
+# The (optional) on-disk index kept by lazy catalogs. It lives in a subdirectory of the catalog
+# directory, so that (atomically) rewriting it doesn't change the mtime of the catalog directory
+_INDEX_DIR = ".index"
+_INDEX_FILE = "catalog-index"
+# Where older versions kept the index
+_LEGACY_INDEX_FILE = ".catalog-index"
+
+# Name of the (optional) compiled snapshot of a whole catalog. See `Catalog.__init__()`
+_SNAPSHOT_FILE = ".catalog-snapshot"
+# Snapshots are only valid for the marshal format (and layout) they were written with
+_SNAPSHOT_VERSION = f"1-marshal{marshal.version}"
+
+# Large string values may be stored once, in a content-addressed directory within the catalog,
+# and referenced from entries as {"__blob__": "sha1:<hexdigest>"}. See `Catalog.__init__()`
+_BLOB_DIR = "_blobs"
+_BLOB_REF = "__blob__"
+
+# Marker file present in the directory of a sharded catalog. See `Catalog.__init__()`
+_SHARDED_FILE = ".catalog-sharded"
+# Sharded catalogs keep each entry in a subdirectory named for a prefix of the hash of its key
+_SHARD_WIDTH = 2
+
+# Filesystem timestamps can be coarse (as much as 2s on some network filesystems).
+# A directory modified more recently than this is too fresh to trust its mtime.
+_MTIME_RESOLUTION_NS = 2_000_000_000
+
+
+class _NotLoaded:
+    """Placeholder for a catalog entry that has not yet been parsed from disk"""
+    def __repr__(self):
+        return "<not loaded>"
+
+_NOT_LOADED = _NotLoaded()
+_MISSING = object()
+
+_VERIFY_MODES = ("none", "written", "full")
+
+# Process-wide registry of shared catalogs, keyed by (catalog_path, name). See `Catalog.load()`
+_shared_catalogs = {}
+
+
+CatalogDiff = namedtuple('CatalogDiff', ['added', 'removed', 'changed'])
+CatalogDiff.__doc__ = """Differences between two versions of a catalog. See `Catalog.diff()`
+
+added: set of keys only present in the newer catalog
+removed: set of keys only present in the older catalog
+changed: set of keys present in both, whose entries differ
+"""
+
+
+def _resolve_blob_refs(value, read_blob):
+    """Replace any blob references in a catalog entry with the text they refer to
+
+    read_blob: function mapping a blob hash to its text
+
+    Nested references are replaced in place. Returns the (resolved) entry.
+    """
+    if isinstance(value, dict):
+        if len(value) == 1 and _BLOB_REF in value:
+            return read_blob(value[_BLOB_REF])
+        for k, v in value.items():
+            if isinstance(v, (dict, list)):
+                value[k] = _resolve_blob_refs(v, read_blob)
+    elif isinstance(value, list):
+        for i, v in enumerate(value):
+            if isinstance(v, (dict, list)):
+                value[i] = _resolve_blob_refs(v, read_blob)
+    return value
+
+
+def _git(args, cwd):
+    """Run a git command, returning its output"""
+    result = subprocess.run(['git'] + args, cwd=cwd, check=True,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    return result.stdout
+
+
+def _registry_key(catalog_path, name):
+    return (str(pathlib.Path(catalog_path).resolve()), name)
+
+
+def _checksum(blob):
+    """Checksum of a serialized catalog entry"""
+    return hashlib.sha1(blob.encode('utf-8')).hexdigest()
+
+
+def _shard(key):
+    """Name of the shard directory holding the given key in a sharded catalog"""
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:_SHARD_WIDTH]
+
+
+def _is_shard(name):
+    return len(name) == _SHARD_WIDTH and all(c in '0123456789abcdef' for c in name)
+
+
+def _field_values(entry, parts):
+    """Find the (hashable) values at a dotted path within a catalog entry
+
+    parts: list of path components. '*' matches every value in a dict.
+    Lists encountered along the way are expanded.
+
+    Returns
+    -------
+    set of values found
+    """
+    found = set()
+    nodes = [entry]
+    for part in parts:
+        next_nodes = []
+        for node in nodes:
+            if isinstance(node, list):
+                next_nodes.extend(node)
+            else:
+                next_nodes.append(node)
+        nodes = []
+        for node in next_nodes:
+            if not isinstance(node, dict):
+                continue
+            if part == '*':
+                nodes.extend(node.values())
+            elif part in node:
+                nodes.append(node[part])
+    for node in nodes:
+        for value in (node if isinstance(node, list) else [node]):
+            if isinstance(value, (str, int, float, bool)) or value is None:
+                found.add(value)
+    return found
+
+
+def _fsync_dir(path):
+    """Flush a directory's entries (e.g. renames) to disk. A no-op where unsupported."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
 
 class Catalog(MutableMapping):
     """A catalog is a serializable, disk-backed git-friendly dict-like object for storing a data catalog.
@@ -26,6 +176,14 @@ class Catalog(MutableMapping):
     On disk, a Catalog is stored as a directory of JSON files, one file per object
     The stem of the filename (e.g. stem.json) is the key (name) of the catalog entry
     in the dictionary, so `catalog/key.json` is accessible via catalog['key'].
+
+    A "lazy" catalog only lists its keys when opened. An entry's JSON is parsed
+    the first time it is accessed. To avoid even listing the directory, lazy catalogs
+    keep a small index (key -> file, size, mtime) in `catalog/.index/catalog-index`, which is
+    trusted for as long as the catalog directory itself is unchanged.
+
+    Very large catalogs may instead use a "sharded" layout, in which each entry is kept
+    in a subdirectory named for a prefix of the hash of its key (`catalog/3f/key.json`).
     """
 
     def __init__(self,
@@ -37,6 +195,11 @@ class Catalog(MutableMapping):
                  extension="json",
                  ignore_errors=False,
                  merge_priority="data",
+                 lazy=False,
+                 verify="written",
+                 snapshot=False,
+                 blob_threshold=None,
+                 sharded=None,
                  ):
         """
         catalog_name: str
@@ -57,6 +220,34 @@ class Catalog(MutableMapping):
             If using `data` with an existing repo, this indicates how to merge the two
             If disk, values already stored in the catalog will be retained
             If data, contents of `data` will override existing items on disk.
+        lazy: Boolean
+            If True, only the catalog keys are read on creation. Entries are parsed
+            from disk on first access.
+        verify: {'none', 'written', 'full'}
+            How to verify the on-disk serialization.
+            none: never verify. Fastest, and fine for read-only use.
+            written: every entry written by this object is read back and checked
+                against a checksum of what was written.
+            full: additionally, re-read and compare the entire catalog on creation.
+        snapshot: Boolean
+            If True, keep a compiled snapshot of the whole catalog in a single
+            binary sidecar file (`.catalog-snapshot`), so that it can be loaded with
+            one read rather than one per entry. JSON files remain the source of truth:
+            any entry whose file has changed since the snapshot was taken is re-read,
+            and the snapshot regenerated. Ignored for lazy catalogs.
+        blob_threshold: int or None
+            If set, string values (at any depth within an entry) of at least this many
+            characters are written once to a content-addressed `_blobs/` directory within
+            the catalog, and the entry's JSON holds a reference to them by hash. Identical
+            text (e.g. a `descr` inherited by many derived datasets) is then stored only once.
+            References are resolved when an entry is accessed, whatever this setting.
+        sharded: Boolean or None
+            If True, entries are spread across (up to 256) subdirectories, named for a prefix
+            of the hash of their key (e.g. `catalog/3f/key.json`), rather than kept in one
+            flat directory. This keeps directory operations fast in very large catalogs.
+            If None, use whichever layout the catalog already has on disk (flat, for a
+            new catalog). A catalog's layout can't be changed this way once it has entries;
+            see `Catalog.migrate_layout()`.
 
         """
         if catalog_path is None:
@@ -66,6 +257,12 @@ class Catalog(MutableMapping):
 
         self.name = catalog_name
         self.extension = extension
+        self.lazy = lazy
+        self.snapshot = snapshot
+        self.blob_threshold = blob_threshold
+        if verify not in _VERIFY_MODES:
+            raise ValueError(f"Unknown verify:{verify}. Must be one of {_VERIFY_MODES}")
+        self.verify = verify
 
         if data is None:
             data = {}
@@ -73,17 +270,44 @@ class Catalog(MutableMapping):
         if self.catalog_dir_fq.exists():  # Catalog exists on disk
             if delete:
                 logger.debug(f"Deleting existing catalog dir: {self.name}")
+                _shared_catalogs.pop(_registry_key(self.catalog_path, self.name), None)
                 shutil.rmtree(self.catalog_dir_fq, ignore_errors=ignore_errors)
 
+        on_disk_sharded = (self.catalog_dir_fq / _SHARDED_FILE).exists()
+        if sharded is None or sharded == on_disk_sharded:
+            self.sharded = on_disk_sharded
+        elif on_disk_sharded or self._scan_dir(self.catalog_dir_fq):
+            raise ValueError(f"Catalog:{self.name} exists with a different layout (sharded={on_disk_sharded}). "
+                             "Use Catalog.migrate_layout() to convert it.")
+        else:
+            self.sharded = sharded
+
         # Load existing data (if it exists)
         self.data = {}
-        disk_data = self._load(return_dict=True)
-        logger.debug(f"Loaded {len(disk_data)} records from '{self.name}' Catalog.")
+        self._index = {}
+        self._manifest = {}  # checksums of entries written this session
+        self._racy = set()  # entries read too soon after modification to trust their mtime
+        self._field_indexes = {}  # field -> ({value: set(keys)}, {key: set(values)}). See index_on()
+        self._blob_text = {}  # blob hash -> text, for blobs read or written so far
+        self._has_blobs = self.blob_dir_fq.exists()
+        self._batch_depth = 0
+        self._batch_pending = {}  # key -> True (write) or False (delete)
+        self._batch_undo = {}  # key -> value before the batch started
+        # Directory mtimes when the catalog was last listed. See `_refresh()`
+        self._refresh_mtimes = self._dir_mtimes()
+        if lazy:
+            disk_data = {key:_NOT_LOADED for key in self._load_index()}
+            logger.debug(f"Indexed {len(disk_data)} records from '{self.name}' Catalog.")
+        else:
+            disk_data = self._load(return_dict=True)
+            logger.debug(f"Loaded {len(disk_data)} records from '{self.name}' Catalog.")
 
         if create:
             if not self.catalog_dir_fq.exists():  # Catalog exists on disk
                 logger.debug(f"Creating new catalog:{self.name}")
                 os.makedirs(self.catalog_dir_fq, exist_ok=ignore_errors)
+            if self.sharded and not on_disk_sharded:
+                (self.catalog_dir_fq / _SHARDED_FILE).touch()
 
         if data:
             logger.debug(f"Merging {len(disk_data)} on-disk and {len(data)} off-disk parameters")
@@ -112,23 +336,262 @@ class Catalog(MutableMapping):
         """
         return self.catalog_path / self.name
 
+    @property
+    def snapshot_file_fq(self):
+        """pathlib.Path returning fully qualified path to the snapshot sidecar.
+        """
+        return self.catalog_dir_fq / _SNAPSHOT_FILE
+
+    def _entry_file(self, key):
+        """pathlib.Path returning fully qualified path to the file holding a catalog entry.
+        """
+        if self.sharded:
+            return self.catalog_dir_fq / _shard(key) / f"{key}.{self.extension}"
+        return self.catalog_dir_fq / f"{key}.{self.extension}"
+
+    @property
+    def blob_dir_fq(self):
+        """pathlib.Path returning fully qualified path to the content-addressed blob directory.
+        """
+        return self.catalog_dir_fq / _BLOB_DIR
+
+    @property
+    def index_file_fq(self):
+        """pathlib.Path returning fully qualified path to the lazy-loading index.
+        """
+        return self.catalog_dir_fq / _INDEX_DIR / _INDEX_FILE
+
     def __getitem__(self, key):
-        return self.data[key]
+        value = self.data[key]
+        if value is _NOT_LOADED:
+            value = self._load_item(key)
+        if self._has_blobs:
+            resolved = self._resolve_blobs(value)
+            if resolved is not value:
+                self.data[key] = value = resolved
+        return value
+
+    def __contains__(self, key):
+        return key in self.data
 
     def _disk_setitem(self, key, value):
+        # a copy: catalogs are shared process-wide, so must not change along with the caller's value
+        value = copy.deepcopy(value)
+        if self._batch_depth:
+            self._batch_record(key, write=True)
+            self.data[key] = value
+            self._index_fields(key)
+            return
         self.data[key] = value
+        self._index_fields(key)
         self._save_item(key)
 
     def _memory_setitem(self, key, value):
         self.data[key] = value
+        self._index_fields(key)
 
     # So we can swap between behaviors
     __setitem__ = _disk_setitem
 
     def __delitem__(self, key):
+        if self._batch_depth:
+            if key not in self.data:
+                raise KeyError(key)
+            self._batch_record(key, write=False)
+            del self.data[key]
+            self._unindex_fields(key)
+            return
         del self.data[key]
+        self._unindex_fields(key)
         self._del_item(key)
 
+    def index_on(self, field):
+        """Maintain a secondary index on a field of the catalog entries
+
+        Once a field is indexed, `find()` lookups on that field no longer need to
+        examine every entry. The index is kept up to date as entries change.
+
+        field: str
+            Dotted path to a value within an entry; e.g. 'hashes.data'.
+            Where the path passes through a list, every element of that list is indexed
+            (e.g. 'transformations.transformer_module' for transformers). A '*' component
+            matches every value of a dict (e.g. 'file_dict.*.fetch_action' for datasources).
+            Only hashable values (strings, numbers, booleans, None) are indexed.
+
+        >>> c = Catalog('example', catalog_path=getfixture('tmpdir'))
+        >>> c['a'] = {'hashes': {'data': 'sha1:1234'}}
+        >>> c['b'] = {'hashes': {'data': 'sha1:1234'}}
+        >>> c['c'] = {'hashes': {'data': 'sha1:5678'}}
+        >>> c.index_on('hashes.data')
+        >>> sorted(c.find(**{'hashes.data': 'sha1:1234'}))
+        ['a', 'b']
+        >>> c['b'] = {'hashes': {'data': 'sha1:5678'}}
+        >>> sorted(c.find(hashes__data='sha1:5678'))
+        ['b', 'c']
+        """
+        if field in self._field_indexes:
+            return
+        logger.debug(f"Indexing field:'{field}' of catalog:'{self.name}'")
+        self._field_indexes[field] = ({}, {})
+        for key in list(self.data):
+            self._index_fields(key, fields=[field])
+
+    def find(self, **criteria):
+        """Find the keys of entries matching all the given field values
+
+        Fields are dotted paths, as per `index_on()`. As dots can't be used in keyword
+        names, a double underscore may be used instead; i.e.
+        `find(hashes__data=x)` is equivalent to `find(**{'hashes.data': x})`
+
+        Indexed fields are looked up directly. Other fields require a scan of the whole catalog.
+
+        Returns
+        -------
+        set of keys of matching entries
+        """
+        found = None
+        for field, value in criteria.items():
+            if field not in self._field_indexes:
+                field = field.replace('__', '.')
+            if field in self._field_indexes:
+                keys = self._field_indexes[field][0].get(value, set())
+            else:
+                logger.debug(f"Field:'{field}' is not indexed. Scanning catalog:'{self.name}'")
+                parts = field.split('.')
+                keys = {key for key in self if value in _field_values(self[key], parts)}
+            found = set(keys) if found is None else found & keys
+        return found if found is not None else set(self)
+
+    def _index_fields(self, key, fields=None):
+        """Update the secondary indexes for an entry"""
+        if not self._field_indexes:
+            return
+        try:
+            value = self[key]
+        except KeyError:
+            value = _MISSING
+        if fields is None:
+            fields = self._field_indexes
+        for field in fields:
+            by_value, by_key = self._field_indexes[field]
+            for old in by_key.pop(key, ()):
+                by_value[old].discard(key)
+                if not by_value[old]:
+                    del by_value[old]
+            if value is _MISSING:
+                continue
+            new = _field_values(value, field.split('.'))
+            if new:
+                by_key[key] = new
+                for v in new:
+                    by_value.setdefault(v, set()).add(key)
+
+    def _unindex_fields(self, key):
+        """Remove a (deleted) entry from the secondary indexes"""
+        self._index_fields(key)
+
+    @contextmanager
+    def batch(self):
+        """Context manager for transactional (batched) updates
+
+        Inside the `with` block, changes are made in memory only. When the block
+        exits, all changed entries are written to disk in a single pass: every entry is
+        first written (and synced) to a temporary file, and only once all of them have
+        been written are they renamed into place, followed by one directory sync.
+        If the block raises an exception, or any entry can't be written, the changes are
+        discarded and the catalog (in memory, and on disk) is rolled back.
+
+        Batches may be nested; changes are written when the outermost batch exits.
+
+        >>> with catalog.batch():  # doctest: +SKIP
+        ...     for name in names:
+        ...         catalog[name] = {'dataset_name': name}
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                self._batch_rollback()
+            raise
+        self._batch_depth -= 1
+        if not self._batch_depth:
+            self._batch_flush()
+
+    def _batch_record(self, key, write):
+        """Remember an in-batch change (and the value needed to undo it)"""
+        if key not in self._batch_undo:
+            if self.data.get(key) is _NOT_LOADED:
+                try:
+                    self._load_item(key)  # needed to restore it on disk
+                except KeyError:
+                    pass
+            self._batch_undo[key] = self.data.get(key, _MISSING)
+        self._batch_pending[key] = write
+
+    def _batch_rollback(self):
+        """Discard all changes made in the current batch"""
+        logger.debug(f"Rolling back {len(self._batch_pending)} changes to catalog '{self.name}'")
+        for key, value in self._batch_undo.items():
+            if value is _MISSING:
+                self.data.pop(key, None)
+            else:
+                self.data[key] = value
+            self._index_fields(key)
+        self._batch_pending = {}
+        self._batch_undo = {}
+
+    def _batch_flush(self):
+        """Write all changes made in the current batch to disk, or none of them"""
+        pending = self._batch_pending
+        if not pending:
+            self._batch_undo = {}
+            return
+        logger.debug(f"Flushing {len(pending)} changes to catalog '{self.name}'")
+        staged = {}  # key -> (temporary file, blob)
+        committed = []
+        try:
+            for key, write in pending.items():
+                if write:
+                    staged[key] = self._stage_item(key)
+            for key, write in pending.items():
+                if write:
+                    tmp_file, blob = staged[key]
+                    os.replace(tmp_file, self._entry_file(key))
+                    del staged[key]
+                    self._record_item(key, blob)
+                else:
+                    self._del_item(key, missing_ok=True)
+                committed.append(key)
+        except BaseException:
+            logger.error(f"Failed to flush changes to catalog '{self.name}'. Rolling back")
+            for tmp_file, _ in staged.values():
+                if tmp_file.exists():
+                    tmp_file.unlink()
+            self._batch_undo_committed(committed)
+            self._batch_rollback()
+            raise
+        self._batch_pending = {}
+        self._batch_undo = {}
+        for dir_fq in {self._entry_file(key).parent for key in pending}:
+            _fsync_dir(dir_fq)
+        if self.verify == "written":
+            self._verify_save(keys=[key for key, write in pending.items() if write])
+
+    def _batch_undo_committed(self, keys):
+        """Restore the on-disk entries (already written by a failed flush) to their values before the batch"""
+        for key in keys:
+            old = self._batch_undo[key]
+            try:
+                if old is _MISSING:
+                    self._del_item(key, missing_ok=True)
+                else:
+                    self.data[key] = old
+                    self._save_item(key, verify=False)
+            except Exception as e:
+                logger.error(f"Could not restore entry '{key}' of catalog '{self.name}': {e}")
+
     def __iter__(self):
         return iter(self.data)
 
@@ -142,36 +605,589 @@ class Catalog(MutableMapping):
         """Two catalogs are equal if they have the same contents,
         regardless of where or how they are stored on-disk.
         """
+        self._materialize()
+        other._materialize()
         return self.data == other.data
 
-    def _load(self, return_dict=False):
+    def diff(self, other):
+        """Compare the on-disk serializations of two catalogs
+
+        Entries are compared by file size and contents first; JSON is only parsed for
+        entries whose files differ, to check whether they differ in substance
+        (rather than, say, formatting).
+
+        other: Catalog, or path to a catalog directory
+            the older catalog to compare against
+
+        Returns
+        -------
+        CatalogDiff(added, removed, changed), where `added` are keys in this catalog
+        but not in `other`, `removed` are keys in `other` but not in this one, and
+        `changed` are keys whose entries differ.
+
+        >>> old = Catalog('old', catalog_path=getfixture('tmpdir'))
+        >>> old['a'], old['b'], old['c'] = {'x': 1}, {'x': 2}, {'x': 3}
+        >>> new = Catalog('new', catalog_path=getfixture('tmpdir'))
+        >>> new['b'], new['c'], new['d'] = {'x': 2}, {'x': 4}, {'x': 5}
+        >>> new.diff(old)
+        CatalogDiff(added={'d'}, removed={'a'}, changed={'c'})
+        """
+        if not isinstance(other, Catalog):
+            other = pathlib.Path(other)
+            other = Catalog(other.name, catalog_path=other.parent, create=False,
+                            extension=self.extension, lazy=True, verify="none")
+        ours, theirs = self._scan(), other._scan()
+        candidates = []
+        for key in ours.keys() & theirs.keys():
+            if ours[key]['size'] != theirs[key]['size']:
+                candidates.append(key)
+                continue
+            our_file, their_file = self._entry_file(key), other._entry_file(key)
+            if os.path.samefile(our_file, their_file):
+                continue
+            if our_file.read_bytes() != their_file.read_bytes():
+                candidates.append(key)
+        changed = set()
+        for key in candidates:
+            ours_value = self._resolve_blobs(json_loads(self._entry_file(key).read_bytes()))
+            theirs_value = other._resolve_blobs(json_loads(other._entry_file(key).read_bytes()))
+            if ours_value != theirs_value:
+                changed.add(key)
+        logger.debug(f"Parsed {len(candidates)} of {len(ours.keys() & theirs.keys())} common entries "
+                     f"to compare catalog:'{self.name}' to catalog:'{other.name}'")
+        return CatalogDiff(added=ours.keys() - theirs.keys(),
+                           removed=theirs.keys() - ours.keys(),
+                           changed=changed)
+
+    @classmethod
+    def git_diff(cls, name, old_revision, new_revision=None, catalog_path=None, extension="json"):
+        """Compare a catalog between two git revisions
+
+        git itself determines which entry files differ. JSON is only parsed for
+        modified entries, to check whether they differ in substance.
+
+        Parameters
+        ----------
+        name: String
+            catalog name. Also the directory name for the serialized data
+        old_revision: String
+            git revision (e.g. commit hash, branch or tag) of the older catalog
+        new_revision: String or None
+            git revision of the newer catalog. If None, use the working tree
+            (including untracked entries).
+        catalog_path:
+            Directory containing catalog. Default paths['catalog_path']
+        extension: String
+            file extension of catalog entries
+
+        Returns
+        -------
+        CatalogDiff(added, removed, changed). See `Catalog.diff()`
+        """
+        if catalog_path is None:
+            catalog_path = paths['catalog_path']
+        else:
+            catalog_path = pathlib.Path(catalog_path)
+        catalog_dir_fq = catalog_path / name
+        suffix = f".{extension}"
+
+        def entry_key(path):
+            path = pathlib.PurePosixPath(path)
+            if (path.name.startswith('.') or path.suffix != suffix or
+                    (len(path.parts) > 1 and not _is_shard(path.parts[0]))):
+                return None
+            return path.stem
+
+        def read(revision, path):
+            if revision is None:
+                return (catalog_dir_fq / path).read_bytes()
+            return _git(['show', f"{revision}:./{path}"], cwd=catalog_dir_fq)
+
+        def read_entry(revision, path):
+            def read_blob(blob_hash):
+                return read(revision, f"{_BLOB_DIR}/{blob_hash.split(':', 1)[1]}.txt").decode('utf-8')
+            return _resolve_blob_refs(json_loads(read(revision, path)), read_blob)
+
+        revisions = [old_revision] if new_revision is None else [old_revision, new_revision]
+        output = _git(['diff', '--name-status', '--no-renames', '--relative', '-z'] + revisions + ['--', '.'],
+                      cwd=catalog_dir_fq).decode('utf-8')
+        fields = output.split('\0')
+        added, removed, modified = {}, {}, {}
+        for status, path in zip(fields[0::2], fields[1::2]):
+            key = entry_key(path)
+            if key is None:
+                continue
+            {'A': added, 'D': removed}.get(status[0], modified)[key] = path
+        if new_revision is None:
+            untracked = _git(['ls-files', '--others', '--exclude-standard', '-z', '--', '.'],
+                             cwd=catalog_dir_fq).decode('utf-8')
+            for path in untracked.split('\0'):
+                key = entry_key(path) if path else None
+                if key is not None:
+                    added[key] = path
+
+        # An entry may have moved between layouts (e.g. by `migrate_layout()`)
+        for key in added.keys() & removed.keys():
+            modified[key] = (removed.pop(key), added.pop(key))
+        changed = set()
+        for key, path in modified.items():
+            old_path, new_path = path if isinstance(path, tuple) else (path, path)
+            if read_entry(old_revision, old_path) != read_entry(new_revision, new_path):
+                changed.add(key)
+        return CatalogDiff(added=set(added), removed=set(removed), changed=changed)
+
+    def _materialize(self):
+        """Parse any catalog entries that have not yet been loaded from disk, and resolve their blobs"""
+        for key in list(self.data):
+            try:
+                self[key]
+            except KeyError:
+                pass
+
+    def _blob_file(self, blob_hash):
+        """Fully qualified path to the blob with the given hash"""
+        return self.blob_dir_fq / f"{blob_hash.split(':', 1)[1]}.txt"
+
+    def _write_blob(self, text):
+        """Store a string in the blob directory (if it isn't there already)
+
+        Returns
+        -------
+        the blob hash, of the form "sha1:<hexdigest>"
+        """
+        blob_hash = f"sha1:{hashlib.sha1(text.encode('utf-8')).hexdigest()}"
+        self._blob_text[blob_hash] = text
+        filename = self._blob_file(blob_hash)
+        if not filename.exists():
+            logger.debug(f"Writing blob:'{blob_hash}' to catalog:'{self.name}'")
+            os.makedirs(self.blob_dir_fq, exist_ok=True)
+            tmp_file = filename.with_name(f".{filename.name}.{uuid.uuid4().hex[:8]}.tmp")
+            with open(tmp_file, 'w', encoding='utf-8', newline='') as f:
+                f.write(text)
+            os.replace(tmp_file, filename)
+        self._has_blobs = True
+        return blob_hash
+
+    def _read_blob(self, blob_hash):
+        """Fetch the text of a blob, reading it from disk only once"""
+        text = self._blob_text.get(blob_hash)
+        if text is None:
+            try:
+                with open(self._blob_file(blob_hash), encoding='utf-8', newline='') as f:
+                    text = f.read()
+            except FileNotFoundError:
+                logger.error(f"Blob:'{blob_hash}' is missing from catalog:'{self.name}'")
+                raise
+            self._blob_text[blob_hash] = text
+        return text
+
+    def _extract_blobs(self, value):
+        """Replace large strings in a catalog entry with references to blobs
+
+        Returns a copy of the entry, suitable for serialization. The entry itself is unchanged.
+        """
+        if isinstance(value, str):
+            if len(value) < self.blob_threshold:
+                return value
+            return {_BLOB_REF: self._write_blob(value)}
+        if isinstance(value, dict):
+            return {k: self._extract_blobs(v) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [self._extract_blobs(v) for v in value]
+        return value
+
+    def _resolve_blobs(self, value):
+        """Replace any blob references in a catalog entry with the text they refer to
+
+        Nested references are replaced in place. Returns the (resolved) entry.
+        """
+        return _resolve_blob_refs(value, self._read_blob)
+    def _scan(self, shards=None):
+        """List the catalog directory
+
+        shards: list or None
+            For a sharded catalog, only list these shard directories. Default: all of them.
+
+        Returns
+        -------
+        dict mapping key -> {'file', 'size', 'mtime_ns'} for every entry on disk.
+        'file' is relative to the catalog directory.
+        """
+        if not self.catalog_dir_fq.exists():
+            return {}
+        if not self.sharded:
+            return self._scan_dir(self.catalog_dir_fq)
+        if shards is None:
+            shards = self._list_shards()
+        index = {}
+        for shard in shards:
+            index.update(self._scan_dir(self.catalog_dir_fq / shard, prefix=f"{shard}/"))
+        return index
+
+    def _scan_dir(self, dir_fq, prefix=""):
+        """List the catalog entries in a single directory. See `_scan()`"""
+        index = {}
+        suffix = f".{self.extension}"
+        try:
+            it = os.scandir(dir_fq)
+        except FileNotFoundError:
+            return index
+        with it:
+            for entry in it:
+                if entry.name.startswith('.') or not entry.name.endswith(suffix):
+                    continue
+                if not entry.is_file():
+                    continue
+                st = entry.stat()
+                index[entry.name[:-len(suffix)]] = {'file': prefix + entry.name,
+                                                    'size': st.st_size,
+                                                    'mtime_ns': st.st_mtime_ns}
+        return index
+
+    def _list_shards(self):
+        """List the shard directories of a sharded catalog
+
+        Returns
+        -------
+        dict mapping shard name -> mtime_ns of the shard directory
+        """
+        shards = {}
+        with os.scandir(self.catalog_dir_fq) as it:
+            for entry in it:
+                if _is_shard(entry.name) and entry.is_dir():
+                    shards[entry.name] = entry.stat().st_mtime_ns
+        return shards
+
+    def _load_index(self):
+        """Read the on-disk index, rebuilding it if the catalog directory has changed
+
+        The index is only trusted if the mtime of the catalog directory matches the one
+        recorded when the index was written (i.e. no entries have been added or removed).
+        For a sharded catalog, the mtime of each shard directory is recorded instead,
+        and only those shards that have changed are re-listed. An unreadable (e.g. truncated)
+        index is ignored, and rebuilt.
+
+        Returns
+        -------
+        the index dict, as per `_scan()`
+        """
+        if not self.catalog_dir_fq.exists():
+            self._index = {}
+            return self._index
+        stored = {}
+        if self.index_file_fq.exists():
+            try:
+                stored = load_json(self.index_file_fq)
+            except (OSError, ValueError):
+                logger.debug(f"Ignoring unreadable index for catalog '{self.name}'")
+            if not isinstance(stored, dict) or not isinstance(stored.get('entries'), dict):
+                stored = {}
+        if not stored:
+            # Set up for writing the index before noting the mtime of the catalog directory
+            try:
+                self.index_file_fq.parent.mkdir(exist_ok=True)
+                legacy_index = self.catalog_dir_fq / _LEGACY_INDEX_FILE
+                if legacy_index.exists():
+                    legacy_index.unlink()
+            except OSError:
+                pass
+
+        if self.sharded:
+            shards = self._list_shards()
+            stored_shards = stored.get('shard_mtime_ns') or {}
+            stale = [shard for shard, mtime_ns in shards.items() if stored_shards.get(shard) != mtime_ns]
+            if not stale and stored_shards.keys() == shards.keys():
+                self._index = stored['entries']
+                return self._index
+            logger.debug(f"Rebuilding index for {len(stale)} of {len(shards)} shards of catalog '{self.name}'")
+            fresh = shards.keys() - set(stale)
+            self._index = {key: entry for key, entry in stored.get('entries', {}).items()
+                           if entry['file'].split('/', 1)[0] in fresh}
+            self._index.update(self._scan(shards=stale))
+            now = time.time_ns()
+            # Shards too recently modified to tell apart from a change made in the same timestamp tick
+            # are recorded without an mtime, so they are always re-listed
+            header = {'shard_mtime_ns': {shard: (None if now - mtime_ns < _MTIME_RESOLUTION_NS else mtime_ns)
+                                         for shard, mtime_ns in shards.items()}}
+        else:
+            dir_mtime_ns = self.catalog_dir_fq.stat().st_mtime_ns
+            if stored.get('dir_mtime_ns') is not None and stored['dir_mtime_ns'] == dir_mtime_ns:
+                self._index = stored['entries']
+                return self._index
+            logger.debug(f"Rebuilding index for catalog '{self.name}'")
+            self._index = self._scan()
+            if time.time_ns() - dir_mtime_ns < _MTIME_RESOLUTION_NS:
+                # Too recent to tell apart from a change made in the same timestamp tick
+                dir_mtime_ns = None
+            header = {'dir_mtime_ns': dir_mtime_ns}
+
+        if not self._index:
+            return self._index
+        try:
+            save_json(self.index_file_fq, {**header, 'entries': self._index}, atomic=True)
+        except OSError as e:
+            logger.debug(f"Could not write index for catalog '{self.name}': {e}")
+        return self._index
+
+    def _read_snapshot(self):
+        """Read the snapshot sidecar
+
+        Returns
+        -------
+        dict mapping key -> (size, mtime_ns, value), or {} if there is no usable snapshot
+        """
+        try:
+            with open(self.snapshot_file_fq, 'rb') as f:
+                snapshot = marshal.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, EOFError, ValueError, TypeError) as e:
+            logger.debug(f"Ignoring unreadable snapshot for catalog '{self.name}': {e}")
+            return {}
+        if not isinstance(snapshot, dict) or snapshot.get('version') != _SNAPSHOT_VERSION:
+            return {}
+        logger.debug(f"Read snapshot of {len(snapshot['entries'])} entries for catalog '{self.name}'")
+        return snapshot['entries']
+
+    def _write_snapshot(self, catalog_dict):
+        """(Re)generate the snapshot sidecar from freshly loaded catalog entries
+
+        Entries whose mtime is too recent to be trusted are left out, and will be
+        read from their JSON files next time.
+        """
+        entries = {}
+        for key, value in catalog_dict.items():
+            entry = self._index.get(key)
+            if entry is None or key in self._racy:
+                continue
+            entries[key] = (entry['size'], entry['mtime_ns'], value)
+        blob = marshal.dumps({'version': _SNAPSHOT_VERSION, 'entries': entries})
+        tmp_file = self.snapshot_file_fq.with_name(f"{_SNAPSHOT_FILE}.{uuid.uuid4().hex[:8]}.tmp")
+        try:
+            with open(tmp_file, 'wb') as f:
+                f.write(blob)
+            os.replace(tmp_file, self.snapshot_file_fq)
+        except OSError as e:
+            logger.debug(f"Could not write snapshot for catalog '{self.name}': {e}")
+            if tmp_file.exists():
+                tmp_file.unlink()
+            return
+        logger.debug(f"Wrote snapshot of {len(entries)} entries for catalog '{self.name}'")
+
+    def _index_name(self, filename):
+        """Name of an entry's file, relative to the catalog directory, as recorded in the index"""
+        if self.sharded:
+            return f"{filename.parent.name}/{filename.name}"
+        return filename.name
+
+    def _read_item(self, key):
+        """Parse a catalog entry from disk, updating its index entry"""
+        filename = self._entry_file(key)
+        with open(filename, 'rb') as f:
+            st = os.fstat(f.fileno())
+            value = json_loads(f.read())
+        self._index[key] = {'file': self._index_name(filename), 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+        if time.time_ns() - st.st_mtime_ns < _MTIME_RESOLUTION_NS:
+            self._racy.add(key)
+        else:
+            self._racy.discard(key)
+        return value
+
+    def _dir_mtimes(self):
+        """The mtimes of the catalog directory (and, if sharded, its shard directories)
+
+        Returns
+        -------
+        dict mapping directory (relative to the catalog directory) -> mtime_ns, or None if the
+        catalog directory is missing, or any mtime is too recent to be trusted
+        """
+        try:
+            mtimes = {'': self.catalog_dir_fq.stat().st_mtime_ns}
+            if self.sharded:
+                mtimes.update(self._list_shards())
+        except FileNotFoundError:
+            return None
+        if time.time_ns() - max(mtimes.values()) < _MTIME_RESOLUTION_NS:
+            return None
+        return mtimes
+
+    def _stat_entries(self, keys):
+        """Index entries (as per `_scan()`) for the files of some catalog entries. Missing files are skipped"""
+        entries = {}
+        for key in keys:
+            filename = self._entry_file(key)
+            try:
+                st = filename.stat()
+            except FileNotFoundError:
+                continue
+            entries[key] = {'file': self._index_name(filename), 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+        return entries
+
+    def _refresh(self, create=False):
+        """Bring the in-memory catalog up to date with changes made on disk
+
+        Rather than re-parsing the catalog, each entry's size and mtime are compared to those
+        recorded when it was last read or written. Only new or modified entries are re-read
+        (or, for a lazy catalog, marked as not yet loaded). Entries removed from disk are dropped.
+
+        If the mtime of the catalog directory (and of every shard directory) is unchanged
+        since it was last listed, no entries have been added, removed or replaced, so the
+        directory isn't listed again. Only the files of the entries held in memory are
+        checked, for edits made in place.
+
+        create: Boolean
+            if True, recreate the catalog directory if it has been removed
+        """
+        if self._batch_depth:
+            return  # don't clobber uncommitted changes
+        if create and not self.catalog_dir_fq.exists():
+            os.makedirs(self.catalog_dir_fq, exist_ok=True)
+        mtimes = self._dir_mtimes()
+        if mtimes is not None and mtimes == self._refresh_mtimes:
+            current = self._stat_entries(key for key, value in self.data.items() if value is not _NOT_LOADED)
+        else:
+            current = self._scan()
+            self._has_blobs = self._has_blobs or self.blob_dir_fq.exists()
+            for key in list(self.data):
+                if key not in current:
+                    logger.debug(f"Entry:'{key}' removed from catalog:'{self.name}' on disk")
+                    del self.data[key]
+                    self._unindex_fields(key)
+                    self._index.pop(key, None)
+                    self._racy.discard(key)
+        changed = []
+        for key, entry in current.items():
+            known = self._index.get(key)
+            if (key in self.data and key not in self._racy and known is not None and
+                    (known['size'], known['mtime_ns']) == (entry['size'], entry['mtime_ns'])):
+                continue
+            changed.append(key)
+            if self.lazy:
+                self.data[key] = _NOT_LOADED
+                self._index[key] = entry
+            else:
+                self.data[key] = self._read_item(key)
+            self._index_fields(key)
+        if changed:
+            logger.debug(f"Refreshed {len(changed)} changed entries in catalog:'{self.name}'")
+        self._refresh_mtimes = mtimes
+
+    def _load_item(self, key):
+        """Parse a single (not yet loaded) catalog entry into memory"""
+        logger.debug(f"Loading entry:'{key}' from catalog:'{self.name}'.")
+        try:
+            value = self._read_item(key)
+        except FileNotFoundError:
+            # removed from disk since the catalog was indexed
+            del self.data[key]
+            self._unindex_fields(key)
+            self._index.pop(key, None)
+            raise KeyError(key) from None
+        self.data[key] = value
+        return value
+
+    def _load(self, return_dict=False, use_snapshot=True):
         """reload an entire catalog from its on-disk serialization.
 
         if return_dict is True, return the data that would have been loaded,
         but do not change the contents of the catalog.
 
+        if use_snapshot is True (and this catalog keeps a snapshot), entries whose
+        files are unchanged since the snapshot was taken are taken from the snapshot.
         """
+        current = self._scan()
+        use_snapshot = use_snapshot and self.snapshot
+        snapshot = self._read_snapshot() if use_snapshot else {}
         catalog_dict = {}
-        for catalog_file in self.catalog_dir_fq.glob(self.file_glob):
-            catalog_dict[catalog_file.stem] = load_json(catalog_file)
+        stale = False
+        for key, entry in current.items():
+            cached = snapshot.get(key)
+            if cached is not None and cached[:2] == (entry['size'], entry['mtime_ns']):
+                catalog_dict[key] = cached[2]
+                self._index[key] = entry
+            else:
+                catalog_dict[key] = self._read_item(key)
+                stale = True
+        if use_snapshot and (stale or snapshot.keys() - current.keys()):
+            self._write_snapshot(catalog_dict)
 
         if return_dict is True:
             return catalog_dict
         self.__setitem__ = self._memory_setitem
         self.data = catalog_dict
         self.__setitem__ = self._disk_setitem
+        for field in self._field_indexes:
+            self._field_indexes[field] = ({}, {})
+        for key in self.data:
+            self._index_fields(key)
+
+    def _del_item(self, key, missing_ok=False):
+        """Delete the on-disk serialization of a catalog entry
 
-    def _del_item(self, key):
-        """Delete the on-disk serialization of a catalog entry"""
-        filename = self.catalog_dir_fq / f"{key}.{self.extension}"
+        missing_ok: Boolean
+            if True, don't complain if the entry was never written to disk
+        """
+        filename = self._entry_file(key)
         logger.debug(f"Deleting catalog entry: '{key}.{self.extension}'")
-        filename.unlink()
+        try:
+            filename.unlink()
+        except FileNotFoundError:
+            if not missing_ok:
+                raise
+        self._index.pop(key, None)
+        self._manifest.pop(key, None)
+        self._racy.discard(key)
+
+    def _save_item(self, key, verify=True):
+        """serialize a catalog entry to disk
 
-    def _save_item(self, key):
-        """serialize a catalog entry to disk"""
+        The entry is written atomically (to a temporary file which is renamed into place),
+        so readers never see a partially written entry.
+
+        verify: Boolean
+            if True, verify the entry (as per `self.verify`) once it is written
+        """
         value = self.data[key]
+        if self.blob_threshold is not None:
+            value = self._extract_blobs(value)
         logger.debug(f"Writing entry:'{key}' to catalog:'{self.name}'.")
-        save_json(self.catalog_dir_fq / f"{key}.{self.extension}", value)
+        filename = self._entry_file(key)
+        if self.sharded:
+            os.makedirs(filename.parent, exist_ok=True)
+        blob = save_json(filename, value, atomic=True)
+        self._record_item(key, blob)
+        if verify and self.verify == "written":
+            self._verify_save(keys=[key])
+
+    def _stage_item(self, key):
+        """Serialize a catalog entry to a (synced) temporary file beside its own. See `_batch_flush()`
+
+        Returns
+        -------
+        (temporary file, the serialized (string) representation)
+        """
+        value = self.data[key]
+        if self.blob_threshold is not None:
+            value = self._extract_blobs(value)
+        logger.debug(f"Staging entry:'{key}' for catalog:'{self.name}'.")
+        filename = self._entry_file(key)
+        if self.sharded:
+            os.makedirs(filename.parent, exist_ok=True)
+        tmp_file = filename.with_name(f".{filename.name}.{uuid.uuid4().hex[:8]}.tmp")
+        try:
+            blob = save_json(tmp_file, value, fsync=True)
+        except BaseException:
+            if tmp_file.exists():
+                tmp_file.unlink()
+            raise
+        return tmp_file, blob
+
+    def _record_item(self, key, blob):
+        """Update the index and manifest for an entry just written to disk"""
+        filename = self._entry_file(key)
+        st = filename.stat()
+        self._index[key] = {'file': self._index_name(filename), 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+        self._manifest[key] = _checksum(blob)
 
     def _save(self, paranoid=True):
         """Save all catalog entries to disk
@@ -179,21 +1195,85 @@ class Catalog(MutableMapping):
         if paranoid=True, verify serialization is equal to in-memory copy
         """
         logger.debug(f"Saving {len(self.data)} records to catalog '{self.name}'")
-        for key in self.data:
-            self._save_item(key)
+        for key, value in self.data.items():
+            if value is not _NOT_LOADED:  # unloaded entries are already on disk
+                self._save_item(key)
         if paranoid:
-            _verify_save()
+            self._verify_save()
+
+    def _verify_item(self, key):
+        """Check the on-disk serialization of an entry written this session
+
+        The file must match the checksum recorded when it was written, and must
+        deserialize to the in-memory value.
+        """
+        filename = self._entry_file(key)
+        try:
+            with open(filename) as f:
+                blob = f.read()
+        except FileNotFoundError:
+            logger.error(f"Catalog entry '{key}' is missing from disk")
+            return False
+        if _checksum(blob) != self._manifest[key]:
+            logger.error(f"Catalog entry '{key}' was modified on disk after it was written")
+            return False
+        if self._resolve_blobs(json_loads(blob)) != self[key]:
+            logger.error(f"Serialization failed. On-disk entry '{key}' differs from in-memory catalog")
+            return False
+        return True
+
+    def _verify_save(self, keys=None):
+        """Verify the on-disk serialization of this catalog
+
+        What gets verified depends on `self.verify`:
+
+        'none': nothing.
+        'written': entries written during this session (see `_verify_item`).
+        'full': the whole catalog is re-read and compared to the in-memory copy.
+
+        keys: list or None
+            restrict 'written' verification to these keys.
+
+        Returns
+        -------
+        True if verification succeeded (or was skipped)
+        """
+        if self.verify == "none":
+            return True
+        elif self.verify == "written":
+            if keys is None:
+                keys = [key for key in self._manifest if key in self.data]
+            if keys:
+                logger.debug(f"Verifying serialization of {len(keys)} entries in catalog '{self.name}'")
+            return all([self._verify_item(key) for key in keys])
 
-    def _verify_save(self):
         logger.debug(f"Verifying serialization for catalog '{self.name}'")
-        new = self._load(return_dict=True)
-        if new != self.data:
+        if self.lazy:
+            # Only entries we have actually parsed can be compared
+            loaded = {key: self[key] for key, value in self.data.items() if value is not _NOT_LOADED}
+            new = {key: self._read_item(key) for key in loaded
+                   if self._entry_file(key).exists()}
+        else:
+            loaded = {key: self[key] for key in self.data}
+            new = self._load(return_dict=True, use_snapshot=False)
+        if self._has_blobs:
+            new = {key: self._resolve_blobs(value) for key, value in new.items()}
+        if new != loaded:
             logger.error("Serialization failed. On-disk catalog differs from in-memory catalog")
+            return False
+        return True
 
     @classmethod
-    def load(cls, name, create=True, ignore_errors=True, catalog_path=None):
+    def load(cls, name, create=True, ignore_errors=True, catalog_path=None, lazy=False,
+             verify="written", snapshot=False, blob_threshold=None, sharded=None, shared=True):
         """Load a Catalog from disk.
 
+        By default, catalogs are shared: every call to `load()` for a given catalog
+        (within a process) returns the same object. Before it is returned, the shared
+        object is brought up to date with any changes made on disk. This is cheap,
+        as only the size and mtime of catalog files are checked, and only changed
+        entries are re-read.
+
         Parameters
         ----------
         name: String
@@ -204,6 +1284,20 @@ class Catalog(MutableMapping):
             Path to where catalog will be created. Default: paths['catalog_path']
         ignore_errors: Boolean
             if False, and create=True, an error is thrown if the catalog already exists.
+        lazy: Boolean
+            if True, only read catalog keys now; entries are parsed on first access.
+        verify: {'none', 'written', 'full'}
+            how to verify the on-disk serialization. See `Catalog.__init__()`
+        snapshot: Boolean
+            if True, keep a compiled snapshot for fast loading. See `Catalog.__init__()`
+        blob_threshold: int or None
+            if set, store long strings once, in a content-addressed blob directory. See `Catalog.__init__()`
+        sharded: Boolean or None
+            on-disk layout for a new catalog. Default: detect. See `Catalog.__init__()`
+        shared: Boolean
+            if True, return the process-wide shared Catalog object.
+            `lazy`, `verify`, `snapshot`, `blob_threshold` and `sharded` only take effect when the shared object is first created.
+            if False, always create a new Catalog object.
         """
 
         if catalog_path is None:
@@ -215,10 +1309,36 @@ class Catalog(MutableMapping):
         if not catalog_dir_fq.exists() and not create:
             raise FileNotFoundError(f"Catalog:{name} not found and create=False")
 
+        if shared:
+            key = _registry_key(catalog_path, name)
+            catalog = _shared_catalogs.get(key)
+            if catalog is not None and type(catalog) is cls:
+                catalog._refresh(create=create)
+                return catalog
+
         catalog = cls(name, create=create, ignore_errors=ignore_errors, catalog_path=catalog_path,
-                      delete=False, data=None)
+                      delete=False, data=None, lazy=lazy, verify=verify, snapshot=snapshot,
+                      blob_threshold=blob_threshold, sharded=sharded)
+        if shared:
+            _shared_catalogs[key] = catalog
         return catalog
 
+    @staticmethod
+    def clear_shared(catalog_path=None):
+        """Forget all shared catalogs. Subsequent calls to `load()` will re-read them from disk.
+
+        catalog_path: path or None
+            If given, only forget the shared catalogs within this directory (or its subdirectories)
+        """
+        if catalog_path is None:
+            _shared_catalogs.clear()
+            return
+        catalog_path = pathlib.Path(catalog_path).resolve()
+        for key in list(_shared_catalogs):
+            path = pathlib.Path(key[0])
+            if path == catalog_path or catalog_path in path.parents:
+                del _shared_catalogs[key]
+
     @classmethod
     def create(cls, name, data=None, replace=False):
         """Create (or replace) a Catalog.
@@ -257,6 +1377,7 @@ class Catalog(MutableMapping):
             catalog_path = pathlib.Path(catalog_path)
 
         logger.debug(f"Deleting existing catalog dir: {name}")
+        _shared_catalogs.pop(_registry_key(catalog_path, name), None)
         shutil.rmtree(catalog_path / name, ignore_errors=ignore_errors)
 
     @classmethod
@@ -303,3 +1424,69 @@ class Catalog(MutableMapping):
                       create=True, delete=replace,
                       catalog_path=catalog_path)
         return catalog
+
+    @classmethod
+    def migrate_layout(cls, name, sharded=True, catalog_path=None, extension="json"):
+        """Convert an on-disk catalog between the flat and sharded layouts
+
+        Entry files are moved (not rewritten) into place, so their contents and mtimes
+        are preserved. If a migration is interrupted, it can simply be run again.
+
+        Parameters
+        ----------
+        name: String
+            Catalog name. Also the name of the catalog directory
+        sharded: Boolean
+            If True, convert to the sharded layout. If False, convert to the flat layout.
+        catalog_path:
+            Directory containing catalog. Default paths['catalog_path']
+        extension: String
+            file extension of catalog entries
+
+        Returns
+        -------
+        The migrated catalog
+        """
+        if catalog_path is None:
+            catalog_path = paths['catalog_path']
+        else:
+            catalog_path = pathlib.Path(catalog_path)
+
+        catalog_dir_fq = catalog_path / name
+        if not catalog_dir_fq.exists():
+            raise FileNotFoundError(f"Catalog:{name} not found")
+        _shared_catalogs.pop(_registry_key(catalog_path, name), None)
+
+        # Gather entries from both layouts, in case an earlier migration was interrupted
+        suffix = f".{extension}"
+        entry_files = [f for f in catalog_dir_fq.glob(f"*{suffix}") if not f.name.startswith('.')]
+        for shard_dir in catalog_dir_fq.iterdir():
+            if _is_shard(shard_dir.name) and shard_dir.is_dir():
+                entry_files += [f for f in shard_dir.glob(f"*{suffix}") if not f.name.startswith('.')]
+
+        logger.debug(f"Migrating {len(entry_files)} entries of catalog:{name} to sharded={sharded}")
+        for entry_file in entry_files:
+            key = entry_file.name[:-len(suffix)]
+            if sharded:
+                target = catalog_dir_fq / _shard(key) / entry_file.name
+                os.makedirs(target.parent, exist_ok=True)
+            else:
+                target = catalog_dir_fq / entry_file.name
+            if target != entry_file:
+                os.replace(entry_file, target)
+
+        marker = catalog_dir_fq / _SHARDED_FILE
+        if sharded:
+            marker.touch()
+        else:
+            if marker.exists():
+                marker.unlink()
+            for shard_dir in catalog_dir_fq.iterdir():
+                if _is_shard(shard_dir.name) and shard_dir.is_dir() and not any(shard_dir.iterdir()):
+                    shard_dir.rmdir()
+        index_dir = catalog_dir_fq / _INDEX_DIR
+        if index_dir.exists():
+            shutil.rmtree(index_dir)
+        _fsync_dir(catalog_dir_fq)
+
+        return cls(name, catalog_path=catalog_path, create=False, extension=extension)
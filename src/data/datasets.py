@@ -1,27 +1,30 @@
+import copy
 import json
 import os
 import pathlib
 import sys
+import time
 from functools import partial
 from collections import Counter, defaultdict
 
-import joblib
-import fsspec
-from sklearn.utils import Bunch
-from sklearn.model_selection import train_test_split
+# Heavy dependencies (joblib, fsspec) are imported on first use, to keep `import src.data` fast.
 
 from .. import paths
 from ..exceptions import EasydataError, NotFoundError, ObjectCollision, ValidationError
 from ..log import logger
 from ..utils import load_json, save_json, normalize_to_list
-from .utils import partial_call_signature, serialize_partial, deserialize_partial, process_dataset_default
+from .utils import Bunch, partial_call_signature, serialize_partial, deserialize_partial, process_dataset_default
 from .fetch import fetch_file,  get_dataset_filename, hash_file, unpack, infer_filename
 from .catalog import Catalog
+from .hashing import hash_type_of, hash_value, is_stream_hash
+from .storage import (DEFAULT_FORMAT, OBJECTS_DIR, describe, dump_attributes, load_attributes, filter_columns,
+                      select, normalize_compress, read_dataset, write_dataset)
 
 
 __all__ = [
     'Dataset',
     'processed_datasets',
+    'prune_object_store',
     'serialize_transformer_pipeline',
     'DataSource',
     'process_datasources',
@@ -42,6 +45,35 @@ def default_transformer(dsdict, **kwargs):
     logger.error(f"'{transformer_name}()' function not found. Define it add it to the datasets.py namespace for correct behavior")
     return dsdict
 
+def _column_hash(series, hash_type='sha1'):
+    """Hash the values of a DataFrame column, as f"{hash_type}:{hash_value}"
+
+    Only the values are hashed (not the index, or the dtype's representation), so the hash of
+    a column is the same whether it was read alone, or with the rest of its DataFrame.
+    """
+    return hash_value(series.to_numpy(), hash_type)
+
+def _hash_stamp(value):
+    """A cheap stamp of an attribute's type, shape and (for numpy arrays and DataFrames) buffers
+
+    Used, along with the attribute's identity, to validate its cached hashes. See `Dataset._cached_hashes()`
+    """
+    stamp = (type(value), getattr(value, 'shape', None))
+    np = sys.modules.get('numpy')
+    pd = sys.modules.get('pandas')
+    if np is not None and isinstance(value, np.ndarray):
+        stamp += (value.__array_interface__['data'][0], value.strides, value.dtype.str)
+    elif pd is not None and isinstance(value, pd.DataFrame):
+        stamp += (id(value.index), id(value.columns))
+        # Columns (re)assigned in place replace blocks, or their buffers
+        for block in getattr(value._mgr, 'blocks', ()):
+            values = block.values
+            if isinstance(values, np.ndarray):
+                stamp += ((id(block), values.__array_interface__['data'][0]),)
+            else:  # extension arrays
+                stamp += ((id(block), id(values)),)
+    return stamp
+
 def processed_datasets(dataset_path=None, keys_only=True):
     """Get the set of datasets currently saved to dataset_path
 
@@ -67,16 +99,74 @@ def processed_datasets(dataset_path=None, keys_only=True):
     else:
         dataset_path = pathlib.Path(dataset_path)
 
+    if keys_only:  # no need to read the metadata files
+        return {str(dsfile.stem) for dsfile in dataset_path.glob("*.metadata")}
+
     ds_dict = {}
     for dsfile in dataset_path.glob("*.metadata"):
         ds_stem = str(dsfile.stem)
         ds_meta = Dataset.from_disk(ds_stem, data_path=dataset_path, metadata_only=True, check_hashes=False)
         ds_dict[ds_stem] = ds_meta
-
-    if keys_only:
-        return set(ds_dict.keys())
     return ds_dict
 
+def prune_object_store(dataset_path=None, dry_run=False, grace_period=600):
+    """Remove payloads from the object store that are used by no Dataset in dataset_path
+
+    See `Dataset.dump(object_store=True)`. A dump writes its payloads before the `.metadata`
+    file that refers to them, so payloads written within the last `grace_period` seconds are
+    never removed. Don't prune with a shorter `grace_period` while Datasets are being dumped.
+
+    Parameters
+    ----------
+    dataset_path: path
+        location of saved dataset files. Default `paths['processed_data_path']`
+    dry_run: Boolean
+        if True, report, but don't remove, the unused payloads
+    grace_period: number
+        only remove payloads last modified at least this many seconds ago
+
+    Returns
+    -------
+    list of the paths of the unused payloads
+    """
+    if dataset_path is None:
+        dataset_path = paths['processed_data_path']
+    else:
+        dataset_path = pathlib.Path(dataset_path)
+
+    used = set()
+    for meta in processed_datasets(dataset_path=dataset_path, keys_only=False).values():
+        for record in meta.get('storage', {}).get('attributes', {}).values():
+            used.add(dataset_path / record['file'])
+    # (skipping the temporary files of payloads still being written)
+    cutoff = time.time() - grace_period
+    unused = [path for path in sorted((dataset_path / OBJECTS_DIR).glob('*/*/*'))
+              if path not in used and not (path.name.startswith('.') and path.suffix == '.tmp')
+              and path.stat().st_mtime <= cutoff]
+    for path in unused:
+        logger.debug(f"{'Unused' if dry_run else 'Removing unused'} payload: {path}")
+        if not dry_run:
+            path.unlink()
+    return unused
+
+class _Deferred:
+    """Placeholder for a Dataset attribute that has not been read from disk yet
+
+    info: dict
+        type, shape and dtype of the attribute. See `src.data.storage.describe()`
+    loader: callable
+        loads the full Dataset
+    """
+    __slots__ = ('info', 'loader')
+
+    def __init__(self, info, loader):
+        self.info = info
+        self.loader = loader
+
+    def __repr__(self):
+        return f"<deferred {self.info['type']}, shape={self.info['shape']}>"
+
+
 class Dataset(Bunch):
     def __init__(self,
                  dataset_name=None,
@@ -119,11 +209,56 @@ class Dataset(Bunch):
         self['data'] = data
         self['target'] = target
         #self['extra'] = Extra.from_dict(metadata.get('extra', None))
-        data_hashes = self._generate_data_hashes()
-
         if update_hashes:
+            data_hashes = self._generate_data_hashes()
             self['metadata'] = {**self['metadata'], **data_hashes}
 
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._forget_hashes(key)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._forget_hashes(key)
+
+    def pop(self, key, *args):
+        self._forget_hashes(key)
+        return super().pop(key, *args)
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self.__dict__.pop('_hash_cache', None)
+
+    def __getstate__(self):
+        # Don't pickle (or copy) the hash cache. Everything else is in the dict
+        return None
+
+    def _forget_hashes(self, key):
+        """Invalidate the cached hashes of an attribute"""
+        self.__dict__.get('_hash_cache', {}).pop(key, None)
+
+    def _cached_hashes(self, key, value):
+        """The cache of hashes of an attribute (hash_type -> hash), emptied if the attribute has changed
+
+        Cached hashes are kept as long as the attribute is the same object, with the same
+        `_hash_stamp()`. Setting (or deleting) an attribute invalidates its cached hashes;
+        changes made to it in place are not noticed, so reassign it (e.g. `ds.data = ds.data`)
+        after modifying it. `dump()` never uses cached hashes: what is written is always rehashed.
+        """
+        cache = self.__dict__.setdefault('_hash_cache', {})
+        stamp = _hash_stamp(value)
+        entry = cache.get(key)
+        if entry is None or entry[0] is not value or entry[1] != stamp:
+            entry = cache[key] = (value, stamp, {})
+        return entry[2]
+
+    def _hash_attribute(self, key, value, hash_type):
+        """Hash an attribute, or return its cached hash. See `_cached_hashes()`"""
+        hashes = self._cached_hashes(key, value)
+        if hash_type not in hashes:
+            hashes[hash_type] = hash_value(value, hash_type)
+        return hashes[hash_type]
+
     def update_catalog(self, catalog_path=None):
         """Update the dataset catalog with my metadata
 
@@ -134,11 +269,65 @@ class Dataset(Bunch):
         """
         logger.debug(f"Re-scanning Dataset catalog before update")
         dataset_name = self["metadata"]["dataset_name"]
-        catalog = Catalog.load('datasets', catalog_path=catalog_path)
+        catalog = Catalog.load('datasets', catalog_path=catalog_path, lazy=True)
         catalog[dataset_name] = self['metadata']
         logger.debug(f"Updated dataset catalog with '{dataset_name}' metadata")
 
 
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        if type(value) is _Deferred:
+            self._materialize()
+            value = super().__getitem__(key)
+        return value
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def items(self):
+        self._materialize()
+        return super().items()
+
+    def values(self):
+        self._materialize()
+        return super().values()
+
+    def _materialize(self):
+        """Read any deferred attributes (see `from_disk(lazy=True)`) from disk"""
+        deferred = {key: value for key, value in super().items() if type(value) is _Deferred}
+        if not deferred:
+            return
+        logger.debug(f"Reading deferred attributes {list(deferred)} of Dataset:{self.name}")
+        ds = next(iter(deferred.values())).loader()
+        if not ds.HASHES.items() <= self.HASHES.items():
+            raise ValidationError(f"On-disk hashes:{ds.HASHES} for Dataset:{self.name} have changed since it was "
+                                  f"loaded:{self.HASHES}")
+        for key in deferred:
+            super().__setitem__(key, ds[key])
+
+    @property
+    def is_loaded(self):
+        """False if any attributes have yet to be read from disk. See `from_disk(lazy=True)`"""
+        return not any(type(value) is _Deferred for value in super().values())
+
+    def attribute_info(self, key='data'):
+        """The type, shape and dtype of an attribute, without reading it from disk
+
+        >>> import numpy as np
+        >>> Dataset('info_test', data=np.zeros((3, 2))).attribute_info('data')
+        {'type': 'numpy.ndarray', 'shape': (3, 2), 'dtype': 'float64'}
+
+        Returns
+        -------
+        dict. See `src.data.storage.describe()`
+        """
+        value = super().__getitem__(key)
+        if type(value) is _Deferred:
+            return value.info
+        return describe(value)
+
     def __getattribute__(self, key):
         if key.isupper():
             try:
@@ -154,13 +343,9 @@ class Dataset(Bunch):
         elif key == 'name':
             self['metadata']['dataset_name'] = value
         elif key in ['extra_base', 'extra_auth_kwargs']:
-            if self.name not in paths._config.sections():
-                paths._config.add_section(self.name)
             if key == 'extra_auth_kwargs':
-                paths._config.set(self.name, key, json.dumps(value, sort_keys=True))
-            else:
-                paths._config.set(self.name, key, value)
-            paths._write()
+                value = json.dumps(value, sort_keys=True)
+            paths.set_option(self.name, key, value)
             logger.debug(f"Writing {key} to [{self.name}] in local_config")
         else:
             super().__setattr__(key, value)
@@ -170,22 +355,20 @@ class Dataset(Bunch):
             del self['metadata'][key.lower()]
         elif key == 'name':
             raise ValueError("name is mandatory")
-        elif key == 'extra_base':
-            if paths._config.has_section(self.name) and paths._config.has_option(self.name, key):
-                paths._config.remove_option(self.name, key)
-                paths._write()
+        elif key in ['extra_base', 'extra_auth_kwargs']:
+            if paths.remove_option(self.name, key):
                 logger.debug(f"Removing {key} from [{self.name}] in local_config")
         else:
             super().__setattr__(key, value)
 
     def __str__(self):
         s = f"<Dataset: {self.name}"
-        if self.get('data', None) is not None:
-            shape = getattr(self.data, 'shape', 'Unknown')
-            s += f", data.shape={shape}"
-        if self.get('target', None) is not None:
-            shape = getattr(self.target, 'shape', 'Unknown')
-            s += f", target.shape={shape}"
+        for key in ['data', 'target']:
+            if dict.get(self, key) is not None:
+                shape = self.attribute_info(key)['shape']
+                if shape is None:
+                    shape = 'Unknown'
+                s += f", {key}.shape={shape}"
         meta = self.get('metadata', {})
         if meta:
             s += f", metadata={list(meta.keys())}"
@@ -204,14 +387,14 @@ class Dataset(Bunch):
 
     @property
     def has_target(self):
-        return self['target'] is not None
+        return dict.get(self, 'target') is not None
 
     def resolve_local_config(self, key, default=None, kind="string"):
         """Check for local data, first from the local data store, then from metadata. Finally, from the supplied default
         """
-        if paths._config.has_section(self.name) and paths._config.has_option(self.name, key):
+        local_config = paths.get_option(self.name, key)
+        if local_config is not None:
             logger.debug(f"Retrieving {key} from [{self.name}] in local_config")
-            local_config = paths._config.get(self.name, key)
         else:
             local_config = self.metadata.get(key, None)
             if local_config:
@@ -252,7 +435,8 @@ class Dataset(Bunch):
 
     @classmethod
     def from_disk(cls, dataset_name, data_path=None, metadata_only=False, errors=True,
-                  catalog_path=None, dataset_path='datasets', check_hashes=True):
+                  catalog_path=None, dataset_path='datasets', check_hashes=True, mmap_mode=None,
+                  columns=None, filters=None, lazy=False):
         """Load a dataset (or its metadata) by name
 
         errors: Boolean
@@ -271,7 +455,28 @@ class Dataset(Bunch):
         check_hashes: Boolean
             if True, dataset will only be loaded if hashes match the dataset catalog
             if False, no hash checking will be performed
+        mmap_mode: {None, 'r+', 'r', 'w+', 'c'}
+            If not None, memory-map numpy arrays (rather than reading them into memory) using this mode.
+            See `numpy.load()`. Only arrays dumped in 'npy' (or the default 'joblib') format are memory-mapped
+        columns: list or None
+            If not None, load only these columns of the (DataFrame) `data`. If `check_hashes`,
+            the columns loaded are verified against the per-column hashes in the catalog.
+        filters: list of (column, op, value) or None
+            If not None, load only the rows of `data` (and `target`) matching every filter;
+            e.g. [('points', '>=', 90), ('variety', 'in', ['Syrah', 'Riesling']), ('price', 'notna', None)]
+            See `src.data.storage.filter_mask()`.
+
+        lazy: Boolean
+            if True, defer reading the data (and any other attributes) from disk until one of
+            them is first accessed. Until then, their type, shape and dtype are available via
+            `attribute_info()`. Requires a `.metadata` file written by a recent `dump()`;
+            otherwise, the Dataset is read immediately. Can't be combined with `columns` or `filters`.
+
+        Where the storage format allows (see `Dataset.dump()`), only the columns (and
+        parquet row groups) needed are read from disk.
         """
+        if lazy and (columns is not None or filters):
+            raise ValueError("lazy=True can't be combined with `columns` or `filters`")
         if data_path is None:
             data_path = paths['processed_data_path']
         else:
@@ -282,10 +487,11 @@ class Dataset(Bunch):
 
         if check_hashes:
             logger.debug("Verifying hashes using Dataset catalog.")
-            dataset_catalog = Catalog.load(dataset_path, catalog_path=catalog_path, create=False)
+            dataset_catalog = Catalog.load(dataset_path, catalog_path=catalog_path, create=False, lazy=True)
             if dataset_name not in dataset_catalog:
                 raise KeyError(f"Dataset:{dataset_name} not in catalog but check_hashes=True")
             catalog_hashes = dataset_catalog[dataset_name].get("hashes", {})
+            catalog_column_hashes = dataset_catalog[dataset_name].get("column_hashes", {})
             if not catalog_hashes:
                 logger.warning(f"check_hashes=True but no hashes in catalog for Dataset:{dataset_name}")
 
@@ -294,6 +500,7 @@ class Dataset(Bunch):
                 raise FileNotFoundError(f"No dataset {dataset_name} in {data_path}.")
             else:
                 return None
+        import joblib
         with open(metadata_fq, 'rb') as fd:
             meta = joblib.load(fd)
 
@@ -303,12 +510,44 @@ class Dataset(Bunch):
         if metadata_only:
             return meta
 
+        info = meta.get('storage', {}).get('info')
+        if lazy and info is not None:
+            logger.debug(f"Deferring load of {dataset_name} from disk")
+            loader = partial(cls.from_disk, dataset_name, data_path=data_path, check_hashes=False, mmap_mode=mmap_mode)
+            metadata = {key: value for key, value in meta.items() if key != 'storage'}
+            ds = cls(dataset_name, metadata=metadata, update_hashes=False)
+            for key, attr_info in info.items():
+                if attr_info['type'] == 'builtins.NoneType':
+                    ds[key] = None
+                else:
+                    ds[key] = _Deferred(attr_info, loader)
+            return ds
+
         logger.debug(f"Load {dataset_name} from disk...")
-        with open(dataset_fq, 'rb') as fd:
-            ds = joblib.load(fd)
+        storage = meta.get('storage', {})
+        ds = read_dataset(dataset_fq, mmap_mode=mmap_mode, compress=storage.get('compress'))
+        if storage.get('attributes'):
+            logger.debug(f"Load {list(storage['attributes'])} ({storage['format']}) from disk...")
+            # rows of `target` must be selected along with those of `data`
+            pushed_filters = None if 'target' in storage['attributes'] else filters
+            attributes = load_attributes(storage, data_path, mmap_mode=mmap_mode,
+                                         columns=filter_columns(columns, filters), filters=pushed_filters)
+            for key, value in attributes.items():
+                ds[key] = value
 
         if check_hashes and not (catalog_hashes.items() <= ds.HASHES.items()):
             raise ValidationError(f"Dataset hashes do note match catalog or on-disk metadata for Dataset:{dataset_name}")
+
+        if columns is not None or filters:
+            ds['data'], ds['target'] = select(ds['data'], ds.get('target'), columns=columns, filters=filters)
+            if check_hashes and columns is not None and not filters:
+                # the catalog takes precedence over the on-disk metadata
+                expected = {**meta.get('column_hashes', {}).get('data', {}),
+                            **catalog_column_hashes.get('data', {})}
+                mismatched = [column for column in columns if column in expected and
+                              _column_hash(ds['data'][column], expected[column].split(':')[0]) != expected[column]]
+                if mismatched:
+                    raise ValidationError(f"Column hashes for {mismatched} do not match catalog for Dataset:{dataset_name}")
         return ds
 
     @classmethod
@@ -318,6 +557,10 @@ class Dataset(Bunch):
          catalog_path=None,
          dataset_path='datasets',
          transformer_path='transformers',
+         mmap_mode=None,
+         columns=None,
+         filters=None,
+         lazy=False,
         ):
         """
         Load a dataset (or its metadata) from the dataset catalog.
@@ -344,6 +587,17 @@ class Dataset(Bunch):
             name of dataset catalog directory. Relative to `catalog_path`.
         transformer_path: str.
             name of transformers catalog directory. Relative to `catalog_path`.
+        mmap_mode: {None, 'r+', 'r', 'w+', 'c'}
+            If not None, memory-map numpy arrays using this mode when loading Datasets from disk.
+            See `from_disk()`
+        columns: list or None
+            If not None, load only these columns of the (DataFrame) `data`. See `from_disk()`
+        filters: list of (column, op, value) or None
+            If not None, load only the rows of `data` (and `target`) that match every filter.
+            See `from_disk()`
+        lazy: Boolean
+            if True, and the dataset is cached on disk, defer reading its data until first accessed.
+            See `from_disk()`
         """
         if dataset_cache_path is None:
             dataset_cache_path = paths['processed_data_path']
@@ -359,13 +613,18 @@ class Dataset(Bunch):
         catalog_hashes = meta.get('hashes')
 
         if metadata_only:
-            return meta
+            # a copy: the catalog (and its entries) are shared process-wide
+            return copy.deepcopy(meta)
         try:
             ds = cls.from_disk(dataset_name, data_path=dataset_cache_path,
                                metadata_only=metadata_only,
                                errors=True,
                                catalog_path=catalog_path,
-                               dataset_path=dataset_path)
+                               dataset_path=dataset_path,
+                               mmap_mode=mmap_mode,
+                               columns=columns,
+                               filters=filters,
+                               lazy=lazy)
             logger.debug(f"Loaded {dataset_name} from disk.")
             generated_hashes = ds.metadata['hashes']
             if catalog_hashes is not None:
@@ -381,8 +640,11 @@ class Dataset(Bunch):
                 dataset_cache_path=dataset_cache_path,
                 catalog_path=catalog_path,
                 dataset_path=dataset_path,
-                transformer_path=transformer_path
+                transformer_path=transformer_path,
+                mmap_mode=mmap_mode,
             )
+            if ds is not None and (columns is not None or filters):
+                ds['data'], ds['target'] = select(ds['data'], ds.get('target'), columns=columns, filters=filters)
 
         return ds
 
@@ -393,7 +655,8 @@ class Dataset(Bunch):
          catalog_path=None,
          dataset_path='datasets',
          transformer_path='transformers',
-         exhaustive=False
+         exhaustive=False,
+         mmap_mode=None,
         ):
         """Load a dataset (or its metadata) from the dataset catalog.
 
@@ -418,6 +681,9 @@ class Dataset(Bunch):
             name of transformer catalog path. Relative to `catalog_path`.
         exhaustive: Boolean
             if True, ignore any on-disk Datasets and regenerate every node from its catalog entry.
+        mmap_mode: {None, 'r+', 'r', 'w+', 'c'}
+            If not None, memory-map numpy arrays of the input Datasets loaded from disk
+            during generation. See `from_disk()`
         """
         if dataset_cache_path is None:
             dataset_cache_path = paths['processed_data_path']
@@ -434,9 +700,10 @@ class Dataset(Bunch):
         ## XX check if cached copy of dataset is already on disk
 
         if metadata_only:
-            return meta
+            # a copy: the catalog (and its entries) are shared process-wide
+            return copy.deepcopy(meta)
 
-        dsdict = dag.generate(dataset_name, exhaustive=exhaustive)
+        dsdict = dag.generate(dataset_name, exhaustive=exhaustive, mmap_mode=mmap_mode)
         if dsdict is None or dataset_name not in dsdict:
             return None
 
@@ -485,7 +752,7 @@ class Dataset(Bunch):
             cache_path = paths['interim_data_path']
         else:
             cache_path = pathlib.Path(cache_path)
-        dsrc_dict = Catalog.load('datasources')
+        dsrc_dict = Catalog.load('datasources', lazy=True)
         if datasource_name not in dsrc_dict:
             raise NotFoundError(f'Unknown Datasource={datasource_name} specified for datset={dataset_name}')
         dsrc = DataSource.from_dict(dsrc_dict[datasource_name])
@@ -502,14 +769,16 @@ class Dataset(Bunch):
     def _generate_data_hashes(self, exclude_list=None, hash_type='sha1'):
         """Compute a the hash of data items
 
+        Hashes are cached until the attribute is reassigned. See `_cached_hashes()`
+
         Parameters
         ----------
         exclude_list: list or None
             List of attributes to skip.
             if None, skips ['metadata'] and all dunder attributes
 
-        hash_type: {'sha1', 'md5'}
-            Algorithm to use for hashing. Must be valid joblib hash type
+        hash_type: {'sha1', 'md5', 'stream-sha1', 'stream-md5', 'vector-sha1', 'vector-md5'}
+            Type of hash to use. See `src.data.hashing`
         """
         if exclude_list is None:
             exclude_list = ['metadata']
@@ -519,8 +788,7 @@ class Dataset(Bunch):
         for key, value in self.items():
             if key in exclude_list or key.startswith("__"):
                 continue
-            data_hash = joblib.hash(value, hash_name=hash_type)
-            hashes[key] = f"{hash_type}:{data_hash}"
+            hashes[key] = self._hash_attribute(key, value, hash_type)
         ret["hashes"] = hashes
         return ret
 
@@ -533,8 +801,8 @@ class Dataset(Bunch):
             List of attributes to skip.
             if None, skips ['metadata']
 
-        hash_type: {'sha1', 'md5'}
-            Algorithm to use for hashing. Must be valid joblib hash type
+        hash_type: {'sha1', 'md5', 'stream-sha1', 'stream-md5', 'vector-sha1', 'vector-md5'}
+            Type of hash to use. See `src.data.hashing`
 
         update_metadata: Boolean
             if False, new hashes will be returned only. Object metadata will not be changed.
@@ -542,10 +810,47 @@ class Dataset(Bunch):
         """
         data_hashes = self._generate_data_hashes(exclude_list=exclude_list, hash_type=hash_type)
         if update_metadata:
-            logger.debug(f"Updating hashes for dataset '{self.name}': {data_hashes}.")
-            self['metadata'] = {**self['metadata'], **data_hashes}
+            self._set_hashes(data_hashes['hashes'])
         return data_hashes
 
+    def _set_hashes(self, hashes):
+        """Set the data/target hashes in object metadata, dropping column hashes if they are stale"""
+        logger.debug(f"Updating hashes for dataset '{self.name}': {hashes}.")
+        metadata = self['metadata']
+        if metadata.get('hashes') != hashes:
+            # column hashes are stale too
+            metadata = {key: value for key, value in metadata.items() if key != 'column_hashes'}
+        self['metadata'] = {**metadata, 'hashes': hashes}
+
+
+    def _generate_column_hashes(self, exclude_list=None, hash_type='sha1'):
+        """Compute the hashes of the columns of DataFrame attributes
+
+        Used to verify a subset of the columns, when only those are loaded. See `from_disk()`.
+        Only DataFrames with string column names are hashed.
+
+        Parameters
+        ----------
+        exclude_list: list or None
+            List of attributes to skip.
+            if None, skips ['metadata'] and all dunder attributes
+        hash_type: {'sha1', 'md5', 'stream-sha1', 'stream-md5', 'vector-sha1', 'vector-md5'}
+            Type of hash to use. See `src.data.hashing`
+
+        Returns
+        -------
+        {'column_hashes': {attribute: {column: hash}}}
+        """
+        if exclude_list is None:
+            exclude_list = ['metadata']
+        pd = sys.modules.get('pandas')
+        column_hashes = {}
+        for key, value in self.items():
+            if key in exclude_list or key.startswith("__"):
+                continue
+            if pd is not None and isinstance(value, pd.DataFrame) and all(isinstance(c, str) for c in value.columns):
+                column_hashes[key] = {column: _column_hash(value[column], hash_type) for column in value.columns}
+        return {'column_hashes': column_hashes}
 
     def verify_hashes(self, hashdict=None, catalog_path=None):
         """Verify the supplied hash dictionary is a subset of my hash dictionary
@@ -564,6 +869,11 @@ class Dataset(Bunch):
         >>> ds.verify_hashes(reverse_hashdict)
         True
 
+        If `hashdict` uses a different type of hash to my metadata, I am rehashed (without
+        updating my metadata) with its type; e.g.
+        >>> ds.verify_hashes(ds.update_hashes(hash_type='vector-sha1', update_metadata=False)['hashes'])
+        True
+
         Parameters
         ----------
         hashdict: Dict(str,str) or None
@@ -575,9 +885,13 @@ class Dataset(Bunch):
         """
         if hashdict is None:
             logger.debug("Reading hashes from dataset catalog")
-            c = Catalog.load("datasets", catalog_path=catalog_path)
+            c = Catalog.load("datasets", catalog_path=catalog_path, lazy=True)
             hashdict = c[self.name]["hashes"]
-        return hashdict.items() <= self.metadata['hashes'].items()
+        hashes = self.metadata['hashes']
+        hash_type = hash_type_of(hashdict)
+        if hashdict and hash_type != hash_type_of(hashes, default=hash_type):
+            hashes = self._generate_data_hashes(hash_type=hash_type)['hashes']
+        return hashdict.items() <= hashes.items()
 
     def verify_extra(self, extra_base=None, file_dict=None, return_filelists=False, hash_types=['size']):
         """
@@ -730,11 +1044,12 @@ class Dataset(Bunch):
         if auth_kwargs:
             logger.debug(f"Passing authentication information via auth_kwargs")
 
+        import fsspec
         return fsspec.open(self.extra_file(relative_path), **auth_kwargs, **kwargs)
 
     def dump(self, file_base=None, dump_path=None, hash_type='sha1',
              exists_ok=False, create_dirs=True, dump_metadata=True, update_catalog=True,
-             catalog_path=None):
+             catalog_path=None, format=None, compress=None, object_store=False):
         """Dump a dataset to disk.
 
         Note, this dumps a separate copy of the metadata structure,
@@ -742,14 +1057,19 @@ class Dataset(Bunch):
         which could be large. It also (optionally, but by default) adds this
         metadata to the dataset catalog.
 
+        The storage format is recorded (under 'storage') in the standalone copy
+        of the metadata, so that `from_disk` can pick the right reader.
+
         dump_metadata: boolean
             If True, also dump a standalone copy of the metadata.
             Useful for checking metadata without reading
             in the (potentially large) dataset itself
         file_base: string
             Filename stem. By default, just the dataset name
-        hash_type: {'sha1', 'md5'}
-            Hash function to use for hashing data/labels
+        hash_type: {'sha1', 'md5', 'stream-sha1', 'stream-md5', 'vector-sha1', 'vector-md5'}
+            Type of hash to use for hashing data/labels. See `src.data.hashing`.
+            With a stream- hash type and a `format` other than 'joblib', numpy arrays stored
+            as 'npy' are hashed as they are written, so are serialized only once.
         dump_path: path. (default: `paths['processed_data_path']`)
             Directory where data will be dumped.
         exists_ok: boolean
@@ -761,23 +1081,61 @@ class Dataset(Bunch):
             if True, new metadata will be written to catalog
         catalog_path: path or None
             Location of catalog file. default paths['catalog_path']
+        format: str or None
+            How to store the data. One of `available_formats()`. Default 'joblib'.
+            'joblib': pickle the entire dataset into the `.dataset` file.
+            Otherwise, store each attribute (e.g. data, target) in a file of its own,
+            using this format where possible (e.g. 'parquet' or 'feather' for DataFrames),
+            'npy' for numpy arrays, and 'pickle' for anything else. See `src.data.storage`.
+            The columns of DataFrames stored this way are also hashed (in metadata['column_hashes']),
+            so that they can be loaded, and verified, individually. See `from_disk()`.
+        compress: None, bool, int, str or (str, int)
+            Compression codec ('zstd', 'lz4', 'gzip', 'bz2' or 'xz') and level; e.g. ('zstd', 3).
+            Default: no compression. See `src.data.storage.normalize_compress()`.
+            Compression (other than that of 'parquet' and 'feather') prevents memory-mapping.
+        object_store: boolean
+            If True, store each (non-None) attribute in the content-addressed object store
+            (`dump_path/objects`), under its hash, and only if no identical payload is stored
+            there already. The `.dataset` file then holds just the metadata (and any None
+            attributes). 'joblib' format is stored as 'npy' for numpy arrays (so they can be
+            memory-mapped), and 'pickle' for anything else.
+            See `prune_object_store()` to remove payloads no longer used by any Dataset.
 
         """
         if dump_path is None:
             dump_path = paths['processed_data_path']
         dump_path = pathlib.Path(dump_path)
+        if format is None:
+            format = DEFAULT_FORMAT
+        if object_store and format == DEFAULT_FORMAT:
+            format = 'npy'  # and 'pickle', for anything that isn't a numpy array
+        compress = normalize_compress(compress)
+        if (format != DEFAULT_FORMAT or compress is not None) and not dump_metadata:
+            raise ValueError(f"format='{format}' and compress={compress} require dump_metadata=True")
 
         if file_base is None:
             file_base = self.name
 
-        metadata = self['metadata']
-
         metadata_filename = file_base + '.metadata'
         dataset_filename = file_base + '.dataset'
         metadata_fq = dump_path / metadata_filename
 
-        self.update_hashes(hash_type=hash_type)
+        # Hash the attributes while writing them, rather than beforehand
+        # (The object store needs the hashes first, to know where the attributes go)
+        hash_on_write = format != DEFAULT_FORMAT and is_stream_hash(hash_type) and not object_store
+        # The hashes recorded on disk (and in the catalog) must be of what is written.
+        # Attributes may have been changed in place since they were hashed, so rehash them all
+        self.__dict__.pop('_hash_cache', None)
+        if not hash_on_write:
+            self.update_hashes(hash_type=hash_type)
+        if format != DEFAULT_FORMAT:
+            # Columns may be loaded individually. See `from_disk()`
+            column_hashes = self._generate_column_hashes(hash_type=hash_type)
+            if column_hashes['column_hashes']:
+                self['metadata'] = {**self['metadata'], **column_hashes}
+        metadata = self['metadata']
 
+        import joblib
         # check for a cached version
         if metadata_fq.exists() and exists_ok is not True:
             logger.warning(f"Existing metatdata file found: {metadata_fq}")
@@ -796,17 +1154,38 @@ class Dataset(Bunch):
         if create_dirs:
             os.makedirs(metadata_fq.parent, exist_ok=True)
 
+        dataset = self
+        storage = {'format': format, 'compress': compress}
+        if format != DEFAULT_FORMAT:
+            # The attributes are stored separately. The .dataset file holds the rest
+            attributes = {key: value for key, value in self.items()
+                          if key != 'metadata' and value is not None}
+            storage = dump_attributes(attributes, file_base, dump_path, format, compress=compress,
+                                      hash_type=hash_type if hash_on_write else None,
+                                      object_hashes=metadata['hashes'] if object_store else None)
+            if hash_on_write:
+                column_hashes = self['metadata'].get('column_hashes')
+                for key, value in attributes.items():
+                    self._cached_hashes(key, value)[hash_type] = storage['attributes'][key]['hash']
+                self._set_hashes(self._generate_data_hashes(hash_type=hash_type)['hashes'])
+                if column_hashes:  # hashed from the current columns, so still valid
+                    self['metadata'] = {**self['metadata'], 'column_hashes': column_hashes}
+                metadata = self['metadata']
+            dataset = copy.copy(self)
+            for key in attributes:
+                dataset[key] = None
+        storage['info'] = {key: describe(value) for key, value in self.items() if key != 'metadata'}
+
         if dump_metadata:
             with open(metadata_fq, 'wb') as fo:
-                joblib.dump(metadata, fo)
+                joblib.dump({**metadata, 'storage': storage}, fo)
             logger.debug(f'Wrote Dataset Metadata: {metadata_filename}')
 
         if update_catalog:
             self.update_catalog(catalog_path=catalog_path)
 
         dataset_fq = dump_path / dataset_filename
-        with open(dataset_fq, 'wb') as fo:
-            joblib.dump(self, fo)
+        write_dataset(dataset, dataset_fq, compress=compress)
         logger.debug(f'Wrote Dataset: {dataset_filename}')
 
 def process_datasources(datasources=None, action='process'):
@@ -1435,6 +1814,7 @@ class DataSource(object):
         for key in ignore:
             my_dict.pop(key, None)
 
+        import joblib
         if include_dict:
             return joblib.hash(my_dict, hash_name=hash_type), my_dict
         return joblib.hash(my_dict, hash_name=hash_type)
@@ -1473,7 +1853,7 @@ class DataSource(object):
             Name of json file containing key/dict map
 
         """
-        datasources = Catalog.load('datasources', catalog_path=datasource_path)
+        datasources = Catalog.load('datasources', catalog_path=datasource_path, lazy=True)
         return cls.from_dict(datasources[datasource_name])
 
     def update_catalog(self, catalog_path=None):
@@ -1484,7 +1864,7 @@ class DataSource(object):
         catalog_path: path or None
             Location of catalog file. default paths['catalog_path']
         """
-        catalog = Catalog.load('datasources', catalog_path=catalog_path)
+        catalog = Catalog.load('datasources', catalog_path=catalog_path, lazy=True)
         catalog[self.name] = self.to_dict()
         logger.debug(f"Updated datasource:{self.name} in catalog")
 
@@ -1590,9 +1970,10 @@ class DatasetGraph:
         if transformers:
             self.transformers = Catalog.load(self._transformer_path, catalog_path=self._catalog_path,
                                              create=create, ignore_errors=True)
+            self.transformers.index_on('output_datasets')
         if datasets:
             self.datasets = Catalog.load(self._dataset_path, catalog_path=self._catalog_path,
-                                         create=create, ignore_errors=True)
+                                         create=create, ignore_errors=True, lazy=True)
         self._validate_hypergraph()
         self._update_degrees()
 
@@ -1622,14 +2003,15 @@ class DatasetGraph:
             if True, add any undefined nodes to the Datset catalog as empty records"""
 
         valid = True
-        for node in self.nodes:
-            if node not in self.datasets:
-                if add_empty_datasets:
-                    logger.info(f"Adding placeholder Dataset:'{node}' to catalog")
-                    self.datasets[node] = {'dataset_name': node}
-                else:
-                    logger.warning(f"Node '{node}' not found in Dataset catalog.")
-                    valid = False
+        with self.datasets.batch():
+            for node in self.nodes:
+                if node not in self.datasets:
+                    if add_empty_datasets:
+                        logger.info(f"Adding placeholder Dataset:'{node}' to catalog")
+                        self.datasets[node] = {'dataset_name': node}
+                    else:
+                        logger.warning(f"Node '{node}' not found in Dataset catalog.")
+                        valid = False
 
         return valid
 
@@ -1881,15 +2263,16 @@ class DatasetGraph:
 
         if edge_name in self.transformers and not overwrite_catalog:
             raise ObjectCollision(f"Transformer '{edge_name}' already in catalog. Use overwrite_catalog=True to overwrite")
-        if write_catalog:
-            self.transformers[edge_name] = catalog_entry
-        for ds in set(input_datasets):
-            if ds not in self.datasets:
-                if write_catalog:
-                    logger.info(f"Adding empty input Dataset:'{ds}' to catalog")
-                    self.datasets[ds] = {'dataset_name': ds}
-                else:
-                    logger.warning("Input dataset: '{ds}' missing from Datset catalog")
+        with self.transformers.batch(), self.datasets.batch():
+            if write_catalog:
+                self.transformers[edge_name] = catalog_entry
+            for ds in set(input_datasets):
+                if ds not in self.datasets:
+                    if write_catalog:
+                        logger.info(f"Adding empty input Dataset:'{ds}' to catalog")
+                        self.datasets[ds] = {'dataset_name': ds}
+                    else:
+                        logger.warning("Input dataset: '{ds}' missing from Datset catalog")
 
         for ds in set(output_datasets):
             if ds not in self.datasets:
@@ -1934,9 +2317,9 @@ class DatasetGraph:
             set of all the output nodes generated by this edge
 
         """
-        for hename, he in self.transformers.items():
-            if node in he['output_datasets']:
-                return set(he.get('input_datasets', [])), hename, set(he['output_datasets'])
+        for hename in sorted(self.transformers.find(output_datasets=node)):
+            he = self.transformers[hename]
+            return set(he.get('input_datasets', [])), hename, set(he['output_datasets'])
         raise NotFoundError(f"Node '{node}' not found in transformer graph")
 
     def is_source(self, edge):
@@ -2002,7 +2385,8 @@ class DatasetGraph:
                 edges += [edge]
         return list(reversed(visited)), list(reversed(edges))
 
-    def process_edge(self, edge_name, write_dataset=True, overwrite_catalog=False, dataset_path=None):
+    def process_edge(self, edge_name, write_dataset=True, overwrite_catalog=False, dataset_path=None,
+                     mmap_mode=None):
         """Generate the outputs for a given edge in the DatasetGraph
 
         This assumes all dependencies for this edge are already on-disk and have valid hashes.
@@ -2017,6 +2401,13 @@ class DatasetGraph:
             If True, write updated metadata even if Dataset hashes differ. Requires write_dataset=True
         dataset_path: path
             location of saved dataset files
+        mmap_mode: {None, 'r+', 'r', 'w+', 'c'}
+            If not None, memory-map numpy arrays of the input datasets using this mode.
+            See `Dataset.from_disk()`
+
+        Regenerated datasets are hashed with the type of hash already in the catalog.
+        With a stream- hash type, a dataset with no catalog hashes to verify is written in
+        'npy' format, and its numpy arrays hashed as they are written. See `Dataset.dump()`
 
         returns:
             dict {dataset_name: Dataset}
@@ -2036,7 +2427,7 @@ class DatasetGraph:
             logger.debug(f"process_edge: Loading Input Dataset '{in_ds}'")
             if in_ds not in self.datasets:
                 raise NotFoundError(f"Edge '{edge_name}' specifies an input dataset, '{in_ds}' that is not in the dataset catalog")
-            ds = Dataset.from_disk(in_ds, check_hashes=True)
+            ds = Dataset.from_disk(in_ds, check_hashes=True, mmap_mode=mmap_mode)
             dsdict[in_ds] = ds
 
         for xform_dict in edge.get('transformations', ()):
@@ -2047,33 +2438,44 @@ class DatasetGraph:
             logger.info(f"Generated output datasets: {list(dsdict.keys())} via edge:'{edge_name}'")
             on_disk_datasets = processed_datasets(dataset_path=dataset_path)
             success = True
-            for ds_name, ds in dsdict.items():
-                if ds is None:
-                    logger.warning(f"Failed to generate output Dataset: '{ds_name}'")
-                    success = False
-                    continue
-                # Dataset is created, but doesn't have hashes yet
-                ds.update_hashes()
-                generated_hashes = ds.metadata.get("hashes", {})
-                if overwrite_catalog:
-                    logger.debug(f"process_edge: Updating catalog entry for {ds.name}")
-                    self.datasets[ds_name] = ds.metadata
-                else: # don't overwrite catalog
-                    if ds_name not in self.datasets:
-                        logger.warning(f"Dataset:{ds_name} not in catalog. Cannot verify generated hashes")
-                    else: # ds_name is in self.datasets. Check its hash
-                        catalog_hashes = self.datasets[ds_name].get("hashes", {})
-                        if not ds.verify_hashes(catalog_hashes):
-                            logger.warning(f"Hash Validation Failed. Dataset:'{ds.name}' hashes:{ds.HASHES} do not match catalog hashes:{catalog_hashes}")
-                            success = False
-                            continue
-
-                if write_dataset and (overwrite_catalog or ds_name not in on_disk_datasets):
-                    if overwrite_catalog:
-                        logger.debug(f"process_edge: Overwriting '{ds_name}' in `dataset_path`")
-                    else:
+            with self.datasets.batch():
+                for ds_name, ds in dsdict.items():
+                    if ds is None:
+                        logger.warning(f"Failed to generate output Dataset: '{ds_name}'")
+                        success = False
+                        continue
+                    # Dataset is created, but doesn't have hashes yet. Use the catalog's type of hash
+                    hash_type = hash_type_of(self.datasets[ds_name].get("hashes", {})) if ds_name in self.datasets else 'sha1'
+                    write = write_dataset and (overwrite_catalog or ds_name not in on_disk_datasets)
+                    if write and is_stream_hash(hash_type) and (overwrite_catalog or ds_name not in self.datasets):
+                        # Nothing to verify first, so hash it as it is written. (The catalog is updated below)
                         logger.debug(f"process_edge: Writing '{ds_name}' to `dataset_path`")
-                    ds.dump(dump_path=dataset_path, exists_ok=True, update_catalog=overwrite_catalog)
+                        ds.dump(dump_path=dataset_path, exists_ok=True, update_catalog=False,
+                                hash_type=hash_type, format='npy')
+                        write = False
+                    else:
+                        ds.update_hashes(hash_type=hash_type)
+                    generated_hashes = ds.metadata.get("hashes", {})
+                    if overwrite_catalog:
+                        logger.debug(f"process_edge: Updating catalog entry for {ds.name}")
+                        self.datasets[ds_name] = ds.metadata
+                    else: # don't overwrite catalog
+                        if ds_name not in self.datasets:
+                            logger.warning(f"Dataset:{ds_name} not in catalog. Cannot verify generated hashes")
+                        else: # ds_name is in self.datasets. Check its hash
+                            catalog_hashes = self.datasets[ds_name].get("hashes", {})
+                            if not ds.verify_hashes(catalog_hashes):
+                                logger.warning(f"Hash Validation Failed. Dataset:'{ds.name}' hashes:{ds.HASHES} do not match catalog hashes:{catalog_hashes}")
+                                success = False
+                                continue
+
+                    if write:
+                        if overwrite_catalog:
+                            logger.debug(f"process_edge: Overwriting '{ds_name}' in `dataset_path`")
+                        else:
+                            logger.debug(f"process_edge: Writing '{ds_name}' to `dataset_path`")
+                        ds.dump(dump_path=dataset_path, exists_ok=True, update_catalog=overwrite_catalog,
+                                hash_type=hash_type)
             logger.debug(f"process_edge: Reloading Dataset catalog after processing edge:'{edge_name}'")
             self._update_catalogs(transformers=False, datasets=True, create=False)
             if success is False:
@@ -2132,7 +2534,8 @@ class DatasetGraph:
 
         return True
 
-    def generate(self, dataset_name, write_datasets=True, overwrite_catalog=False, exhaustive=False):
+    def generate(self, dataset_name, write_datasets=True, overwrite_catalog=False, exhaustive=False,
+                 mmap_mode=None):
         """Generate a dsdict containing the specified node (dataset) and its siblings
 
         If the edge that generates dataset_name produces additional (sibling) datsets,
@@ -2150,12 +2553,15 @@ class DatasetGraph:
             If False, skip regeneration if Dataset is present on-disk (with valid hashes)
         write_catalog: xxx
         overwrite_catalog: xxx
+        mmap_mode: {None, 'r+', 'r', 'w+', 'c'}
+            If not None, memory-map numpy arrays of input datasets loaded from disk. See `process_edge()`
         """
         logger.debug(f"Generating edge traversal list for Dataset:'{dataset_name}'")
         _, edge_list = self.traverse(dataset_name, exhaustive=exhaustive)
         logger.debug(f"Traversal complete. Edges to process: {edge_list}")
         for edge in edge_list:
-            dsdict = self.process_edge(edge, write_dataset=write_datasets, overwrite_catalog=overwrite_catalog)
+            dsdict = self.process_edge(edge, write_dataset=write_datasets, overwrite_catalog=overwrite_catalog,
+                                       mmap_mode=mmap_mode)
             if dsdict is None:
                 logger.error("Generation from DatasetGraph failed.")
                 return None
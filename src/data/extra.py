@@ -7,8 +7,6 @@ import pathlib
 import shutil
 import os
 
-from tqdm.auto import tqdm
-
 from .. import paths
 from ..log import logger
 
@@ -74,6 +72,7 @@ def process_extra_files(*, extract_dir=None, metadata=None, unpack_dir=None, fil
 
     file_dict = defaultdict(dict)
     files = sorted(list(unpack_dir.rglob(file_glob)))
+    from tqdm.auto import tqdm
     for i, file in enumerate(tqdm(files)):
         if file.is_dir():
             continue
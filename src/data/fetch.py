@@ -1,19 +1,14 @@
 import gzip
 import hashlib
-import joblib
 import os
 import pathlib
-import requests
 import shutil
 import tarfile
 import tempfile
 import zipfile
 import zlib
-import requests
-import joblib
-import gdown
 
-from tqdm.auto import tqdm
+# Heavy dependencies (joblib, requests, gdown, tqdm) are imported on first use, to keep `import src.data` fast.
 
 from .. import paths
 from ..log import logger
@@ -112,6 +107,7 @@ def hash_object(obj, hash_type="sha1"):
     -------
     A string: f"{hash_type}:{hash_value}"
     '''
+    import joblib
     data_hash = joblib.hash(obj, hash_name=hash_type).hexdigest()
     return f"{hash_type}:{data_hash}"
 
@@ -175,6 +171,8 @@ def tqdm_download(url, url_options=None, filename=None,
         filename = download_path / fn
     else:
         filename = pathlib.Path(filename)
+    import requests
+    from tqdm.auto import tqdm
     resp = requests.get(url, stream=True, **url_options)
     total = int(resp.headers.get('content-length', 0))
     with open(filename, 'wb') as file, tqdm(
@@ -435,6 +433,7 @@ def fetch_file(url=None, url_options=None, contents=None,
     if fetch_action == 'url':
         if url is None:
             raise Exception(f"fetch_action = {fetch_action} but `url` unspecified")
+        import requests
         # Download the file
         try:
             logger.debug(f"fetching {url}")
@@ -455,6 +454,7 @@ def fetch_file(url=None, url_options=None, contents=None,
         try:
             url_google_drive = f"https://drive.google.com/uc?id={url}"
             logger.debug(f"Fetch file ID {url} off of Google Drive (full URL {url_google_drive})")
+            import gdown
             gdown.download(url_google_drive, str(raw_data_file), quiet=False)
         except Exception as err:
             return False, err, None
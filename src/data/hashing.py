@@ -0,0 +1,186 @@
+"""Hashing of Dataset attributes
+
+Hashes are recorded as strings f"{hash_type}:{hash_value}". The hash types are:
+
+sha1, md5: `joblib.hash()` of the attribute. joblib pickles the attribute into the hash
+    (hashing the buffers of numpy arrays directly), so this serializes it once more than
+    writing it to disk does.
+stream-sha1, stream-md5: for numpy arrays (other than those of dtype object), the hash of
+    the bytes of their `.npy` file. This can be computed while the array is being written
+    to disk, so `Dataset.dump()` need only serialize it once. See
+    `src.data.storage.dump_attributes()`. Anything else is hashed as for sha1/md5: a plain
+    pickle isn't canonical (its bytes depend on the pickle protocol, and on which equal
+    objects, e.g. strings, happen to be shared), so it can't be hashed as it is written.
+vector-sha1, vector-md5: computed without pickling. DataFrames (and Series) are hashed column by
+    column with `pandas.util.hash_pandas_object()`, and numpy arrays over their raw buffer, in
+    chunks. Columns (and chunks) are hashed in parallel, by a thread pool, and their hashes
+    combined with the column names, dtypes and shape. Anything else is hashed as for sha1/md5.
+
+Every type of hash can be computed in memory (see `hash_value()`), which is how regenerated
+Datasets are verified against the catalog, whichever type of hash it records.
+"""
+import hashlib
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+__all__ = [
+    'available_hash_types',
+]
+
+STREAM_PREFIX = 'stream-'
+VECTOR_PREFIX = 'vector-'
+
+_ALGORITHMS = ('sha1', 'md5')
+
+# Numpy buffers are hashed in chunks of this size (in parallel), then the chunk hashes hashed
+_CHUNK_BYTES = 16 * 1024 ** 2
+
+
+def available_hash_types():
+    """Hash types that can be used for Dataset attributes
+
+    >>> available_hash_types()
+    ['sha1', 'md5', 'stream-sha1', 'stream-md5', 'vector-sha1', 'vector-md5']
+    """
+    return [*_ALGORITHMS, *(f"{prefix}{name}" for prefix in (STREAM_PREFIX, VECTOR_PREFIX) for name in _ALGORITHMS)]
+
+
+def base_algorithm(hash_type):
+    """The hashlib algorithm underlying a hash type
+
+    >>> base_algorithm('vector-md5')
+    'md5'
+    """
+    for prefix in (STREAM_PREFIX, VECTOR_PREFIX):
+        if hash_type.startswith(prefix):
+            return hash_type[len(prefix):]
+    return hash_type
+
+
+def is_stream_hash(hash_type):
+    """True if `hash_type` hashes the serialization of numpy arrays (and so can be computed while writing them)"""
+    return hash_type.startswith(STREAM_PREFIX)
+
+
+def hash_type_of(hashes, default='sha1'):
+    """The hash type used in a dict of hashes (e.g. a catalog entry's 'hashes'); `default` if it is empty
+
+    >>> hash_type_of({'data': 'stream-sha1:0a4d55a8d778e5022fab701977c5d840bbc486d0'})
+    'stream-sha1'
+    >>> hash_type_of({})
+    'sha1'
+    """
+    for value in hashes.values():
+        return value.split(':', 1)[0]
+    return default
+
+
+class HashingWriter:
+    """Binary file-like object that hashes everything written to it
+
+    If `fileobj` is not None, whatever is written is also passed on to it.
+    """
+    def __init__(self, hash_name, fileobj=None):
+        self._hash = hashlib.new(hash_name)
+        self._fileobj = fileobj
+
+    def write(self, data):
+        self._hash.update(data)
+        if self._fileobj is not None:
+            return self._fileobj.write(data)
+        return memoryview(data).nbytes
+
+    def flush(self):
+        if self._fileobj is not None:
+            self._fileobj.flush()
+
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
+
+def _is_npy(value):
+    """True if the stream- hash types hash `value` as its .npy serialization. Doesn't import numpy."""
+    np = sys.modules.get('numpy')
+    return np is not None and isinstance(value, np.ndarray) and not value.dtype.hasobject
+
+
+def _hash_column(column, hash_name):
+    """Digest of a Series or Index: its dtype, and the (vectorized) hashes of its values"""
+    import pandas as pd
+    try:
+        values = pd.util.hash_pandas_object(column, index=False).to_numpy()
+    except TypeError:  # unhashable values; e.g. lists
+        import joblib
+        return bytes.fromhex(joblib.hash(column.to_numpy(), hash_name=hash_name))
+    digest = hashlib.new(hash_name, str(column.dtype).encode('utf-8'))
+    digest.update(values)
+    return digest.digest()
+
+
+def _hash_columns(columns, shape, hash_name):
+    """Digest of (name, column) pairs, hashed in parallel"""
+    with ThreadPoolExecutor() as executor:
+        digests = list(executor.map(lambda column: _hash_column(column[1], hash_name), columns))
+    digest = hashlib.new(hash_name, repr(shape).encode('utf-8'))
+    for (name, _), column_digest in zip(columns, digests):
+        digest.update(repr(name).encode('utf-8'))
+        digest.update(column_digest)
+    return digest.hexdigest()
+
+
+def _hash_buffer(array, hash_name):
+    """Digest of a (non-object) numpy array: its dtype, shape, and raw buffer, hashed in parallel chunks"""
+    import numpy as np
+    data = np.ascontiguousarray(array).reshape(-1).view(np.uint8)
+    chunks = [data[i:i + _CHUNK_BYTES] for i in range(0, len(data), _CHUNK_BYTES)]
+    if len(chunks) > 1:
+        with ThreadPoolExecutor() as executor:
+            # hashlib releases the GIL while hashing large buffers
+            digests = list(executor.map(lambda chunk: hashlib.new(hash_name, chunk).digest(), chunks))
+    else:
+        digests = [hashlib.new(hash_name, chunk).digest() for chunk in chunks]
+    digest = hashlib.new(hash_name, f"{array.dtype.str}{array.shape}".encode('utf-8'))
+    for chunk_digest in digests:
+        digest.update(chunk_digest)
+    return digest.hexdigest()
+
+
+def _vector_hash(value, hash_name):
+    """hexdigest of a DataFrame, Series or numpy array. None for other objects"""
+    np = sys.modules.get('numpy')
+    pd = sys.modules.get('pandas')
+    if pd is not None and isinstance(value, pd.DataFrame):
+        columns = [('__index__', value.index)] + [(name, value.iloc[:, i]) for i, name in enumerate(value.columns)]
+        return _hash_columns(columns, value.shape, hash_name)
+    if pd is not None and isinstance(value, pd.Series):
+        return _hash_columns([('__index__', value.index), (value.name, value)], value.shape, hash_name)
+    if np is not None and isinstance(value, np.ndarray):
+        if not value.dtype.hasobject:
+            return _hash_buffer(value, hash_name)
+        if value.ndim == 1:
+            import pandas
+            return _hash_columns([(None, pandas.Series(value))], value.shape, hash_name)
+    return None
+
+
+def hash_value(value, hash_type='sha1'):
+    """Hash an attribute, as f"{hash_type}:{hash_value}"
+
+    hash_type: str
+        One of `available_hash_types()`
+    """
+    if is_stream_hash(hash_type) and _is_npy(value):
+        import numpy as np
+        writer = HashingWriter(base_algorithm(hash_type))
+        np.save(writer, value, allow_pickle=False)
+        return f"{hash_type}:{writer.hexdigest()}"
+    if hash_type.startswith(VECTOR_PREFIX):
+        vector_hash = _vector_hash(value, base_algorithm(hash_type))
+        if vector_hash is not None:
+            return f"{hash_type}:{vector_hash}"
+    import joblib
+    np = sys.modules.get('numpy')
+    if np is not None and isinstance(value, np.memmap):
+        # joblib hashes memmaps differently. Hash the array it maps (without copying it)
+        value = np.asarray(value)
+    return f"{hash_type}:{joblib.hash(value, hash_name=base_algorithm(hash_type))}"
@@ -0,0 +1,658 @@
+"""On-disk storage formats for Dataset attributes
+
+By default (format 'joblib'), `Dataset.dump()` pickles the entire Dataset into a single
+`.dataset` file. Any other format stores each (non-None) attribute of the Dataset
+(e.g. `data`, `target`) in a file of its own, named `{file_base}.{attribute}.{extension}`,
+using the first writer, in order, that can handle it:
+
+* the requested format (e.g. 'parquet' or 'feather', for DataFrames),
+* 'npy', for (non-object) numpy arrays,
+* 'pickle', for anything else.
+
+The format used for each attribute is recorded in the `.metadata` file (see `dump_attributes()`),
+so that `Dataset.from_disk()` can pick the right reader.
+
+Formats:
+
+joblib: the whole Dataset, via joblib. Always available.
+pickle: any object, via pickle. Always available.
+npy: numpy arrays (other than those of dtype object). Always available.
+parquet: pandas DataFrames. Requires pyarrow.
+feather: pandas DataFrames with a default (Range) index. Requires pyarrow.
+
+When read with an `mmap_mode`, 'npy' files (and numpy arrays in 'joblib' .dataset files)
+are memory-mapped rather than read into memory, so processes loading the same Dataset
+share its pages. Other formats ignore `mmap_mode`.
+
+When only some columns (or rows) of a DataFrame are wanted, 'parquet' and 'feather'
+read only those columns, and 'parquet' only the row groups that can match the `filters`.
+Other formats read everything; the selection is then made in memory. See `select()`.
+
+Whatever the format, the type, shape and dtype of each attribute are also recorded in the
+`.metadata` file (see `describe()`), so that they are available without reading the data.
+
+Files may be compressed (see `normalize_compress()`). 'parquet' and 'feather' use their own
+(per-column) compression; other files are compressed as a whole, and their names gain the
+codec's extension (e.g. `.zst`). Compressed files can't be memory-mapped.
+
+'npy' files can be hashed as they are written (with a stream- hash type), so that
+`Dataset.dump()` serializes numpy arrays only once. See `src.data.hashing`.
+
+Attributes may instead be stored in a content-addressed object store, in the `objects`
+subdirectory, under their hash (see `object_file()`). Each payload is then written only
+once, however many Datasets share it. See `Dataset.dump(object_store=True)`.
+
+Codecs:
+
+gzip, bz2, xz: always available.
+lz4: requires lz4.
+zstd: requires zstandard.
+"""
+import importlib.util
+import io
+import operator
+import os
+import pathlib
+import pickle
+import sys
+import uuid
+
+from ..log import logger
+from .hashing import HashingWriter, base_algorithm, hash_value, is_stream_hash
+
+__all__ = [
+    'available_codecs',
+    'available_formats',
+]
+
+DEFAULT_FORMAT = 'joblib'
+
+# Subdirectory (of the dataset directory) of the content-addressed object store
+OBJECTS_DIR = 'objects'
+
+# Row filters: (column, op, value). Rows where `column` is null match no comparison
+_COMPARISONS = {
+    '==': operator.eq,
+    '=': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    'in': lambda column, value: column.isin(value),
+    'not in': lambda column, value: ~column.isin(value),
+}
+# Null tests. Their `value` is ignored. These can't be pushed down to parquet
+_NULL_TESTS = {
+    'isna': lambda column: column.isna(),
+    'notna': lambda column: column.notna(),
+}
+
+
+class GzipCodec:
+    """gzip compression. Other codecs override `_open`"""
+    name = "gzip"
+    extension = "gz"
+    requires = ()
+    default_level = 6
+
+    def available(self):
+        return all(importlib.util.find_spec(module) is not None for module in self.requires)
+
+    def open(self, path, mode, level=None):
+        """Open a (binary) file. `level` is used only when writing"""
+        if 'r' in mode:
+            return self._open(path, mode)
+        return self._open(path, mode, self.default_level if level is None else level)
+
+    def _open(self, path, mode, level=None):
+        import gzip
+        if level is None:
+            return gzip.open(path, mode)
+        return gzip.open(path, mode, compresslevel=level)
+
+    def __repr__(self):
+        return f"<Codec:{self.name}>"
+
+
+class Bz2Codec(GzipCodec):
+    name = "bz2"
+    extension = "bz2"
+    default_level = 9
+
+    def _open(self, path, mode, level=None):
+        import bz2
+        if level is None:
+            return bz2.open(path, mode)
+        return bz2.open(path, mode, compresslevel=level)
+
+
+class XzCodec(GzipCodec):
+    name = "xz"
+    extension = "xz"
+    default_level = 6
+
+    def _open(self, path, mode, level=None):
+        import lzma
+        return lzma.open(path, mode, preset=level)
+
+
+class Lz4Codec(GzipCodec):
+    name = "lz4"
+    extension = "lz4"
+    requires = ('lz4',)
+    default_level = 0
+
+    def _open(self, path, mode, level=None):
+        import lz4.frame
+        if level is None:
+            return lz4.frame.open(path, mode)
+        return lz4.frame.open(path, mode, compression_level=level)
+
+
+class _RewindingReader(io.RawIOBase):
+    """Binary reader over a stream that can only be read forwards (e.g. a decompressor)
+
+    Seeking backwards reopens the stream (with `opener()`), and reads forward again.
+    """
+    def __init__(self, opener):
+        self._opener = opener
+        self._fo = opener()
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        n = self._fo.readinto(b)
+        self._pos += n
+        return n
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence != io.SEEK_SET:
+            raise io.UnsupportedOperation("can't seek relative to the end of a compressed stream")
+        if offset < self._pos:
+            self._fo.close()
+            self._fo = self._opener()
+            self._pos = 0
+        while self._pos < offset:
+            chunk = self._fo.read(min(offset - self._pos, 1 << 20))
+            if not chunk:
+                break
+            self._pos += len(chunk)
+        return self._pos
+
+    def close(self):
+        if not self.closed:
+            self._fo.close()
+        super().close()
+
+
+class ZstdCodec(GzipCodec):
+    name = "zstd"
+    extension = "zst"
+    requires = ('zstandard',)
+    default_level = 3
+
+    def _open(self, path, mode, level=None):
+        import zstandard
+        if level is None:
+            # zstandard's reader can't seek backwards, as numpy and joblib do (to sniff the format)
+            return io.BufferedReader(_RewindingReader(lambda: zstandard.open(path, mode)))
+        return zstandard.open(path, mode, cctx=zstandard.ZstdCompressor(level=level))
+
+
+_CODECS = {
+    'zstd': ZstdCodec,
+    'lz4': Lz4Codec,
+    'gzip': GzipCodec,
+    'bz2': Bz2Codec,
+    'xz': XzCodec,
+}
+
+
+def available_codecs():
+    """Names of the compression codecs that can be used in this environment"""
+    return [name for name, codec in _CODECS.items() if codec().available()]
+
+
+def get_codec(name):
+    """Look up a compression codec by name"""
+    if name not in _CODECS:
+        raise ValueError(f"Unknown compression codec:{name}. Must be one of {list(_CODECS)}")
+    codec = _CODECS[name]()
+    if not codec.available():
+        raise ImportError(f"Compression codec '{name}' requires {', '.join(codec.requires)}")
+    return codec
+
+
+def normalize_compress(compress):
+    """Normalize a `compress` option to None (uncompressed) or (codec, level)
+
+    compress: None, bool, int, str or (str, int)
+        None, False or 0: no compression
+        True: the default codec (gzip) at its default level
+        int: gzip at this level
+        str: this codec, at its default level
+        (str, int): this codec, at this level (or its default level, if None)
+
+    >>> normalize_compress(None) is None
+    True
+    >>> normalize_compress(True)
+    ('gzip', 6)
+    >>> normalize_compress(('xz', 1))
+    ('xz', 1)
+    """
+    if compress is None or compress is False or compress == 0:
+        return None
+    if compress is True:
+        compress = 'gzip'
+    elif isinstance(compress, int):
+        compress = ('gzip', compress)
+    if isinstance(compress, str):
+        compress = (compress, None)
+    name, level = compress
+    codec = get_codec(name)
+    return (name, codec.default_level if level is None else level)
+
+
+def open_file(path, mode, compress=None):
+    """Open a binary file, compressed as per `compress` (None, or (codec, level))"""
+    if compress is None:
+        return open(path, mode)
+    name, level = compress
+    return get_codec(name).open(path, mode, level)
+
+
+def _is_dataframe(obj):
+    """True if obj is a pandas DataFrame. Doesn't import pandas."""
+    pd = sys.modules.get('pandas')
+    return pd is not None and isinstance(obj, pd.DataFrame)
+
+
+def _is_ndarray(obj):
+    """True if obj is a numpy array. Doesn't import numpy."""
+    np = sys.modules.get('numpy')
+    return np is not None and isinstance(obj, np.ndarray)
+
+
+class PickleFormat:
+    """Any (picklable) object. Other formats override `can_write`, `write` and `read`.
+
+    `read()` may ignore `columns` and `filters`, in which case it returns every row and column.
+    `compress` is None or (codec, level). Formats with `native_compression` compress their
+    own contents; others are compressed by `open_file()`.
+
+    If `streams(obj)`, the format writes `obj` (via `serialize()`) exactly as the stream- hash
+    types serialize it, so its hash can be computed while it is written. See `src.data.hashing`.
+    """
+    name = "pickle"
+    extension = "pkl"
+    requires = ()
+    native_compression = False
+
+    def available(self):
+        return all(importlib.util.find_spec(module) is not None for module in self.requires)
+
+    def can_write(self, obj):
+        return True
+
+    def streams(self, obj):
+        return False
+
+    def serialize(self, obj, fo):
+        pickle.dump(obj, fo, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def write(self, obj, path, compress=None):
+        with open_file(path, 'wb', compress) as fo:
+            self.serialize(obj, fo)
+
+    def read(self, path, mmap_mode=None, columns=None, filters=None, compress=None):
+        with open_file(path, 'rb', compress) as fd:
+            return pickle.load(fd)
+
+    def __repr__(self):
+        return f"<StorageFormat:{self.name}>"
+
+
+class NpyFormat(PickleFormat):
+    name = "npy"
+    extension = "npy"
+
+    def can_write(self, obj):
+        return _is_ndarray(obj) and not obj.dtype.hasobject
+
+    def streams(self, obj):
+        return True
+
+    def serialize(self, obj, fo):
+        import numpy as np
+        np.save(fo, obj, allow_pickle=False)
+
+    def read(self, path, mmap_mode=None, columns=None, filters=None, compress=None):
+        import numpy as np
+        if compress is None:
+            return np.load(path, mmap_mode=mmap_mode, allow_pickle=False)
+        with open_file(path, 'rb', compress) as fd:
+            return np.load(fd, allow_pickle=False)
+
+
+class ParquetFormat(PickleFormat):
+    name = "parquet"
+    extension = "parquet"
+    requires = ('pyarrow',)
+    native_compression = True
+    codecs = ('gzip', 'lz4', 'zstd')
+
+    def can_write(self, obj):
+        # parquet requires string column names
+        return _is_dataframe(obj) and all(isinstance(c, str) for c in obj.columns)
+
+    def streams(self, obj):
+        return False
+
+    def _compression(self, compress):
+        """keyword arguments for writing with `compress`"""
+        if compress is None:
+            return {'compression': None}
+        name, level = compress
+        if name not in self.codecs:
+            raise ValueError(f"{self.name} can't be compressed with {name}. Must be one of {list(self.codecs)}")
+        if name == 'lz4':  # no levels
+            return {'compression': name}
+        return {'compression': name, 'compression_level': level}
+
+    def write(self, obj, path, compress=None):
+        obj.to_parquet(path, **self._compression(compress))
+
+    def read(self, path, mmap_mode=None, columns=None, filters=None, compress=None):
+        import pandas as pd
+        return pd.read_parquet(path, columns=columns, filters=filters or None)
+
+
+class FeatherFormat(ParquetFormat):
+    name = "feather"
+    extension = "feather"
+    codecs = ('lz4', 'zstd')
+
+    def can_write(self, obj):
+        # feather does not store the index
+        if not (_is_dataframe(obj) and all(isinstance(c, str) for c in obj.columns)):
+            return False
+        import pandas as pd
+        return isinstance(obj.index, pd.RangeIndex) and obj.index.start == 0 and obj.index.step == 1
+
+    def write(self, obj, path, compress=None):
+        if compress is None:
+            obj.to_feather(path, compression='uncompressed')
+        else:
+            obj.to_feather(path, **self._compression(compress))
+
+    def read(self, path, mmap_mode=None, columns=None, filters=None, compress=None):
+        import pandas as pd
+        return pd.read_feather(path, columns=columns)
+
+
+# Per-attribute formats. 'joblib' (the whole Dataset in one file) is handled by `Dataset.dump()`
+_FORMATS = {
+    'parquet': ParquetFormat,
+    'feather': FeatherFormat,
+    'npy': NpyFormat,
+    'pickle': PickleFormat,
+}
+
+# Used for any attribute the requested format can't write
+_FALLBACK_FORMATS = ('npy', 'pickle')
+
+
+def available_formats():
+    """Names of the storage formats that can be used in this environment"""
+    return [DEFAULT_FORMAT] + [name for name, fmt in _FORMATS.items() if fmt().available()]
+
+
+def get_format(name):
+    """Look up a (per-attribute) storage format by name"""
+    if name not in _FORMATS:
+        raise ValueError(f"Unknown storage format:{name}. Must be one of {[DEFAULT_FORMAT, *_FORMATS]}")
+    fmt = _FORMATS[name]()
+    if not fmt.available():
+        raise ImportError(f"Storage format '{name}' requires {', '.join(fmt.requires)}")
+    return fmt
+
+
+def object_file(hash, extension):
+    """Filename (relative to the dataset directory) of a payload in the object store
+
+    >>> object_file('sha1:38f65f3b11da4851aaaccc19b1f0cf4d3806f83b', 'npy.zst')
+    'objects/sha1/38/f65f3b11da4851aaaccc19b1f0cf4d3806f83b.npy.zst'
+    """
+    hash_type, hash_value = hash.split(':', 1)
+    return f"{OBJECTS_DIR}/{hash_type}/{hash_value[:2]}/{hash_value[2:]}.{extension}"
+
+
+def describe(value):
+    """The type, shape and dtype of an attribute, as recorded in the `.metadata` file
+
+    The dtype of a DataFrame is a dict mapping its columns to their dtypes.
+    shape and dtype are None for objects that don't have them.
+
+    >>> import numpy as np
+    >>> describe(np.zeros((3, 2), dtype='float32'))
+    {'type': 'numpy.ndarray', 'shape': (3, 2), 'dtype': 'float32'}
+    >>> describe(None)
+    {'type': 'builtins.NoneType', 'shape': None, 'dtype': None}
+    """
+    cls = type(value)
+    shape = getattr(value, 'shape', None)
+    if _is_dataframe(value):
+        dtype = {str(column): str(dtype) for column, dtype in value.dtypes.items()}
+    else:
+        dtype = getattr(value, 'dtype', None)
+    return {
+        'type': f"{cls.__module__}.{cls.__qualname__}",
+        'shape': tuple(shape) if isinstance(shape, tuple) else None,
+        'dtype': dtype if dtype is None or isinstance(dtype, dict) else str(dtype),
+    }
+
+
+def write_dataset(dataset, path, compress=None):
+    """Write a whole Dataset (via joblib), compressed as per `compress`: None or (codec, level)"""
+    import joblib
+    with open_file(path, 'wb', compress) as fo:
+        joblib.dump(dataset, fo)
+
+
+def read_dataset(path, mmap_mode=None, compress=None):
+    """Read a Dataset written by `write_dataset()`
+
+    If `mmap_mode` is not None, numpy arrays in uncompressed files are memory-mapped.
+    """
+    import joblib
+    if mmap_mode is not None and compress is None:
+        # joblib only memory-maps when given a filename
+        return joblib.load(path, mmap_mode=mmap_mode)
+    with open_file(path, 'rb', compress) as fd:
+        return joblib.load(fd)
+
+
+def dump_attributes(attributes, file_base, dump_path, format, compress=None, hash_type=None, object_hashes=None):
+    """Write each attribute to its own file, using `format` where possible
+
+    Parameters
+    ----------
+    attributes: dict
+        attribute name -> value
+    file_base: str
+        Filename stem.
+    dump_path: path
+        Directory where files will be written
+    format: str
+        Preferred storage format. Attributes it can't write use a fallback format.
+    compress: None or (codec, level)
+        compression to use. See `normalize_compress()`
+    hash_type: str or None
+        If not None, also hash each attribute (recorded under 'hash'). See `src.data.hashing`.
+        stream- hashes of attributes written as 'npy' are computed from the (uncompressed)
+        bytes as they are written, rather than by serializing them again.
+    object_hashes: dict or None
+        If not None, attribute name -> hash (as f"{hash_type}:{hash_value}"). Store the attributes
+        in the object store, under these hashes, rather than as `{file_base}.{attribute}` files.
+        Payloads already in the store aren't written again. See `object_file()`
+
+    Returns
+    -------
+    storage record, suitable for `load_attributes()`; e.g.
+        {'format': 'parquet',
+         'compress': ('zstd', 3),
+         'attributes': {'data': {'format': 'parquet', 'file': 'wine_reviews.data.parquet'},
+                        'target': {'format': 'npy', 'file': 'wine_reviews.target.npy.zst',
+                                   'hash': 'stream-sha1:0a4d55a8d778e5022fab701977c5d840bbc486d0'}}}
+    """
+    dump_path = pathlib.Path(dump_path)
+    writers = [get_format(name) for name in dict.fromkeys((format, *_FALLBACK_FORMATS))]
+    record = {}
+    for key, value in attributes.items():
+        fmt = next(w for w in writers if w.can_write(value))
+        extension = fmt.extension
+        if compress is not None and not fmt.native_compression:
+            extension += f".{get_codec(compress[0]).extension}"
+        if object_hashes is None:
+            filename = f"{file_base}.{key}.{extension}"
+        else:
+            filename = object_file(object_hashes[key], extension)
+        record[key] = {'format': fmt.name, 'file': filename}
+        path = dump_path / filename
+        if object_hashes is not None:
+            if path.exists():
+                logger.debug(f"Skipped {key} ({fmt.name}): {filename} exists")
+                continue
+            # Write to a temporary file, so that a payload in the store is always complete
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path = path.with_name(f".{path.name}.{uuid.uuid4().hex[:8]}.tmp")
+        try:
+            if hash_type is not None and is_stream_hash(hash_type) and fmt.streams(value):
+                with open_file(path, 'wb', compress) as fo:
+                    writer = HashingWriter(base_algorithm(hash_type), fo)
+                    fmt.serialize(value, writer)
+                record[key]['hash'] = f"{hash_type}:{writer.hexdigest()}"
+            else:
+                fmt.write(value, path, compress=compress)
+                if hash_type is not None:
+                    record[key]['hash'] = hash_value(value, hash_type)
+            if object_hashes is not None:
+                os.replace(path, dump_path / filename)
+        except BaseException:
+            if object_hashes is not None and path.exists():
+                path.unlink()
+            raise
+        logger.debug(f"Wrote {key} ({fmt.name}): {filename}")
+    return {'format': format, 'compress': compress, 'attributes': record}
+
+
+def load_attributes(storage, data_path, mmap_mode=None, columns=None, filters=None):
+    """Read the attributes written by `dump_attributes()`
+
+    Parameters
+    ----------
+    storage: dict
+        storage record, as returned by `dump_attributes()`
+    data_path: path
+        Directory containing the files
+    mmap_mode: {None, 'r+', 'r', 'w+', 'c'}
+        If not None, memory-map 'npy' files using this mode. See `numpy.load()`
+    columns: list or None
+        If not None, `data` need only include these columns
+    filters: list or None
+        `data` need only include rows matching these filters. See `select()`.
+        Only filters that can be pushed down to storage are passed on.
+
+    Returns
+    -------
+    dict: attribute name -> value. `data` may include more rows and columns than requested
+    """
+    data_path = pathlib.Path(data_path)
+    compress = storage.get('compress')
+    attributes = {}
+    for key, rec in storage.get('attributes', {}).items():
+        fmt = get_format(rec['format'])
+        if key == 'data':
+            pushed = [f for f in filters or () if f[1] in _COMPARISONS]
+            value = fmt.read(data_path / rec['file'], mmap_mode=mmap_mode, columns=columns, filters=pushed,
+                             compress=compress)
+        else:
+            value = fmt.read(data_path / rec['file'], mmap_mode=mmap_mode, compress=compress)
+        attributes[key] = value
+    return attributes
+
+
+def filter_columns(columns=None, filters=None):
+    """The columns needed to select `columns` and evaluate `filters`; None if all are needed"""
+    if columns is None:
+        return None
+    return list(dict.fromkeys([*columns, *(f[0] for f in filters or ())]))
+
+
+def filter_mask(df, filters):
+    """Boolean mask of the rows of a DataFrame that match every filter
+
+    filters: list of (column, op, value)
+        op is one of '==', '=', '!=', '<', '<=', '>', '>=', 'in', 'not in' (as for parquet),
+        or 'isna', 'notna' (whose value is ignored). Rows where `column` is null match
+        no comparison.
+
+    >>> import pandas as pd
+    >>> df = pd.DataFrame({'points': [85, 90, None], 'variety': ['Syrah', 'Riesling', 'Syrah']})
+    >>> filter_mask(df, [('variety', '==', 'Syrah')]).tolist()
+    [True, False, True]
+    >>> filter_mask(df, [('variety', '==', 'Syrah'), ('points', 'notna', None)]).tolist()
+    [True, False, False]
+    >>> filter_mask(df, [('points', '!=', 90)]).tolist()
+    [True, False, False]
+    """
+    import numpy as np
+    mask = np.ones(len(df), dtype=bool)
+    for column, op, value in filters:
+        series = df[column]
+        if op in _COMPARISONS:
+            mask &= np.asarray(_COMPARISONS[op](series, value) & series.notna(), dtype=bool)
+        elif op in _NULL_TESTS:
+            mask &= np.asarray(_NULL_TESTS[op](series), dtype=bool)
+        else:
+            raise ValueError(f"Unknown filter op:{op}. Must be one of {[*_COMPARISONS, *_NULL_TESTS]}")
+    return mask
+
+
+def select(data, target=None, columns=None, filters=None):
+    """Select columns and rows of a DataFrame (and the corresponding rows of its target)
+
+    data: DataFrame
+    target: array-like or None
+        rows are selected by position, along with those of `data`
+    columns: list or None
+        columns to keep. If None, keep all columns
+    filters: list or None
+        keep only rows that match every filter. See `filter_mask()`
+
+    Returns
+    -------
+    (data, target)
+    """
+    if not _is_dataframe(data):
+        raise ValueError(f"`columns` and `filters` require DataFrame data, not {type(data).__name__}")
+    if filters:
+        mask = filter_mask(data, filters)
+        if not mask.all():
+            data = data[mask]
+            if target is not None:
+                target = target[mask]
+    if columns is not None:
+        data = data[list(columns)]
+    return data, target
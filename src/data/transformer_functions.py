@@ -1,10 +1,5 @@
 import pathlib
 
-import pandas as pd
-from tqdm.auto import tqdm
-
-from sklearn.model_selection import train_test_split
-
 from . import Dataset, deserialize_partial
 from .. import paths
 from ..log import logger
@@ -93,6 +88,8 @@ def sklearn_train_test_split(ds_dict, **split_opts):
         Remaining options will be passed to `train_test_split`
 
     """
+    from sklearn.model_selection import train_test_split
+
     new_ds = {}
     for ds_name, dset in ds_dict.items():
 
@@ -160,6 +157,8 @@ def csv_to_pandas(ds_dict, *, output_map, **opts):
     **opts:
         Remaining options will be ignored
     """
+    import pandas as pd
+
     new_ds = {}
     df = None
     for ds_name, dset in ds_dict.items():
@@ -3,16 +3,16 @@ import os
 import pathlib
 import random
 import sys
-import pandas as pd
-import numpy as np
 from typing import Iterator, List
 from functools import partial
-from joblib import func_inspect as jfi
+
+# Heavy dependencies (pandas, numpy, joblib) are imported on first use, to keep `import src.data` fast.
 
 from ..log import logger
 from .. import paths
 
 __all__ = [
+    'Bunch',
     'deserialize_partial',
     'normalize_labels',
     'partial_call_signature',
@@ -24,6 +24,39 @@ __all__ = [
 _MODULE = sys.modules[__name__]
 _MODULE_DIR = pathlib.Path(os.path.dirname(os.path.abspath(__file__)))
 
+
+class Bunch(dict):
+    """Container object exposing keys as attributes
+
+    Equivalent to `sklearn.utils.Bunch`, without the cost of importing scikit-learn.
+
+    >>> b = Bunch(a=1, b=2)
+    >>> b.b
+    2
+    >>> b.c = 6
+    >>> b['c']
+    6
+    """
+    def __init__(self, **kwargs):
+        super().__init__(kwargs)
+
+    def __setattr__(self, key, value):
+        self[key] = value
+
+    def __dir__(self):
+        return self.keys()
+
+    def __getattr__(self, key):
+        try:
+            return self[key]
+        except KeyError:
+            raise AttributeError(key)
+
+    def __setstate__(self, state):
+        # Ignore any pickled __dict__ (e.g. from pickles of objects derived from sklearn's Bunch)
+        pass
+
+
 def read_space_delimited(filename, skiprows=None, class_labels=True, metadata=None):
     """Read an space-delimited file
 
@@ -40,6 +73,8 @@ def read_space_delimited(filename, skiprows=None, class_labels=True, metadata=No
     class_labels: boolean
         if true, the last column is treated as the class (target) label
     """
+    import numpy as np
+    import pandas as pd
     with open(filename, 'r') as fd:
         df = pd.read_csv(fd, skiprows=skiprows, skip_blank_lines=True,
                            comment=None, header=None, sep=' ', dtype=str)
@@ -65,6 +100,7 @@ def normalize_labels(target):
 
     Examples
     --------
+    >>> import numpy as np
     >>> target = np.array(['a','b','c','a'])
     >>> mapped_target, label_map = normalize_labels(target)
     >>> mapped_target
@@ -75,6 +111,7 @@ def normalize_labels(target):
     >>> all(np.vectorize(label_map.get)(mapped_target) == target)
     True
     """
+    import numpy as np
     label_map = {k:v for k, v in enumerate(np.unique(target))}
     label_map_inv = {v:k for k, v in label_map.items()}
     mapped_target = np.vectorize(label_map_inv.get)(target)
@@ -84,6 +121,7 @@ def normalize_labels(target):
 def partial_call_signature(func):
     """Return the fully qualified call signature for a (partial) function
     """
+    from joblib import func_inspect as jfi
     func = partial(func)
     fa = jfi.getfullargspec(func)
     default_kw = {}
@@ -175,6 +213,7 @@ def serialize_partial(func, key_base='load_function'):
     if func is None:
         logger.warning(f"serialize_partial: `{key_base}` is None. Ignoring.")
         return entry
+    from joblib import func_inspect as jfi
     func = partial(func)
     entry[f'{key_base}_module'] = ".".join(jfi.get_func_name(func.func)[0])
     entry[f'{key_base}_name'] = jfi.get_func_name(func.func)[1]
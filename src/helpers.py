@@ -118,7 +118,7 @@ def dataset_from_csv_manual_download(ds_name, csv_path, download_message,
     Dataset that was added to the Transformer graph
     """
 
-    dataset_catalog = Catalog.load('datasets')
+    dataset_catalog = Catalog.load('datasets', lazy=True)
     if ds_name in dataset_catalog and not overwrite_catalog:
         raise KeyError(f"'{ds_name}' already in catalog")
     csv_path = pathlib.Path(csv_path)
@@ -146,7 +146,7 @@ def dataset_from_csv_manual_download(ds_name, csv_path, download_message,
                                'extra_dir': raw_ds_name+'.extra',
                                'extract_dir': raw_ds_name}
     dsrc.process_function = partial(process_function, **process_function_kwargs)
-    datasource_catalog = Catalog.load('datasources')
+    datasource_catalog = Catalog.load('datasources', lazy=True)
     datasource_catalog[dsrc.name] = dsrc.to_dict()
 
     # Add a dataset from the datasource
@@ -187,7 +187,7 @@ def dataset_from_metadata(dataset_name, metadata=None, overwrite_catalog=False):
     Dataset that was added to the Transformer graph
 
     """
-    dataset_catalog = Catalog.load('datasets')
+    dataset_catalog = Catalog.load('datasets', lazy=True)
     if dataset_name in dataset_catalog and not overwrite_catalog:
         raise KeyError(f"'{dataset_name}' already in catalog")
     if metadata is None:
@@ -1,6 +1,19 @@
 import configparser
+import io
+import os
 import pathlib
+import re
+import time
+import uuid
 from collections.abc import MutableMapping
+from contextlib import contextmanager
+
+# Filesystem timestamps can be coarse. A config file modified more recently than this
+# is too fresh for its mtime to be trusted as a sign that it is unchanged.
+_MTIME_RESOLUTION_NS = 2_000_000_000
+
+# A `${key}` or `${section:key}` reference, as per `ConfigParser.ExtendedInterpolation`
+_REFERENCE = re.compile(r'\$\{([^}]*)\}')
 
 class KVStore(MutableMapping):
     """Dictionary-like key-value store backed to disk by a ConfigParser (ini) file
@@ -44,6 +57,11 @@ class KVStore(MutableMapping):
     >>> d['data_path']
     '/tmp2/data'
 
+    Expanded values are cached. Changing a key only invalidates the cached values
+    of the keys that (directly or indirectly) refer to it:
+    >>> sorted(d._invalidate('root_path'))
+    ['data_path', 'raw_data_path', 'root_path']
+
     Because this object is disk-backed, newly instantiated objects will receive the last set of defaults:
     >>> c = KVStore()
     >>> dict(c)
@@ -55,9 +73,39 @@ class KVStore(MutableMapping):
     >>> c = KVStore(overwrite=True)
     >>> dict(c), c.data
     ({}, {})
+
+    Every change is written to disk immediately. To make several changes with a single write, use `deferred()`:
+    >>> with c.deferred():
+    ...     c['root_path'] = '/tmp3'
+    ...     c['data_path'] = '${root_path}/data'
+    >>> dict(KVStore())
+    {'root_path': '/tmp3', 'data_path': '/tmp3/data'}
+
+    Other sections of the config file (e.g. per-dataset settings) are accessed with
+    `get_option()`, `set_option()` and `remove_option()`. Their values may refer to
+    keys of any section, as `${section:key}`, and are cached in the same way:
+    >>> c.set_option('my_dataset', 'extra_base', '${KVStore:root_path}/extra')
+    >>> c.get_option('my_dataset', 'extra_base')
+    '/tmp3/extra'
+    >>> sorted(c._invalidate('root_path'), key=str)
+    [('my_dataset', 'extra_base'), 'root_path']
+
+    A read-only KVStore never touches the disk after it is first read, and can't be changed:
+    >>> r = KVStore(read_only=True)
+    >>> r['root_path'] = '/tmp4'
+    Traceback (most recent call last):
+     ...
+    AttributeError: root_path: KVStore is read-only
+
+    Its contents can be passed to other processes as a (picklable) snapshot:
+    >>> s = KVStore(config_file='/nonexistent/config.ini', read_only=True)
+    >>> s.restore(r.snapshot())
+    >>> dict(s)
+    {'root_path': '/tmp3', 'data_path': '/tmp3/data'}
     """
     def __init__(self, *args,
                  config_file=None, config_section="KVStore", overwrite=False, persistent=True,
+                 read_only=False,
                  **kwargs):
         """Create a new disk-backed key-value store
 
@@ -71,17 +119,28 @@ class KVStore(MutableMapping):
             If True, any config file on disk will be overwritten.
             Otherwise, existing values from this file will be used as defaults,
             (unless overridden by explicit key/value pairs in the constructor)
+        persistent: Boolean
+            If False, changes are never written to disk
+        read_only: Boolean
+            If True, the config file is read once, and never re-read or written.
+            The store can't be changed (other than by `restore()`). See also `set_read_only()`.
         *args, **kwargs:
             All other arguments will be used as per the standard `dict` constructor
 
         """
-        self._persistent = persistent
+        self._persistent = persistent and not read_only
+        self._read_only = False  # until constructed
         if config_file is None:
             self._config_file = pathlib.Path("config.ini")
         else:
             self._config_file = pathlib.Path(config_file)
         self._config_section = config_section
         self._config = configparser.ConfigParser(interpolation=configparser.ExtendedInterpolation())
+        self._file_stat = None  # (mtime_ns, size) of config_file when last read or written
+        self._expanded = {}  # option (or (section, option)) -> interpolated value
+        self._dependents = {}  # option (or (section, option)) -> set of those whose values refer to it
+        self._defer_depth = 0
+        self._dirty = False  # True if a write was deferred
 
         self.data = dict()
 
@@ -91,22 +150,126 @@ class KVStore(MutableMapping):
             self._config.add_section(config_section)
             self._config.read_dict(self.data)
 
-        self.update({k:v for k,v in self._config.items(self._config_section, raw=True)}) # `update` comes for free from the abc
-        self.update(dict(*args, **kwargs))
-        self._write()
+        with self.deferred():
+            self.update({k:v for k,v in self._config.items(self._config_section, raw=True)}) # `update` comes for free from the abc
+            self.update(dict(*args, **kwargs))
+            self._dirty = True  # in case the file is missing, or has never been written
+        self._persist_requested = persistent
+        self._read_only = read_only
 
     def __getitem__(self, key):
-        return self._config.get(self._config_section, key)
+        return self._expand(key)
 
     def __setitem__(self, key, value):
+        if self._read_only:
+            raise AttributeError(f"{key}: {self.__class__.__name__} is read-only")
         self.data[key] = value
         self._config.set(self._config_section, key, value)
+        self._invalidate(key)
         self._write()
 
     def __delitem__(self, key):
+        if self._read_only:
+            raise AttributeError(f"{key}: {self.__class__.__name__} is read-only")
         del self.data[key]
         self._config.remove_option(self._config_section, key)
+        self._invalidate(key)
+        self._write()
+
+    def get_option(self, section, key, fallback=None):
+        """Interpolated value of a key in another section of the config file; `fallback` if it isn't set
+
+        The config file is re-read first if it has changed. Values are cached as per `_expand()`.
+        """
+        self._refresh()
+        if not (self._config.has_section(section) and self._config.has_option(section, key)):
+            return fallback
+        return self._expand(key, section=section)
+
+    def set_option(self, section, key, value):
+        """Set a key in another section of the config file (e.g. the per-dataset settings), and write it
+
+        Like `__setitem__()`, raises AttributeError if the store is read-only.
+        """
+        if self._read_only:
+            raise AttributeError(f"[{section}] {key}: {self.__class__.__name__} is read-only")
+        if not self._config.has_section(section):
+            self._config.add_section(section)
+        self._config.set(section, key, value)
+        self._invalidate(key, section=section)
+        self._write()
+
+    def remove_option(self, section, key):
+        """Remove a key from another section of the config file, and write it
+
+        Like `__delitem__()`, raises AttributeError if the store is read-only.
+
+        Returns
+        -------
+        True if the key was present
+        """
+        if self._read_only:
+            raise AttributeError(f"[{section}] {key}: {self.__class__.__name__} is read-only")
+        if not (self._config.has_section(section) and self._config.remove_option(section, key)):
+            return False
+        self._invalidate(key, section=section)
         self._write()
+        return True
+
+    def _cache_key(self, key, section=None):
+        """Key of an option in `_expanded` and `_dependents`: options of other sections are qualified by section"""
+        option = self._config.optionxform(key)
+        if section is None or section == self._config_section:
+            return option
+        return (section, option)
+
+    def _expand(self, key, section=None):
+        """Interpolated value of a key (of this store's section, by default), cached along with the keys it refers to
+
+        Interpolation itself is done by ConfigParser. References to keys of the same section
+        (`${key}`), and of other sections (`${section:key}`), are both tracked, so changing
+        any key through this store invalidates every value that refers to it. Sections
+        changed other than through this store (e.g. directly in `_config`) are not tracked.
+        """
+        if section is None:
+            section = self._config_section
+        cache_key = self._cache_key(key, section)
+        try:
+            return self._expanded[cache_key]
+        except KeyError:
+            pass
+        option = self._config.optionxform(key)
+        value = self._config.get(section, option)
+        raw = self._config.get(section, option, raw=True)
+        cacheable = True
+        for ref in _REFERENCE.findall(raw.replace('$$', '')):
+            ref_section, _, ref = ref.rpartition(':')
+            ref_section = ref_section or section
+            ref_key = self._cache_key(ref, ref_section)
+            self._dependents.setdefault(ref_key, set()).add(cache_key)
+            self._expand(ref, section=ref_section)
+            cacheable = cacheable and ref_key in self._expanded
+        if cacheable:
+            self._expanded[cache_key] = value
+        return value
+
+    def _invalidate(self, key, section=None):
+        """Forget the cached values of a key, and of every key that (transitively) refers to it
+
+        Returns
+        -------
+        set of invalidated options (qualified by section, for those of other sections)
+        """
+        stale = set()
+        todo = [self._cache_key(key, section)]
+        while todo:
+            option = todo.pop()
+            if option in stale:
+                continue
+            stale.add(option)
+            self._expanded.pop(option, None)
+            todo.extend(self._dependents.get(option, ()))
+        return stale
 
     def __iter__(self):
         return iter(self.data)
@@ -114,23 +277,142 @@ class KVStore(MutableMapping):
     def __len__(self):
         return len(self.data)
 
+    def _stat(self):
+        """Identify the current version of the config file
+
+        Returns
+        -------
+        (mtime_ns, size), () if the file does not exist, or
+        None if the file was modified too recently for its mtime to be trusted.
+        """
+        try:
+            st = os.stat(self._config_file)
+        except FileNotFoundError:
+            return ()
+        if time.time_ns() - st.st_mtime_ns < _MTIME_RESOLUTION_NS:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
     def _read(self):
+        stat = self._stat()
         self._config.read(self._config_file)
         if not self._config.has_section(self._config_section):
             # File exists but we are adding to a new section of it
             self._config.add_section(self._config_section)
+        self._file_stat = stat
+        self._clear_cache()
+
+    def _clear_cache(self):
+        """Forget all cached (interpolated) values"""
+        self._expanded = {}
+        self._dependents = {}
+
+    def _refresh(self):
+        """Re-read the config file, but only if it has changed since it was last read or written
+
+        Returns
+        -------
+        True if the file was re-read
+        """
+        if self._defer_depth or self._read_only:
+            return False  # don't clobber unwritten changes; or don't touch the disk
+        stat = self._stat()
+        if stat is not None and stat == self._file_stat:
+            return False
+        self._read()
+        return True
+
+    def set_read_only(self, read_only=True):
+        """Make this store read-only (or writable again)
+
+        A read-only store never reads or writes its config file, and can't be changed.
+        """
+        self._read_only = read_only
+        self._persistent = self._persist_requested and not read_only
+
+    def snapshot(self):
+        """A picklable snapshot of the contents of this store
+
+        Pass this to other (e.g. worker) processes, which can `restore()` it
+        rather than re-reading the config file.
+        """
+        return {
+            'config_file': str(self._config_file),
+            'config_section': self._config_section,
+            'data': dict(self.data),
+            'config': {section: {option: self._config.get(section, option, raw=True)
+                                 for option in self._config.options(section)}
+                       for section in self._config.sections()},
+        }
+
+    def restore(self, snapshot):
+        """Replace the contents of this store with a `snapshot()`, and make it read-only
+
+        The config file is not touched.
+        """
+        config = configparser.ConfigParser(interpolation=configparser.ExtendedInterpolation())
+        config.read_dict(snapshot['config'])
+        self._config = config
+        self._config_file = pathlib.Path(snapshot['config_file'])
+        self._config_section = snapshot['config_section']
+        self.data = dict(snapshot['data'])
+        self._clear_cache()
+        self.set_read_only(True)
+
+    @contextmanager
+    def deferred(self):
+        """Defer writing changes to disk until the end of a `with` block
+
+        All changes made within the block are written at once (atomically) when it exits,
+        even if it exits with an exception. These blocks may be nested; changes are written
+        when the outermost block exits.
+        """
+        self._defer_depth += 1
+        try:
+            yield self
+        finally:
+            self._defer_depth -= 1
+            if not self._defer_depth and self._dirty:
+                self._write()
 
     def _write(self):
-        if self._persistent:
-            with open(self._config_file, 'w') as fw:
-                self._config.write(fw)
+        """Write the config file
+
+        The file is written atomically (to a temporary file which is renamed into place),
+        and only if its contents would change.
+        """
+        if self._defer_depth:
+            self._dirty = True
+            return
+        self._dirty = False
+        if not self._persistent:
+            return
+        buffer = io.StringIO()
+        self._config.write(buffer)
+        text = buffer.getvalue()
+        try:
+            with open(self._config_file) as f:
+                if f.read() == text:
+                    return
+        except FileNotFoundError:
+            pass
+        tmp_file = self._config_file.with_name(f".{self._config_file.name}.{uuid.uuid4().hex[:8]}.tmp")
+        try:
+            with open(tmp_file, 'w') as fw:
+                fw.write(text)
+            os.replace(tmp_file, self._config_file)
+        except BaseException:
+            if tmp_file.exists():
+                tmp_file.unlink()
+            raise
+        self._file_stat = self._stat()
 
     def __repr__(self):
         kvstr = ", ".join([f"{k}='{v}'" for k,v in self.data.items()])
         return f"KVStore(config_file='{str(self._config_file)}', config_section='{self._config_section}', {kvstr})"
 
     def __str__(self):
-        return str({k:v for k,v in self._config.items(self._config_section, raw=False)})
+        return str({k:self._expand(k) for k in self._config.options(self._config_section)})
 
 
 if __name__ == "__main__":
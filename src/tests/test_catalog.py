@@ -1,8 +1,12 @@
 import pytest
+import os
+import subprocess
 import pathlib
 
 from src.data import Catalog
+from src.data.catalog import _NOT_LOADED
 from src.log import logger
+from src.utils import save_json
 
 @pytest.fixture
 def catalog(tmpdir):
@@ -34,3 +38,382 @@ def test_old_catalog_init(tmpdir, old_catalog_file):
 
     # Should succeed, as replace is set
     c = Catalog.from_old_catalog(old_catalog_file, catalog_path=tmpdir, replace=True)
+
+def test_lazy_catalog(tmpdir, old_catalog_file):
+    c = Catalog.from_old_catalog(old_catalog_file, catalog_path=tmpdir)
+    c._save(paranoid=False)
+
+    lazy = Catalog.load(c.name, catalog_path=tmpdir, lazy=True, shared=False)
+    assert set(lazy) == set(c)
+    assert 'wine_reviews_130k' in lazy
+    # Nothing is parsed until an entry is accessed
+    assert all(v is _NOT_LOADED for v in lazy.data.values())
+    assert lazy['wine_reviews_130k'] == c['wine_reviews_130k']
+    assert sum(v is not _NOT_LOADED for v in lazy.data.values()) == 1
+    assert lazy == c
+
+    # The index is written, and picked up again by the next lazy load
+    assert lazy.index_file_fq.exists()
+    lazy = Catalog.load(c.name, catalog_path=tmpdir, lazy=True, shared=False)
+    assert set(lazy) == set(c)
+
+    # Changes to the directory invalidate the index
+    c['new_entry'] = {'dataset_name': 'new_entry'}
+    lazy = Catalog.load(c.name, catalog_path=tmpdir, lazy=True, shared=False)
+    assert lazy['new_entry'] == {'dataset_name': 'new_entry'}
+    del c['new_entry']
+    lazy = Catalog.load(c.name, catalog_path=tmpdir, lazy=True, shared=False)
+    assert 'new_entry' not in lazy
+
+@pytest.mark.parametrize('sharded', [False, True])
+def test_catalog_index_rebuilt(tmpdir, monkeypatch, sharded):
+    c = Catalog('indexed', catalog_path=tmpdir, sharded=sharded)
+    for i in range(5):
+        c[f'ds{i}'] = {'dataset_name': f'ds{i}'}
+    Catalog.load('indexed', catalog_path=tmpdir, lazy=True, shared=False)
+    catalog_dir = pathlib.Path(tmpdir) / 'indexed'
+    for path in [catalog_dir, *catalog_dir.iterdir()]:
+        os.utime(path, ns=(0, 0))
+    scans = []
+    scan = Catalog._scan
+
+    def counting_scan(self, *args, **kwargs):
+        scans.append(self.name)
+        return scan(self, *args, **kwargs)
+    monkeypatch.setattr(Catalog, '_scan', counting_scan)
+
+    lazy = Catalog.load('indexed', catalog_path=tmpdir, lazy=True, shared=False)
+    assert lazy.index_file_fq.exists() and len(scans) == 1
+    # Writing the index leaves it valid
+    lazy = Catalog.load('indexed', catalog_path=tmpdir, lazy=True, shared=False)
+    assert len(scans) == 1
+
+    # A truncated index is ignored, and rebuilt
+    blob = lazy.index_file_fq.read_text()
+    lazy.index_file_fq.write_text(blob[:len(blob) // 2])
+    lazy = Catalog.load('indexed', catalog_path=tmpdir, lazy=True, shared=False)
+    assert len(scans) == 2
+    assert lazy == c
+    assert lazy.index_file_fq.read_text() == blob
+    assert not list(lazy.index_file_fq.parent.glob('.*.tmp'))
+
+def test_catalog_verify(tmpdir):
+    with pytest.raises(ValueError):
+        Catalog('verify', catalog_path=tmpdir, verify='sometimes')
+
+    c = Catalog('verify', catalog_path=tmpdir, verify='written')
+    c['a'] = {'dataset_name': 'a'}
+    c['b'] = {'dataset_name': 'b'}
+    assert set(c._manifest) == {'a', 'b'}
+    assert c._verify_save()
+
+    # Entries modified behind our back fail verification
+    (pathlib.Path(tmpdir) / 'verify' / 'a.json').write_text('{"dataset_name": "not a"}')
+    assert not c._verify_save()
+    assert c._verify_save(keys=['b'])
+
+    # Serializations that do not round-trip fail verification
+    c['c'] = {'shape': (1, 2)}
+    assert not c._verify_save(keys=['c'])
+
+    c = Catalog('verify', catalog_path=tmpdir, verify='none')
+    assert c._verify_save()
+    c = Catalog('verify', catalog_path=tmpdir, verify='full')
+    c.data['b'] = {'dataset_name': 'not b'}
+    assert not c._verify_save()
+
+def test_catalog_batch(tmpdir):
+    c = Catalog('batch', catalog_path=tmpdir)
+    c['keep'] = {'dataset_name': 'keep'}
+    c['drop'] = {'dataset_name': 'drop'}
+    catalog_dir = pathlib.Path(tmpdir) / 'batch'
+
+    with c.batch():
+        for i in range(10):
+            c[f'ds{i}'] = {'dataset_name': f'ds{i}'}
+        del c['drop']
+        # buffered in memory until the batch exits
+        assert 'ds0' in c
+        assert not (catalog_dir / 'ds0.json').exists()
+        assert (catalog_dir / 'drop.json').exists()
+    assert (catalog_dir / 'ds9.json').exists()
+    assert not (catalog_dir / 'drop.json').exists()
+    assert Catalog.load('batch', catalog_path=tmpdir, shared=False) == c
+    assert not list(catalog_dir.glob('.*.tmp'))
+
+    # Exceptions roll the batch back
+    with pytest.raises(RuntimeError):
+        with c.batch():
+            c['keep'] = {'dataset_name': 'changed'}
+            c['new'] = {'dataset_name': 'new'}
+            with c.batch():
+                del c['ds0']
+            raise RuntimeError("abort")
+    assert c['keep'] == {'dataset_name': 'keep'}
+    assert 'new' not in c
+    assert 'ds0' in c
+    assert Catalog.load('batch', catalog_path=tmpdir, shared=False) == c
+
+def test_catalog_batch_failed_flush(tmpdir, monkeypatch):
+    c = Catalog('batch', catalog_path=tmpdir)
+    c['keep'] = {'dataset_name': 'keep'}
+    c['drop'] = {'dataset_name': 'drop'}
+    catalog_dir = pathlib.Path(tmpdir) / 'batch'
+    stage_item = Catalog._stage_item
+
+    def failing_stage_item(self, key):
+        if key == 'bad':
+            raise OSError("disk full")
+        return stage_item(self, key)
+    monkeypatch.setattr(Catalog, '_stage_item', failing_stage_item)
+
+    # Nothing is written unless everything can be
+    with pytest.raises(OSError):
+        with c.batch():
+            c['keep'] = {'dataset_name': 'changed'}
+            del c['drop']
+            c['bad'] = {'dataset_name': 'bad'}
+    assert dict(c) == {'keep': {'dataset_name': 'keep'}, 'drop': {'dataset_name': 'drop'}}
+    assert Catalog.load('batch', catalog_path=tmpdir, shared=False) == c
+    assert not list(catalog_dir.glob('.*.tmp'))
+
+    # Nor left half-written if renaming fails
+    replace = os.replace
+
+    def failing_replace(src, dst):
+        if pathlib.Path(dst).name == 'new.json':
+            raise OSError("rename failed")
+        replace(src, dst)
+    monkeypatch.setattr(os, 'replace', failing_replace)
+    with pytest.raises(OSError):
+        with c.batch():
+            c['keep'] = {'dataset_name': 'changed'}
+            c['new'] = {'dataset_name': 'new'}
+    monkeypatch.undo()
+    assert dict(c) == {'keep': {'dataset_name': 'keep'}, 'drop': {'dataset_name': 'drop'}}
+    assert Catalog.load('batch', catalog_path=tmpdir, shared=False) == c
+    assert not list(catalog_dir.glob('.*.tmp'))
+
+    with c.batch():
+        c['new'] = {'dataset_name': 'new'}
+    assert Catalog.load('batch', catalog_path=tmpdir, shared=False) == c
+
+def test_shared_catalog(tmpdir):
+    c = Catalog.load('shared', catalog_path=tmpdir)
+    assert Catalog.load('shared', catalog_path=tmpdir) is c
+    assert Catalog.load('shared', catalog_path=tmpdir, shared=False) is not c
+
+    # Changes made through any other object are picked up on the next load
+    other = Catalog.load('shared', catalog_path=tmpdir, shared=False)
+    other['a'] = {'dataset_name': 'a'}
+    other['b'] = {'dataset_name': 'b'}
+    c = Catalog.load('shared', catalog_path=tmpdir)
+    assert c['a'] == {'dataset_name': 'a'}
+
+    # Unchanged entries are not re-read
+    c._racy.clear()
+    c.data['a'] = {'dataset_name': 'cached'}
+    other['b'] = {'dataset_name': 'b', 'hashes': {}}
+    c = Catalog.load('shared', catalog_path=tmpdir)
+    assert c['a'] == {'dataset_name': 'cached'}
+    assert c['b'] == {'dataset_name': 'b', 'hashes': {}}
+
+    del other['a']
+    assert 'a' not in Catalog.load('shared', catalog_path=tmpdir)
+
+    Catalog.delete('shared', catalog_path=tmpdir)
+    assert Catalog.load('shared', catalog_path=tmpdir) is not c
+
+@pytest.mark.parametrize('sharded', [False, True])
+def test_shared_catalog_dir_mtime(tmpdir, monkeypatch, sharded):
+    """Shared catalogs are only re-listed if their directories have changed"""
+    c = Catalog.load('mtime', catalog_path=tmpdir, sharded=sharded)
+    c['a'] = {'dataset_name': 'a'}
+    for path in [c.catalog_dir_fq, *c.catalog_dir_fq.iterdir()]:
+        os.utime(path, ns=(0, 0))
+    c = Catalog.load('mtime', catalog_path=tmpdir)  # lists the (now old) directories
+
+    scans = []
+    scan = Catalog._scan
+    monkeypatch.setattr(Catalog, '_scan', lambda self, shards=None: scans.append(shards) or scan(self, shards))
+    assert Catalog.load('mtime', catalog_path=tmpdir)['a'] == {'dataset_name': 'a'}
+    assert scans == []
+
+    # Entries edited in place (which doesn't change their directory) are still noticed
+    entry_file = c._entry_file('a')
+    save_json(entry_file, {'dataset_name': 'a', 'edited': True})
+    os.utime(entry_file, ns=(10**9, 10**9))
+    assert Catalog.load('mtime', catalog_path=tmpdir)['a'] == {'dataset_name': 'a', 'edited': True}
+    assert scans == []
+
+    other = Catalog.load('mtime', catalog_path=tmpdir, shared=False)
+    other['b'] = {'dataset_name': 'b'}
+    scans.clear()
+    assert Catalog.load('mtime', catalog_path=tmpdir)['b'] == {'dataset_name': 'b'}
+    assert len(scans) == 1
+
+
+def test_shared_catalog_metadata_copy(tmpdir):
+    """Metadata returned from the shared catalog can be changed without changing the catalog"""
+    from src.benchmarks.cold_start import synthetic_project
+    from src.data import Dataset
+    store, dataset_name = synthetic_project(tmpdir, n_datasets=3, n_rows=10)
+    catalog_path = store.catalog_path
+    # too old to be re-read on every load
+    for path in (catalog_path / 'datasets').iterdir():
+        os.utime(path, ns=(0, 0))
+    for load in (Dataset.load, Dataset.from_catalog):
+        meta = load(dataset_name, catalog_path=catalog_path, metadata_only=True)
+        hashes = dict(meta['hashes'])
+        meta['hashes']['data'] = 'sha1:changed'
+        assert Catalog.load('datasets', catalog_path=catalog_path)[dataset_name]['hashes'] == hashes
+        assert load(dataset_name, catalog_path=catalog_path, metadata_only=True)['hashes'] == hashes
+
+    # Nor does changing a value after storing it in the catalog (as `Dataset.update_catalog()` does)
+    meta = load(dataset_name, catalog_path=catalog_path, metadata_only=True)
+    Catalog.load('datasets', catalog_path=catalog_path)[dataset_name] = meta
+    meta['descr'] = 'changed'
+    assert load(dataset_name, catalog_path=catalog_path, metadata_only=True).get('descr') != 'changed'
+
+
+def test_catalog_snapshot(tmpdir, old_catalog_file):
+    c = Catalog.from_old_catalog(old_catalog_file, catalog_path=tmpdir)
+    c._save(paranoid=False)
+    catalog_dir = pathlib.Path(tmpdir) / c.name
+    # Entries modified within the last few seconds are never snapshotted
+    for f in catalog_dir.glob('*.json'):
+        os.utime(f, ns=(0, f.stat().st_mtime_ns - 10**10))
+
+    snap = Catalog.load(c.name, catalog_path=tmpdir, snapshot=True, shared=False)
+    assert snap.snapshot_file_fq.exists()
+    assert set(snap._read_snapshot()) == set(c)
+    assert Catalog.load(c.name, catalog_path=tmpdir, snapshot=True, shared=False) == c
+
+    # JSON files remain the source of truth
+    save_json(catalog_dir / 'wine_reviews.json', {'changed': True})
+    snap = Catalog.load(c.name, catalog_path=tmpdir, snapshot=True, shared=False)
+    assert snap['wine_reviews'] == {'changed': True}
+    (catalog_dir / 'wine_reviews_150k.json').unlink()
+    snap = Catalog.load(c.name, catalog_path=tmpdir, snapshot=True, shared=False)
+    assert 'wine_reviews_150k' not in snap
+    assert 'wine_reviews_150k' not in snap._read_snapshot()
+
+def test_catalog_index(tmpdir):
+    c = Catalog('indexed', catalog_path=tmpdir)
+    c['a'] = {'hashes': {'data': 'sha1:1'}, 'outputs': ['x', 'y']}
+    c['b'] = {'hashes': {'data': 'sha1:2'}, 'outputs': ['z']}
+    c.index_on('hashes.data')
+    c.index_on('outputs')
+    assert c.find(hashes__data='sha1:1') == {'a'}
+    assert c.find(outputs='y') == {'a'}
+    assert c.find(**{'hashes.data': 'sha1:2'}, outputs='z') == {'b'}
+    assert c.find(hashes__data='sha1:1', outputs='z') == set()
+
+    c['b'] = {'hashes': {'data': 'sha1:1'}}
+    assert c.find(hashes__data='sha1:1') == {'a', 'b'}
+    assert c.find(outputs='z') == set()
+    del c['a']
+    assert c.find(hashes__data='sha1:1') == {'b'}
+
+    # Rolled-back batches restore the index
+    with pytest.raises(RuntimeError):
+        with c.batch():
+            c['b'] = {'hashes': {'data': 'sha1:3'}}
+            raise RuntimeError
+    assert c.find(hashes__data='sha1:1') == {'b'}
+
+    # Changes made on disk are picked up on refresh
+    lazy = Catalog.load('indexed', catalog_path=tmpdir, lazy=True, shared=False)
+    lazy.index_on('hashes.data')
+    assert lazy.find(hashes__data='sha1:1') == {'b'}
+    save_json(pathlib.Path(tmpdir) / 'indexed' / 'c.json', {'hashes': {'data': 'sha1:1'}})
+    lazy._refresh()
+    assert lazy.find(hashes__data='sha1:1') == {'b', 'c'}
+
+    # Unindexed fields fall back to a scan
+    assert lazy.find(missing='value') == set()
+
+def test_catalog_blobs(tmpdir):
+    descr = "A long description. " * 100
+    c = Catalog('blobs', catalog_path=tmpdir, blob_threshold=1000)
+    for name in ['a', 'b', 'c']:
+        c[name] = {'descr': descr, 'name': name, 'parts': [descr, 'short']}
+    catalog_dir = pathlib.Path(tmpdir) / 'blobs'
+    assert len(list((catalog_dir / '_blobs').iterdir())) == 1
+    assert descr not in (catalog_dir / 'a.json').read_text()
+    assert c._verify_save()
+
+    for lazy in (False, True):
+        other = Catalog.load('blobs', catalog_path=tmpdir, lazy=lazy, shared=False, verify='full')
+        assert other['b'] == {'descr': descr, 'name': 'b', 'parts': [descr, 'short']}
+        assert other == c
+
+    # Entries are written inline unless a threshold is set
+    other['d'] = {'descr': descr}
+    assert descr in (catalog_dir / 'd.json').read_text()
+
+def test_sharded_catalog(tmpdir, old_catalog_file):
+    c = Catalog.from_old_catalog(old_catalog_file, catalog_path=tmpdir)
+    c._save(paranoid=False)
+    catalog_dir = pathlib.Path(tmpdir) / c.name
+
+    sharded = Catalog.migrate_layout(c.name, catalog_path=tmpdir)
+    assert sharded.sharded
+    assert not list(catalog_dir.glob('*.json'))
+    assert len(list(catalog_dir.glob('*/*.json'))) == len(c)
+    assert sharded == c
+    assert Catalog.load(c.name, catalog_path=tmpdir, lazy=True, shared=False) == c
+    with pytest.raises(ValueError):
+        Catalog(c.name, catalog_path=tmpdir, sharded=False)
+
+    # Only changed shards are re-listed when the index is rebuilt
+    lazy = Catalog.load(c.name, catalog_path=tmpdir, lazy=True, shared=False)
+    lazy['new_entry'] = {'dataset_name': 'new_entry'}
+    del lazy['wine_reviews']
+    lazy = Catalog.load(c.name, catalog_path=tmpdir, lazy=True, shared=False)
+    assert 'new_entry' in lazy and 'wine_reviews' not in lazy
+    assert len(lazy) == len(c)
+
+    flat = Catalog.migrate_layout(c.name, sharded=False, catalog_path=tmpdir)
+    assert not flat.sharded
+    assert not [d for d in catalog_dir.iterdir() if d.is_dir()]
+    assert flat['new_entry'] == {'dataset_name': 'new_entry'}
+
+    new = Catalog('new_sharded', catalog_path=tmpdir, sharded=True)
+    new['a'] = {'a': 1}
+    assert Catalog('new_sharded', catalog_path=tmpdir) == new
+    assert Catalog('new_sharded', catalog_path=tmpdir).sharded
+
+def test_catalog_diff(tmpdir):
+    old = Catalog('old', catalog_path=tmpdir)
+    for key in 'abcd':
+        old[key] = {'name': key, 'descr': 'x' * 200}
+    new = Catalog('new', catalog_path=tmpdir, sharded=True, blob_threshold=100)
+    for key in 'bcde':
+        new[key] = {'name': key, 'descr': 'x' * 200}
+    new['c'] = {'name': 'c', 'descr': 'y' * 200}
+    # formatting-only differences don't count
+    save_json(pathlib.Path(tmpdir) / 'old' / 'd.json', old['d'], indent=4)
+
+    diff = new.diff(old)
+    assert diff == ({'e'}, {'a'}, {'c'})
+    assert old.diff(pathlib.Path(tmpdir) / 'new') == ({'a'}, {'e'}, {'c'})
+    assert new.diff(new) == (set(), set(), set())
+
+def test_catalog_git_diff(tmpdir):
+    def git(*args):
+        subprocess.run(['git', '-c', 'user.name=test', '-c', 'user.email=test@example.com'] + list(args),
+                       cwd=tmpdir, check=True, stdout=subprocess.DEVNULL)
+    git('init', '-q')
+    c = Catalog('gitcat', catalog_path=tmpdir)
+    c['a'], c['b'], c['c'] = {'x': 1}, {'x': 2}, {'x': 3}
+    git('add', 'gitcat')
+    git('commit', '-q', '-m', 'first')
+    del c['a']
+    c['b'] = {'x': 20}
+    save_json(pathlib.Path(tmpdir) / 'gitcat' / 'c.json', {'x': 3}, indent=4)
+    c['d'] = {'x': 4}
+    assert Catalog.git_diff('gitcat', 'HEAD', catalog_path=tmpdir) == ({'d'}, {'a'}, {'b'})
+    git('add', '-A', 'gitcat')
+    git('commit', '-q', '-m', 'second')
+    assert Catalog.git_diff('gitcat', 'HEAD~1', 'HEAD', catalog_path=tmpdir) == ({'d'}, {'a'}, {'b'})
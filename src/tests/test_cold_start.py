@@ -0,0 +1,17 @@
+from src import paths
+from .._paths import Paths
+from ..benchmarks.cold_start import STAGES, run
+from ..data.catalog import _shared_catalogs
+
+
+def test_cold_start():
+    """Every stage is timed, and `paths` (and the shared catalogs) are left as they were found"""
+    before = paths.snapshot()
+    shared = dict(_shared_catalogs)
+    results = run(n_datasets=20, n_rows=100, repeat=2)
+    assert [r['stage'] for r in results] == list(STAGES)
+    assert all(0 < r['best_s'] <= r['first_s'] for r in results)
+    assert paths.snapshot() == before
+    assert not paths._read_only
+    assert Paths() is paths
+    assert _shared_catalogs == shared
@@ -0,0 +1,239 @@
+import pathlib
+import pickle
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.data import Dataset, available_codecs, available_formats, prune_object_store
+from src.data.hashing import hash_value
+from src.data.storage import PickleFormat
+from src.exceptions import ValidationError
+
+
+def make_dataset():
+    data = pd.DataFrame({'points': np.arange(10), 'variety': [f"grape {i % 3}" for i in range(10)]})
+    return Dataset('storage_test', data=data, target=np.arange(10) % 2, descr=['not', 'an', 'array'])
+
+
+@pytest.mark.parametrize('format', ['joblib', 'pickle', 'npy', 'parquet', 'feather'])
+def test_dump_formats(tmpdir, format):
+    if format not in available_formats():
+        pytest.skip(f"{format} is not available")
+    ds = make_dataset()
+    ds.dump(dump_path=tmpdir, format=format, update_catalog=False)
+
+    meta = Dataset.from_disk(ds.name, data_path=tmpdir, metadata_only=True, check_hashes=False)
+    assert meta['hashes'] == ds.HASHES
+    assert meta['storage']['format'] == format
+    if format != 'joblib':
+        attrs = meta['storage']['attributes']
+        assert set(attrs) == {'data', 'target', 'descr'}
+        assert attrs['target']['format'] == ('pickle' if format == 'pickle' else 'npy')
+        assert attrs['descr']['format'] == 'pickle'
+        assert attrs['data']['format'] == (format if format in ('parquet', 'feather') else 'pickle')
+        assert all((tmpdir / rec['file']).exists() for rec in attrs.values())
+
+    loaded = Dataset.from_disk(ds.name, data_path=tmpdir, check_hashes=False)
+    assert isinstance(loaded, Dataset)
+    pd.testing.assert_frame_equal(loaded.data, ds.data)
+    np.testing.assert_array_equal(loaded.target, ds.target)
+    assert loaded.descr == ds.descr
+    assert loaded.metadata == ds.metadata
+    assert loaded.update_hashes(update_metadata=False)['hashes'] == ds.HASHES
+
+
+def test_dump_legacy_metadata(tmpdir):
+    """Datasets dumped before storage formats were recorded can still be read"""
+    ds = make_dataset()
+    ds.dump(dump_path=tmpdir, update_catalog=False)
+    joblib.dump(ds.metadata, str(tmpdir / f"{ds.name}.metadata"))
+    loaded = Dataset.from_disk(ds.name, data_path=tmpdir, check_hashes=False)
+    pd.testing.assert_frame_equal(loaded.data, ds.data)
+
+
+def test_dump_unknown_format(tmpdir):
+    with pytest.raises(ValueError):
+        make_dataset().dump(dump_path=tmpdir, format='csv', update_catalog=False)
+
+
+@pytest.mark.parametrize('format', ['joblib', 'npy'])
+def test_from_disk_mmap(tmpdir, format):
+    ds = Dataset('mmap_test', data=np.arange(1000.).reshape(100, 10), target=np.arange(100))
+    ds.dump(dump_path=tmpdir, format=format, update_catalog=False)
+
+    loaded = Dataset.from_disk(ds.name, data_path=tmpdir, check_hashes=False, mmap_mode='r')
+    assert isinstance(loaded.data, np.memmap)
+    assert isinstance(loaded.target, np.memmap)
+    assert not loaded.data.flags.writeable
+    np.testing.assert_array_equal(loaded.data, ds.data)
+    assert loaded.update_hashes(update_metadata=False)['hashes'] == ds.HASHES
+
+    loaded = Dataset.from_disk(ds.name, data_path=tmpdir, check_hashes=False)
+    assert not isinstance(loaded.data, np.memmap)
+
+
+@pytest.mark.parametrize('format', ['joblib', 'pickle', 'parquet', 'feather'])
+def test_from_disk_columns_filters(tmpdir, format):
+    if format not in available_formats():
+        pytest.skip(f"{format} is not available")
+    ds = make_dataset()
+    ds.dump(dump_path=tmpdir, catalog_path=tmpdir, format=format)
+
+    loaded = Dataset.from_disk(ds.name, data_path=tmpdir, catalog_path=tmpdir, columns=['variety'])
+    assert list(loaded.data.columns) == ['variety']
+    np.testing.assert_array_equal(loaded.target, ds.target)
+
+    filters = [('points', '>=', 4), ('variety', 'in', ['grape 0', 'grape 1'])]
+    loaded = Dataset.from_disk(ds.name, data_path=tmpdir, catalog_path=tmpdir, columns=['variety'], filters=filters)
+    expected = ds.data[(ds.data.points >= 4) & ds.data.variety.isin(['grape 0', 'grape 1'])]
+    assert list(loaded.data.variety) == list(expected.variety)
+    np.testing.assert_array_equal(loaded.target, ds.target[expected.index])
+
+    with pytest.raises(ValueError):
+        Dataset.from_disk(ds.name, data_path=tmpdir, catalog_path=tmpdir, filters=[('points', '~', 1)])
+
+
+def test_from_disk_column_hashes(tmpdir):
+    """Columns loaded individually are verified against the per-column hashes in the catalog"""
+    ds = make_dataset()
+    ds.dump(dump_path=tmpdir, catalog_path=tmpdir, format='pickle')
+    assert set(ds.metadata['column_hashes']['data']) == {'points', 'variety'}
+    # unchanged data leaves the column hashes in place
+    ds.update_hashes()
+    assert 'column_hashes' in ds.metadata
+
+    # tamper with one column on disk
+    tampered = ds.data.copy()
+    tampered['points'] += 1
+    with open(tmpdir / f"{ds.name}.data.pkl", 'wb') as fo:
+        pickle.dump(tampered, fo)
+    loaded = Dataset.from_disk(ds.name, data_path=tmpdir, catalog_path=tmpdir, columns=['variety'])
+    assert list(loaded.data.variety) == list(ds.data.variety)
+    with pytest.raises(ValidationError):
+        Dataset.from_disk(ds.name, data_path=tmpdir, catalog_path=tmpdir, columns=['variety', 'points'])
+
+    # changed data invalidates them
+    ds.data = tampered
+    ds.update_hashes()
+    assert 'column_hashes' not in ds.metadata
+
+
+@pytest.mark.parametrize('format', ['joblib', 'npy'])
+def test_from_disk_lazy(tmpdir, format):
+    ds = make_dataset()
+    ds.dump(dump_path=tmpdir, format=format, update_catalog=False)
+
+    lazy = Dataset.from_disk(ds.name, data_path=tmpdir, check_hashes=False, lazy=True)
+    assert not lazy.is_loaded
+    assert lazy.metadata == ds.metadata
+    assert lazy.has_target
+    assert lazy.attribute_info('data') == {'type': 'pandas.DataFrame', 'shape': (10, 2),
+                                           'dtype': {c: str(t) for c, t in ds.data.dtypes.items()}}
+    assert lazy.attribute_info('target')['shape'] == (10,)
+    assert str(lazy) == str(ds)
+    assert not lazy.is_loaded
+
+    # The first access reads everything
+    pd.testing.assert_frame_equal(lazy.data, ds.data)
+    assert lazy.is_loaded
+    np.testing.assert_array_equal(lazy['target'], ds.target)
+    assert lazy.descr == ds.descr
+    assert lazy.update_hashes(update_metadata=False) == ds.update_hashes(update_metadata=False)
+
+    # Changes on disk since a lazy load are detected
+    lazy = Dataset.from_disk(ds.name, data_path=tmpdir, check_hashes=False, lazy=True)
+    Dataset('storage_test', data=ds.data.head(3)).dump(dump_path=tmpdir, format=format,
+                                                       exists_ok=True, update_catalog=False)
+    with pytest.raises(ValidationError):
+        lazy.data
+
+
+@pytest.mark.parametrize('format', ['joblib', 'npy'])
+@pytest.mark.parametrize('compress', ['gzip', ('bz2', 1), ('xz', 1), 'lz4', ('zstd', 1)])
+def test_dump_compress(tmpdir, format, compress):
+    codec = compress if isinstance(compress, str) else compress[0]
+    if codec not in available_codecs():
+        pytest.skip(f"{codec} is not available")
+    ds = make_dataset()
+    ds.dump(dump_path=tmpdir, format=format, compress=compress, update_catalog=False)
+
+    meta = Dataset.from_disk(ds.name, data_path=tmpdir, metadata_only=True, check_hashes=False)
+    assert meta['storage']['compress'][0] == codec
+    if format != 'joblib':
+        assert meta['storage']['attributes']['target']['file'].startswith(f"{ds.name}.target.npy.")
+
+    # compressed files can't be memory-mapped, so mmap_mode is ignored
+    loaded = Dataset.from_disk(ds.name, data_path=tmpdir, check_hashes=False, mmap_mode='r')
+    pd.testing.assert_frame_equal(loaded.data, ds.data)
+    np.testing.assert_array_equal(loaded.target, ds.target)
+    assert not isinstance(loaded.target, np.memmap)
+
+
+def test_dump_compress_unknown(tmpdir):
+    with pytest.raises(ValueError):
+        make_dataset().dump(dump_path=tmpdir, compress='snappy', update_catalog=False)
+
+
+
+@pytest.mark.parametrize('format', ['joblib', 'pickle', 'npy'])
+@pytest.mark.parametrize('compress', [None, 'gzip'])
+def test_dump_stream_hashes(tmpdir, monkeypatch, format, compress):
+    ds = make_dataset()
+    expected = ds.update_hashes(hash_type='stream-sha1', update_metadata=False)['hashes']
+    assert all(value.startswith('stream-sha1:') for value in expected.values())
+    if format == 'npy':
+        # numpy arrays are hashed as they are written; never serialized separately
+        def hash_non_array(value, hash_type):
+            assert not isinstance(value, np.ndarray), "array serialized twice"
+            return hash_value(value, hash_type)
+        monkeypatch.setattr('src.data.storage.hash_value', hash_non_array)
+    ds.dump(dump_path=tmpdir, format=format, compress=compress, hash_type='stream-sha1', update_catalog=False)
+    assert ds.metadata['hashes'] == expected
+
+    loaded = Dataset.from_disk(ds.name, data_path=tmpdir, check_hashes=False)
+    assert loaded.metadata['hashes'] == expected
+    assert loaded.update_hashes(hash_type='stream-sha1', update_metadata=False)['hashes'] == expected
+
+
+def test_dump_object_store(tmpdir, monkeypatch):
+    ds = make_dataset()
+    ds.dump(dump_path=tmpdir, object_store=True, update_catalog=False)
+    other = Dataset('storage_test_copy', data=ds.data.copy(), target=ds.target + 1, descr=ds.descr)
+    written = []
+    write = PickleFormat.write
+    monkeypatch.setattr(PickleFormat, 'write', lambda self, obj, path, compress=None:
+                        written.append(path.name) or write(self, obj, path, compress))
+    other.dump(dump_path=tmpdir, object_store=True, compress='gzip', update_catalog=False)
+    # only target differs. Compressed payloads are stored separately
+    assert len(written) == 3
+
+    objects = pathlib.Path(tmpdir) / 'objects'
+    meta = Dataset.from_disk(ds.name, data_path=tmpdir, metadata_only=True, check_hashes=False)
+    assert meta['storage']['attributes']['data']['file'].startswith('objects/sha1/')
+    # numpy arrays are stored as 'npy', so can be memory-mapped
+    assert meta['storage']['attributes']['target']['file'].endswith('.npy')
+    assert isinstance(Dataset.from_disk(ds.name, data_path=tmpdir, check_hashes=False, mmap_mode='r').target,
+                      np.memmap)
+    for dataset in (ds, other):
+        loaded = Dataset.from_disk(dataset.name, data_path=tmpdir, check_hashes=False)
+        pd.testing.assert_frame_equal(loaded.data, dataset.data)
+        assert np.array_equal(loaded.target, dataset.target)
+        assert loaded.descr == dataset.descr
+
+    other.dump(dump_path=tmpdir, object_store=True, update_catalog=False, exists_ok=True)
+    assert len(written) == 4  # only (uncompressed) target is new
+    other.dump(dump_path=tmpdir, object_store=True, update_catalog=False, exists_ok=True)
+    assert len(written) == 4
+    # payloads still being written are left alone
+    in_flight = sorted(objects.rglob('*.*'))[0]
+    in_flight = in_flight.with_name(f".{in_flight.name}.0123abcd.tmp")
+    in_flight.write_bytes(b'')
+    before = sorted(objects.rglob('*.*'))
+    # as are those written too recently to be sure their .metadata has been written
+    assert prune_object_store(dataset_path=tmpdir) == []
+    unused = prune_object_store(dataset_path=tmpdir, grace_period=0)
+    assert len(unused) == 3  # other's gzipped payloads
+    assert sorted(objects.rglob('*.*')) == sorted(set(before) - set(unused))
+    assert prune_object_store(dataset_path=tmpdir, grace_period=0) == []
@@ -0,0 +1,138 @@
+import hashlib
+import io
+import pickle
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.data import Dataset, available_hash_types
+from src.data.hashing import hash_value
+
+
+def make_frame():
+    return pd.DataFrame({'points': np.arange(10), 'price': np.linspace(10, 20, 10),
+                         'variety': [f"grape {i % 3}" for i in range(10)]})
+
+
+def test_vector_hash_frame():
+    df = make_frame()
+    expected = hash_value(df, 'vector-sha1')
+    assert expected.startswith('vector-sha1:')
+    assert hash_value(df.copy(), 'vector-sha1') == expected
+
+    # unlike stream- hashes, the same however the DataFrame is held in memory
+    buffer = io.BytesIO()
+    joblib.dump(df, buffer)
+    buffer.seek(0)
+    assert hash_value(joblib.load(buffer), 'vector-sha1') == expected
+
+    changed = df.copy()
+    changed.loc[3, 'variety'] = "grape 9"
+    renamed = df.rename(columns={'price': 'cost'})
+    retyped = df.astype({'points': 'float64'})
+    reindexed = df.set_index(df.index + 1)
+    for other in (changed, renamed, retyped, reindexed, df[['points', 'price']]):
+        assert hash_value(other, 'vector-sha1') != expected
+    assert hash_value(df, 'vector-md5') != hash_value(df, 'vector-sha1')
+
+
+def test_vector_hash_arrays():
+    a = np.arange(12, dtype='int64').reshape(3, 4)
+    expected = hash_value(a, 'vector-sha1')
+    assert hash_value(np.asfortranarray(a), 'vector-sha1') == expected
+    assert hash_value(a.reshape(4, 3), 'vector-sha1') != expected
+    assert hash_value(a.astype('int32'), 'vector-sha1') != expected
+    assert hash_value(np.array(['a', None, 'b'], dtype=object), 'vector-sha1').startswith('vector-sha1:')
+    # anything else is hashed by joblib
+    assert hash_value(['an', 'object'], 'vector-sha1').split(':')[1] == hash_value(['an', 'object'], 'sha1').split(':')[1]
+
+
+def test_stream_hash_canonical():
+    varieties = [f"grape {i % 3}" for i in range(10)]
+    shared = pd.DataFrame({'variety': varieties})
+    distinct = pd.DataFrame({'variety': [''.join(list(v)) for v in varieties]})
+    assert shared.equals(distinct)
+    # equal, however their values are shared in memory
+    assert hash_value(shared, 'stream-sha1') == hash_value(distinct, 'stream-sha1')
+    # numpy arrays hash their .npy serialization
+    a = np.arange(10)
+    buffer = io.BytesIO()
+    np.save(buffer, a)
+    assert hash_value(a, 'stream-sha1') == f"stream-sha1:{hashlib.sha1(buffer.getvalue()).hexdigest()}"
+
+
+@pytest.mark.parametrize('hash_type', available_hash_types())
+def test_verify_hashes_mixed_types(tmpdir, hash_type):
+    ds = Dataset('hashing_test', data=make_frame(), target=np.arange(10) % 2, update_hashes=False)
+    ds.dump(dump_path=tmpdir, hash_type=hash_type, update_catalog=False)
+    assert all(value.startswith(f"{hash_type}:") for value in ds.metadata['hashes'].values())
+    # existing (sha1) catalog hashes keep validating, whatever the type of hash now recorded
+    sha1_hashes = ds.update_hashes(hash_type='sha1', update_metadata=False)['hashes']
+    assert ds.verify_hashes(sha1_hashes)
+    assert not ds.verify_hashes({**sha1_hashes, 'target': sha1_hashes['data']})
+    loaded = Dataset.from_disk(ds.name, data_path=tmpdir, check_hashes=False)
+    assert loaded.verify_hashes(ds.metadata['hashes'])
+
+
+def test_hash_cache(tmpdir, monkeypatch):
+    calls = []
+
+    def counting_hash_value(value, hash_type='sha1'):
+        calls.append(hash_type)
+        return hash_value(value, hash_type)
+    monkeypatch.setattr('src.data.datasets.hash_value', counting_hash_value)
+
+    data = make_frame()
+    ds = Dataset('hashing_test', data=data, target=np.arange(10) % 2)
+    assert len(calls) == 2
+    hashes = ds.metadata['hashes']
+    ds.update_hashes()
+    assert len(calls) == 2
+    # dump() always rehashes what it writes
+    ds.dump(dump_path=tmpdir, update_catalog=False)
+    assert calls == ['sha1'] * 4
+    assert ds.metadata['hashes'] == hashes
+
+    # the cache isn't pickled (or copied) along with the Dataset
+    assert b'_hash_cache' not in pickle.dumps(ds)
+
+    data.loc[0, 'points'] = 100
+    ds.data = data  # reassigning invalidates the cached hash, even of the same object
+    ds.update_hashes()
+    assert calls == ['sha1'] * 5
+    assert ds.metadata['hashes']['data'] != hashes['data']
+    assert ds.metadata['hashes']['target'] == hashes['target']
+
+    ds['target'] = None
+    ds.update_hashes(hash_type='vector-sha1')
+    assert calls == ['sha1'] * 5 + ['vector-sha1'] * 2
+
+
+def test_hash_cache_column_assigned_in_place(tmpdir):
+    data = make_frame()
+    data.loc[3, 'price'] = np.nan
+    ds = Dataset('hashing_test', data=data)
+    hashes = ds.metadata['hashes']
+    ds.data['price'] = ds.data['price'].fillna(0)
+    assert ds.update_hashes()['hashes']['data'] != hashes['data']
+
+    ds = Dataset('hashing_test', data=data)
+    ds.data['price'] = ds.data['price'].fillna(0)
+    ds.dump(dump_path=tmpdir, update_catalog=False)
+    assert ds.metadata['hashes']['data'] == hash_value(ds.data)
+    assert Dataset.from_disk(ds.name, data_path=tmpdir, metadata_only=True,
+                             check_hashes=False)['hashes']['data'] == hash_value(ds.data)
+
+
+def test_hash_cache_array_changed_in_place(tmpdir):
+    ds = Dataset('hashing_test', data=make_frame(), target=np.arange(10) % 2)
+    hashes = ds.metadata['hashes']
+    ds.target[0] = 99
+    ds.dump(dump_path=tmpdir, catalog_path=tmpdir)
+    assert ds.metadata['hashes']['target'] != hashes['target']
+    assert ds.metadata['hashes']['target'] == hash_value(ds.target)
+    # verified against the catalog as it is loaded
+    loaded = Dataset.from_disk(ds.name, data_path=tmpdir, catalog_path=tmpdir)
+    assert loaded.target[0] == 99
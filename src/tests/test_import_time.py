@@ -0,0 +1,19 @@
+import os
+import pathlib
+import subprocess
+import sys
+
+import pytest
+
+from ..benchmarks.import_time import HEAVY_MODULES
+
+
+@pytest.mark.parametrize('module', ['src', 'src.data', 'src.workflow'])
+def test_import_time(module):
+    """Heavy dependencies must only be imported on first use. (How long imports take is left to the benchmark)"""
+    # in a fresh interpreter: this one has imported them already
+    code = f"import sys, {module}; print(*(name for name in {HEAVY_MODULES!r} if name in sys.modules))"
+    result = subprocess.run([sys.executable, '-c', code], cwd=pathlib.Path(__file__).resolve().parents[2],
+                            env={**os.environ, 'LOGLEVEL': 'WARNING'},
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+    assert result.stdout.decode('utf-8').split() == []
@@ -0,0 +1,52 @@
+import json
+import random
+
+import pytest
+
+from ..utils import jsoncodec
+from ..utils import save_json, load_json
+
+
+def random_object(rng, depth=0):
+    kind = rng.randrange(9 if depth < 4 else 5)
+    if kind == 0:
+        return None
+    if kind == 1:
+        return rng.choice([True, False])
+    if kind == 2:
+        return rng.choice([0, -1, 2**63 - 1, -2**63, 2**64 - 1, 2**70, -2**63 - 1, rng.randrange(10**6)])
+    if kind == 3:
+        return rng.choice([0.5, 1e16, -2.0, 1/3, float('nan')])
+    if kind == 4:
+        alphabet = 'ab/\\"\n\t\x00\x1f\x7f\xe9☃\U0001f600'
+        return ''.join(rng.choice(alphabet) for _ in range(rng.randrange(8)))
+    if kind in (5, 6):
+        return {''.join(rng.choice('zaé_1') for _ in range(3)): random_object(rng, depth + 1)
+                for _ in range(rng.randrange(4))}
+    return [random_object(rng, depth + 1) for _ in range(rng.randrange(4))]
+
+
+@pytest.mark.parametrize('codec', jsoncodec.available_json_codecs())
+def test_codec_output_identical(codec):
+    codec = jsoncodec._CODECS[codec]()
+    rng = random.Random(0)
+    for _ in range(2000):
+        obj = random_object(rng)
+        blob = codec.dumps(obj)
+        assert blob == json.dumps(obj, indent=2, sort_keys=True)
+        # compare serializations, as nan != nan
+        assert json.dumps(codec.loads(blob), indent=2, sort_keys=True) == blob
+        assert json.dumps(codec.loads(blob.encode('utf-8')), indent=2, sort_keys=True) == blob
+    assert codec.dumps({1: 'a', 2: (1, 2)}) == json.dumps({1: 'a', 2: (1, 2)}, indent=2, sort_keys=True)
+
+
+def test_save_load_json(tmpdir):
+    obj = {'b': [1, 'caf\xe9'], 'a': {'x': None}}
+    filename = tmpdir / 'obj.json'
+    for codec in jsoncodec.available_json_codecs():
+        jsoncodec.set_json_codec(codec)
+        try:
+            assert save_json(filename, obj) == json.dumps(obj, indent=2, sort_keys=True)
+            assert load_json(filename) == obj
+        finally:
+            jsoncodec.set_json_codec()
@@ -0,0 +1,138 @@
+import os
+import pathlib
+import pickle
+
+import pytest
+
+from .._paths import PathStore, READ_ONLY_ENV_VAR
+
+
+def test_pathstore_reads_only_when_changed(tmpdir):
+    config_file = tmpdir / 'catalog' / 'config.ini'
+    os.makedirs(config_file.dirname)
+    p = PathStore(config_file=config_file, project_path='${catalog_path}/..', data_path='${project_path}/data')
+    # Backdate the config file, so its mtime can be trusted
+    os.utime(config_file, ns=(0, os.stat(config_file).st_mtime_ns - 10**10))
+
+    reads = []
+    p._config.read = lambda *args, _read=p._config.read: reads.append(args) or _read(*args)
+    assert p['data_path'] == tmpdir / 'data'
+    assert p['data_path'] == tmpdir / 'data'
+    assert len(reads) == 1
+
+    # Changes made on disk are noticed
+    other = PathStore(config_file=config_file)
+    other._usage_warning = False
+    other['data_path'] = '/tmp/elsewhere'
+    assert str(p['data_path']) == '/tmp/elsewhere'
+
+    # as are changes made locally
+    p._usage_warning = False
+    p['project_path'] = str(tmpdir / 'project')
+    p['data_path'] = '${project_path}/data'
+    assert p['data_path'] == tmpdir / 'project' / 'data'
+
+
+def test_pathstore_invalidation(tmpdir):
+    p = PathStore(config_file=tmpdir / 'config.ini', persistent=False,
+                  project_path='/tmp/project', data_path='${project_path}/data',
+                  raw_data_path='${data_path}/raw', notebook_path='/tmp/notebooks',
+                  other_path='${Other:root}/x')
+    p._config['Other'] = {'root': '/tmp/other'}
+    resolved = {key: p[key] for key in ['raw_data_path', 'notebook_path', 'other_path']}
+
+    p._usage_warning = False
+    p['project_path'] = '/tmp/moved'
+    assert p['raw_data_path'] == pathlib.Path('/tmp/moved/data/raw')
+    assert p['notebook_path'] is resolved['notebook_path']
+
+    # references to other sections are cached, and invalidated in the same way
+    assert p['other_path'] is resolved['other_path']
+    p.set_option('Other', 'root', '/tmp/elsewhere')
+    assert p['other_path'] == pathlib.Path('/tmp/elsewhere/x')
+    p.set_option('Other', 'path', '${Paths:notebook_path}/${root}')
+    assert p.get_option('Other', 'path') == '/tmp/notebooks//tmp/elsewhere'
+    assert ('Other', 'path') in p._expanded
+    p['notebook_path'] = '/tmp/nb'
+    assert ('Other', 'path') not in p._expanded
+    assert p.get_option('Other', 'path') == '/tmp/nb//tmp/elsewhere'
+    assert p.get_option('Other', 'missing') is None
+    assert p.get_option('Missing', 'path', fallback='') == ''
+
+
+def test_pathstore_deferred_writes(tmpdir):
+    config_file = tmpdir / 'config.ini'
+    defaults = {'project_path': '${catalog_path}/..', 'data_path': '${project_path}/data'}
+    p = PathStore(defaults, config_file=config_file)
+    st = os.stat(config_file)
+
+    # Construction doesn't rewrite an unchanged config file
+    PathStore(defaults, config_file=config_file)
+    assert (os.stat(config_file).st_ino, os.stat(config_file).st_mtime_ns) == (st.st_ino, st.st_mtime_ns)
+
+    p._usage_warning = False
+    with p.deferred():
+        p['data_path'] = '/tmp/data'
+        p['raw_data_path'] = '${data_path}/raw'
+        assert p['raw_data_path'] == pathlib.Path('/tmp/data/raw')
+        assert 'raw_data_path' not in config_file.read_text('utf-8')
+    assert PathStore(config_file=config_file)['raw_data_path'] == pathlib.Path('/tmp/data/raw')
+    assert 'catalog_path =' not in config_file.read_text('utf-8')
+
+
+def test_pathstore_read_only(tmpdir, monkeypatch):
+    config_file = tmpdir / 'catalog' / 'config.ini'
+    os.makedirs(config_file.dirname)
+    PathStore(config_file=config_file, project_path='${catalog_path}/..', data_path='${project_path}/data')
+    text = config_file.read_text('utf-8')
+
+    monkeypatch.setenv(READ_ONLY_ENV_VAR, '1')
+    p = PathStore(config_file=config_file, project_path='/tmp/elsewhere')
+    assert config_file.read_text('utf-8') == text
+    with pytest.raises(AttributeError):
+        p['data_path'] = '/tmp/data'
+    # The config file is never re-read
+    config_file.remove()
+    assert p['data_path'] == pathlib.Path('/tmp/elsewhere/data')
+
+    # Workers can be handed a snapshot rather than reading the config file
+    snapshot = pickle.loads(pickle.dumps(p.snapshot()))
+    monkeypatch.delenv(READ_ONLY_ENV_VAR)
+    worker = PathStore(config_file=tmpdir / 'worker' / 'config.ini', persistent=False)
+    worker.restore(snapshot)
+    assert worker['data_path'] == pathlib.Path('/tmp/elsewhere/data')
+    assert worker['catalog_path'] == pathlib.Path(tmpdir / 'catalog')
+    assert not config_file.exists()
+
+    p.set_read_only(False)
+    p['data_path'] = '/tmp/data'
+    assert 'data_path = /tmp/data' in config_file.read_text('utf-8')
+
+
+def test_dataset_local_config_read_only(tmpdir, monkeypatch):
+    from ..data import Dataset
+    config_file = tmpdir / 'catalog' / 'config.ini'
+    os.makedirs(config_file.dirname)
+    p = PathStore(config_file=config_file, processed_data_path='${catalog_path}/../data/processed')
+    monkeypatch.setattr('src.data.datasets.paths', p)
+    ds = Dataset('local_config_test')
+    ds.extra_base = '/tmp/extra'
+    ds.extra_auth_kwargs = {'anon': True}
+    assert ds.extra_base == '/tmp/extra'
+    assert ds.extra_auth_kwargs == {'anon': True}
+    text = config_file.read_text('utf-8')
+    assert '[local_config_test]' in text
+
+    # Per-dataset settings can't be changed in a read-only store either
+    p.set_read_only(True)
+    with pytest.raises(AttributeError):
+        ds.extra_base = '/tmp/elsewhere'
+    with pytest.raises(AttributeError):
+        del ds.extra_auth_kwargs
+    assert ds.extra_base == '/tmp/extra'
+    assert ds.extra_auth_kwargs == {'anon': True}
+    assert config_file.read_text('utf-8') == text
+
+    p.set_read_only(False)
+    del ds.extra_base
+    assert 'extra_base' not in config_file.read_text('utf-8')
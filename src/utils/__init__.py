@@ -1,16 +1,25 @@
-import json
-import numpy as np
+import os
 import pathlib
 import time
+import uuid
 
-import nbformat
-from nbconvert.preprocessors import ExecutePreprocessor, CellExecutionError
-
+# Heavy dependencies (numpy, nbformat, nbconvert, ipykernel) are imported on first use,
+# to keep `import src` fast.
 
 from ..log import logger
-from .ipynbname import name as ipynb_name, path as ipynb_path
+from .jsoncodec import json_dumps, json_loads, get_json_codec, set_json_codec
 from .. import paths
 
+
+def __getattr__(name):
+    """Import `ipynb_name` and `ipynb_path` (and hence ipykernel) on first use"""
+    if name in ('ipynb_name', 'ipynb_path'):
+        from . import ipynbname
+        value = getattr(ipynbname, name[len('ipynb_'):])
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 # Timing and Performance
 
 def timing_info(method):
@@ -41,13 +50,14 @@ def record_time_interval(section, start_time, line_break=False):
     return end_time
 
 def normalize_numpy_dict(d):
+    import numpy as np
     ret = d.copy()
     for k, v in ret.items():
         if isinstance(v, np.generic):
             ret[k] = np.asscalar(v)
     return ret
 
-def save_json(filename, obj, indent=2, sort_keys=True):
+def save_json(filename, obj, indent=2, sort_keys=True, atomic=False, fsync=False):
     """Dump an object to disk in json format
 
     filename: pathname
@@ -59,16 +69,48 @@ def save_json(filename, obj, indent=2, sort_keys=True):
     sort_keys: boolean
         Whether to sort keys before writing. Should be True if you ever use revision control
         on the resulting json file.
-    """
-    blob = json.dumps(obj, indent=indent, sort_keys=sort_keys)
+    atomic: boolean
+        If True, write to a temporary file in the same directory, then rename it over
+        `filename`, so that readers never see a partially-written file.
+    fsync: boolean
+        If True, flush the file's contents to disk before returning (or, if atomic, before
+        the rename), so that they survive a crash.
+
+    Serialization uses the fastest available JSON codec (see `src.utils.jsoncodec`),
+    but the output is always identical to that of `json.dumps`.
 
-    with open(filename, 'w') as fw:
-        fw.write(blob)
+    Returns
+    -------
+    The serialized (string) representation that was written
+    """
+    blob = json_dumps(obj, indent=indent, sort_keys=sort_keys)
+
+    if atomic:
+        filename = pathlib.Path(filename)
+        tmp_filename = filename.with_name(f".{filename.name}.{uuid.uuid4().hex[:8]}.tmp")
+        try:
+            with open(tmp_filename, 'w') as fw:
+                fw.write(blob)
+                if fsync:
+                    fw.flush()
+                    os.fsync(fw.fileno())
+            os.replace(tmp_filename, filename)
+        except BaseException:
+            if tmp_filename.exists():
+                tmp_filename.unlink()
+            raise
+    else:
+        with open(filename, 'w') as fw:
+            fw.write(blob)
+            if fsync:
+                fw.flush()
+                os.fsync(fw.fileno())
+    return blob
 
 def load_json(filename):
     """Read a json file from disk"""
-    with open(filename) as f:
-        obj = json.load(f)
+    with open(filename, 'rb') as f:
+        obj = json_loads(f.read())
     return obj
 
 def head_file(filename, n=5):
@@ -123,6 +165,9 @@ def run_notebook(*,
     kernel name is an issue: https://github.com/jupyter/nbconvert/issues/515
 
     """
+    import nbformat
+    from nbconvert.preprocessors import ExecutePreprocessor, CellExecutionError
+
     if notebook_path is None:
         notebook_path = paths['notebook_path']
     else:
@@ -0,0 +1,216 @@
+"""Pluggable JSON codecs for reading and writing catalog files
+
+All JSON written via `save_json` must be byte-for-byte identical, whichever codec
+is in use, so that revision-controlled files (e.g. the catalog) never change merely
+because a faster JSON library happens to be installed. Output must therefore match
+`json.dumps(obj, indent=2, sort_keys=True)` exactly.
+
+Codecs:
+
+json: the standard library. Always available.
+orjson: used (if installed) for decoding, and for encoding any object it can render
+    identically to the standard library (dicts with str keys, lists, tuples, strings,
+    64-bit ints, booleans and None). Anything else (e.g. floats, whose repr differs)
+    is encoded using the standard library.
+ujson: used (if installed) for decoding only.
+
+By default, the fastest available codec is used. See `set_json_codec()`.
+"""
+import json
+import re
+
+__all__ = [
+    'available_json_codecs',
+    'get_json_codec',
+    'json_dumps',
+    'json_loads',
+    'set_json_codec',
+]
+
+
+class JSONCodec:
+    """Standard library JSON codec. Other codecs override `dumps` and `loads` as available."""
+    name = "json"
+
+    def dumps(self, obj, indent=2, sort_keys=True):
+        return json.dumps(obj, indent=indent, sort_keys=sort_keys)
+
+    def loads(self, s):
+        return json.loads(s)
+
+    def __repr__(self):
+        return f"<JSONCodec:{self.name}>"
+
+
+# The standard library (with its default ensure_ascii=True) escapes everything outside of
+# printable ASCII. Control characters are escaped by orjson too, but DEL and non-ASCII are not.
+_UNESCAPED = re.compile('[\x7f-\U0010ffff]')
+
+
+def _escape_char(match):
+    c = ord(match.group())
+    if c < 0x10000:
+        return f'\\u{c:04x}'
+    c -= 0x10000
+    return f'\\u{0xd800 | (c >> 10):04x}\\u{0xdc00 | (c & 0x3ff):04x}'
+
+
+def _has_big_floats(obj):
+    """True if a decoded JSON document contains floats beyond the range of 64-bit ints
+
+    Some libraries silently decode integers too large for 64 bits as floats.
+    Such documents are decoded again by the standard library.
+    """
+    stack = [obj]
+    while stack:
+        o = stack.pop()
+        t = type(o)
+        if t is dict:
+            stack.extend(o.values())
+        elif t is list:
+            stack.extend(o)
+        elif t is float and abs(o) >= 2.0**63:
+            return True
+    return False
+
+
+def _orjson_safe(obj):
+    """True if orjson renders `obj` exactly as the standard library would (modulo escaping)"""
+    stack = [obj]
+    while stack:
+        o = stack.pop()
+        t = type(o)
+        if t is str or t is bool or o is None:
+            continue
+        if t is int:
+            if not -2**63 <= o < 2**64:
+                return False
+        elif t is dict:
+            for k in o:
+                if type(k) is not str:
+                    return False
+            stack.extend(o.values())
+        elif t is list or t is tuple:
+            stack.extend(o)
+        else:
+            return False
+    return True
+
+
+class OrjsonCodec(JSONCodec):
+    name = "orjson"
+
+    def __init__(self):
+        import orjson
+        self._orjson = orjson
+        self._options = orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS
+
+    def dumps(self, obj, indent=2, sort_keys=True):
+        if indent != 2 or not sort_keys or not _orjson_safe(obj):
+            return super().dumps(obj, indent=indent, sort_keys=sort_keys)
+        try:
+            blob = self._orjson.dumps(obj, option=self._options).decode('utf-8')
+        except TypeError:  # e.g. lone surrogates
+            return super().dumps(obj, indent=indent, sort_keys=sort_keys)
+        if not blob.isascii() or '\x7f' in blob:
+            blob = _UNESCAPED.sub(_escape_char, blob)
+        return blob
+
+    def loads(self, s):
+        try:
+            obj = self._orjson.loads(s)
+        except ValueError:
+            # e.g. NaN. Let the standard library decide.
+            return super().loads(s)
+        if _has_big_floats(obj):
+            return super().loads(s)
+        return obj
+
+
+class UjsonCodec(JSONCodec):
+    name = "ujson"
+
+    def __init__(self):
+        import ujson
+        self._ujson = ujson
+
+    def loads(self, s):
+        try:
+            obj = self._ujson.loads(s)
+        except ValueError:
+            return super().loads(s)
+        if _has_big_floats(obj):
+            return super().loads(s)
+        return obj
+
+
+# In order of preference
+_CODECS = {
+    'orjson': OrjsonCodec,
+    'ujson': UjsonCodec,
+    'json': JSONCodec,
+}
+
+_codec = None
+
+
+def available_json_codecs():
+    """Names of the JSON codecs that can be used in this environment, fastest first"""
+    available = []
+    for name, codec_class in _CODECS.items():
+        try:
+            codec_class()
+        except ImportError:
+            continue
+        available.append(name)
+    return available
+
+
+def set_json_codec(name=None):
+    """Select the JSON codec used by `save_json` and `load_json`
+
+    name: str or None
+        One of 'orjson', 'ujson' or 'json'. If None, use the fastest available codec.
+
+    Returns
+    -------
+    the selected codec
+    """
+    global _codec
+    if name is None:
+        name = available_json_codecs()[0]
+    if name not in _CODECS:
+        raise ValueError(f"Unknown JSON codec:{name}. Must be one of {list(_CODECS)}")
+    _codec = _CODECS[name]()
+    return _codec
+
+
+def get_json_codec():
+    """The JSON codec currently in use"""
+    if _codec is None:
+        return set_json_codec()
+    return _codec
+
+
+def json_dumps(obj, indent=2, sort_keys=True):
+    """Serialize `obj` to a JSON string, as per `json.dumps(obj, indent=indent, sort_keys=sort_keys)`
+
+    >>> print(json_dumps({'b': [1, None], 'a': 'caf\\xe9'}))
+    {
+      "a": "caf\\u00e9",
+      "b": [
+        1,
+        null
+      ]
+    }
+    """
+    return get_json_codec().dumps(obj, indent=indent, sort_keys=sort_keys)
+
+
+def json_loads(s):
+    """Deserialize a JSON document (str or bytes)
+
+    >>> json_loads(b'{"a": [1, 2.5, "x"]}')
+    {'a': [1, 2.5, 'x']}
+    """
+    return get_json_codec().loads(s)